@@ -1,6 +1,18 @@
+import itertools
+import logging
 import socket
 import struct
-import pprint
+import threading
+import time
+
+from ardroneapi import constants
+from ardroneapi.acks import AckTracker
+from ardroneapi.config import DroneConfig
+from ardroneapi.navdata import NavigationData, NavdataError, SequenceTracker
+from ardroneapi.scheduler import CommandScheduler, clock
+from ardroneapi.video import VideoReceiver
+
+log = logging.getLogger(__name__)
 
 class Drone(object):
     """
@@ -23,21 +35,35 @@ class Drone(object):
     """
     cmd_port = 5556
     nav_port = 5554
+    video_port = 5555
     cfg_port = 5559
+    max_packet_size = 1024
+    # a metrics hook (see ardroneapi.metrics), None to measure nothing
+    metrics = None
     
     def __init__(self, drone_ip=None, local_ip=None, multicast_ip=None):
-        self._sequence = 0
+        # next() on a count is atomic, so commands can be built from several
+        # threads (eg. the scheduler's) without reusing a sequence number
+        self._sequence = itertools.count(1)
+        self.encoders = {}
         self.drone_ip = drone_ip or '192.168.1.1'
         self.local_ip = local_ip or '192.168.1.2'
         self.multicast_ip = multicast_ip or '224.1.1.1'
         
         self.cmd_socket = None
         self.nav_socket = None
+        self.nav_receiver = None
+        self.video_receiver = None
+        self.scheduler = None
+        self.pending = []
+        self.acks = AckTracker(self)
+        self.config = DroneConfig(self)
     
     def connect(self):
         self.connect_cmd()
     
     def disconnect(self):
+        self.stop_scheduler()
         self.disconnect_cmd()
     
     def connect_cmd(self):
@@ -50,17 +76,35 @@ class Drone(object):
         self.cmd_socket.close()
         self.cmd_socket = None
     
-    def connect_nav(self):
+    def connect_nav(self, callback=None):
+        """
+        Starts receiving navdata in a background ``NavdataReceiver`` thread and
+        returns it. The newest decoded packet is always available as
+        ``Drone.navdata``. ``callback`` (optional) is called with each
+        ``NavigationData`` on the receiver thread.
+        """
         # make sure we get detailed data
         self.activate_detailed_navdata()
+        self.poke_nav()
+        s = self.nav_socket = self.create_nav_socket()
         
+        log.info('receiving navdata from %s', self.drone_ip)
+        self.nav_receiver = NavdataReceiver(s, metrics=self.metrics)
+        self.nav_receiver.add_callback(self.acks.navdata_received)
+        if callback is not None:
+            self.nav_receiver.add_callback(callback)
+        self.nav_receiver.start()
+        return self.nav_receiver
+    
+    def poke_nav(self):
         # this "pokes" the drone to initiate the transfer of navdata
         p = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         p.bind( (self.local_ip, self.nav_port) )
-        p.sendto('\0',
+        p.sendto(b'\0',
                  (self.drone_ip, self.nav_port))
         p.close()
-        
+    
+    def create_nav_socket(self):
         # create the socket
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         # allow multipleprocesses to use this port
@@ -72,28 +116,66 @@ class Drone(object):
         iface_bin = socket.inet_aton(self.local_ip)
         s.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, 
                      group_bin + iface_bin)
-        self.nav_socket = s
-        
-        # TODO: this should run in a separate thread or using callbacks to
-        #       prevent blocking
-        while True:
-            data, sender = s.recvfrom(100)
-            print "<<<====="
-            print str(sender)
-            print repr(data)
-            n = NavigationData(data)
-            print "=====>>>"
-        self.disconnect_nav()
+        return s
     
     def disconnect_nav(self):
         # TODO: can we tell the drone to stop sending navdata somehow?
-        self.nav_socket.clos()
+        if self.nav_receiver:
+            self.nav_receiver.stop()
+            self.nav_receiver = None
+        self.nav_socket.close()
         self.nav_socket = None
     
+    def connect_video(self, pool_size=8, queue_size=4, frame_size=256 * 1024):
+        """
+        Starts receiving the video stream in a background ``VideoReceiver``
+        thread and returns it. The frames are read from its ``frames``
+        queue, see ``ardroneapi.video``.
+        """
+        log.info('receiving video from %s', self.drone_ip)
+        s = socket.create_connection((self.drone_ip, self.video_port))
+        self.video_receiver = VideoReceiver(s, pool_size, queue_size, frame_size)
+        self.video_receiver.start()
+        return self.video_receiver
+    
+    def disconnect_video(self):
+        if self.video_receiver:
+            self.video_receiver.stop()
+            self.video_receiver.sock.close()
+            self.video_receiver.frames.clear()
+            self.video_receiver = None
+    
+    @property
+    def navdata(self):
+        """
+        The most recently received ``NavigationData`` (or ``None``). Reading
+        this never blocks.
+        """
+        if self.nav_receiver is None:
+            return None
+        return self.nav_receiver.latest
+    
+    def start_scheduler(self, rate=33.0, setpoint_filter=None):
+        """
+        Starts a ``CommandScheduler`` that sends the control setpoint (and
+        keeps the communication watchdog happy) ``rate`` times per second.
+        While it runs ``move``, ``hover``, ``takeoff``, ``land`` and
+        ``recover`` only update the setpoint it sends.
+        
+        ``setpoint_filter`` (optional) is a ``SetpointFilter`` smoothing the
+        ``move`` inputs, see ``ardroneapi.setpoint``.
+        """
+        self.scheduler = CommandScheduler(self, rate, setpoint_filter)
+        self.scheduler.start()
+        return self.scheduler
+    
+    def stop_scheduler(self):
+        if self.scheduler:
+            self.scheduler.stop()
+            self.scheduler = None
     
     def sequence(self):
-        self._sequence += 1
-        return self._sequence
+        return next(self._sequence)
     
     def raw_send(self, data):
         '''
@@ -101,41 +183,80 @@ class Drone(object):
         '''
         if not self.cmd_socket:
             raise Exception("Not connected yet!")
-        print "sending..."
-        print data
+        metrics = self.metrics
+        if metrics is None:
+            self.cmd_socket.send(data)
+            return
+        start = clock()
         self.cmd_socket.send(data)
+        metrics.observe('commands.send_time', clock() - start)
+        metrics.count('commands.packets')
+        metrics.count('commands.bytes', len(data))
     
     def build_raw_command(self, method, params=None):
         '''
         construct the low level AT command and add the squence number
         '''
-        if not params:
-            params = []
-        params2 = []
-        for param in params:
-            if type(param) == float:
-                params2.append(str(float2int(param)))
-            else:
-                params2.append(str(param))
-        params_str = ','.join([str(self.sequence())] + params2)
-        return 'AT*' + method + '=' + params_str + '\r'
+        return self.encoder(method).encode(next(self._sequence), params)
+    
+    def encoder(self, method):
+        """
+        the ``CommandEncoder`` of the AT command ``method``
+        """
+        try:
+            return self.encoders[method]
+        except KeyError:
+            encoder = self.encoders[method] = CommandEncoder(method)
+            return encoder
     
     def build_raw_commands(self, commands):
         '''
-        TODO: logic to prevent UDP Packets that are larger than 1024 characters
+        construct the low level AT commands for a list of ``(method, params)``
+        tuples and pack them, in order, into as few UDP packets as possible.
+        The drone ignores packets larger than ``max_packet_size`` bytes.
         '''
-        r = []
+        packets = []
+        packet = []
+        size = 0
         for command in commands:
-            r.append(self.build_command(*command))
-        return [''.join(r)]
+            raw = self.build_raw_command(*command)
+            if len(raw) > self.max_packet_size:
+                raise ValueError("AT command is larger than %s bytes: %r" % (
+                                    self.max_packet_size, raw))
+            if size + len(raw) > self.max_packet_size:
+                packets.append(b''.join(packet))
+                packet = []
+                size = 0
+            packet.append(raw)
+            size += len(raw)
+        if packet:
+            packets.append(b''.join(packet))
+        return packets
     
     def send(self, method, params=None):
         self.raw_send(self.build_raw_command(method, params))
     
     def send_many(self, commands):
+        """
+        sends a list of ``(method, params)`` tuples with as few packets as
+        possible
+        """
         for data in self.build_raw_commands(commands):
             self.raw_send(data)
     
+    def queue(self, method, params=None):
+        """
+        queues a command to be sent with the next ``flush``
+        """
+        self.pending.append((method, params))
+    
+    def flush(self):
+        """
+        sends all queued commands
+        """
+        commands, self.pending = self.pending, []
+        self.send_many(commands)
+    
     #===========================================================================
     # drone control commands
     #===========================================================================
@@ -144,16 +265,33 @@ class Drone(object):
         """
         If no other command is supplied, the drone enters a hovering mode and
         stays still at approximately 1 meter above ground.
+        
+        Returns the ``TrackedCommand`` acknowledged once the drone flies.
         """
         #self.send('REF', ('290718208',))
-        self.send('REF', ('512',))
+        if self.scheduler is not None:
+            # sent on every tick, only tracked until the drone flies
+            self.scheduler.set_ref('512')
+            return self.acks.send('REF', ('512',), constants.ARDRONE_FLY_MASK,
+                                  replace=True, watch=True)
+        # resent until the drone reports that it flies
+        return self.acks.send('REF', ('512',), constants.ARDRONE_FLY_MASK,
+                              replace=True)
     
     def land(self):
         """
         The drone lands and turns off its motors.
+        
+        Returns the ``TrackedCommand`` acknowledged once the drone landed.
         """
         #self.send('REF', ('290717696',))
-        self.send('REF', ('0',))
+        if self.scheduler is not None:
+            self.scheduler.set_ref('0')
+            return self.acks.send('REF', ('0',), constants.ARDRONE_FLY_MASK,
+                                  expected=False, replace=True, watch=True)
+        # resent until the drone reports that it stopped flying
+        return self.acks.send('REF', ('0',), constants.ARDRONE_FLY_MASK,
+                              expected=False, replace=True)
     
     def emergency(self):
         """
@@ -164,6 +302,11 @@ class Drone(object):
         Takeoff (bit 9)  : 0
         
         """
+        # or a tracked takeoff would be retransmitted
+        self.acks.cancel('REF')
+        if self.scheduler is not None:
+            # or the next tick would take off again
+            self.scheduler.set_ref('0')
         self.send_many([('REF', ('0',)),('REF', ('256',)),('REF', ('0',))])
     
     def recover(self):
@@ -173,16 +316,22 @@ class Drone(object):
         Emergency (bit 8): 0
         Takeoff (bit 9)  : 0
         """
+        if self.scheduler is not None:
+            self.scheduler.set_ref('0')
+            return
         self.send('REF', ('0',))
     
     def hover(self):
         """
         Tells the drone to hold its position
         """
-        self.send_many(
+        if self.scheduler is not None:
+            self.scheduler.hover()
+            return
+        self.send_many([
             ('COMWDG',),
             ('PCMD', (0,0,0,0,0)),
-        )
+        ])
     
     def move(self, roll, pitch, gaz, yaw):
         """
@@ -195,7 +344,10 @@ class Drone(object):
         yaw: angular speed [-1..1] (negative: spin left, positive: spin right)
         
         """
-        if all(not bool(roll), not bool(pitch), not bool(gaz), not bool(yaw)):
+        if self.scheduler is not None:
+            self.scheduler.move(roll, pitch, gaz, yaw)
+            return
+        if not (roll or pitch or gaz or yaw):
             # if they are all 0, then this is actually a hover command
             self.hover()
             return
@@ -217,8 +369,11 @@ class Drone(object):
         
         When receiving this command, the drone will automatically adjust the 
         trim on pitch and roll controls.
+        
+        Returns the ``TrackedCommand``, acknowledged by the drone's "trim
+        command ACK" bit (see ``ardroneapi.acks``).
         """
-        self.send('FTRIM',)
+        return self.acks.send('FTRIM', ack=constants.ARDRONE_TRIM_COMMAND_MASK)
     
     def select_video_channel(self, mode):
         """
@@ -309,190 +464,180 @@ class Drone(object):
     def set_config(self, name, value):
         """
         name: the name of the value to set
-        value: the value of the configuration
-        """
-        if value:
-            value = '"TRUE"'
-        else:
-            value = '"FALSE"'
-        self.raw_send(self.build_raw_command(
-                        'CONFIG', 
-                        ('"%s"' % name, value,))
-        )
-    
-    def get_config(self):
-        """
-        config data is sent via TCP
-        """
-        NO_CONTROL_MODE = 0
-        ARDRONE_UPDATE_CONTROL_MODE = 1
-        PIC_UPDATE_CONTROL_MODE = 2
-        LOGS_GET_CONTROL_MODE = 3
-        CFG_GET_CONTROL_MODE = 4
-        ACK_CONTROL_MODE = 5
-        
-        s = socket.socket( socket.AF_INET, socket.SOCK_STREAM )
-        #s.bind( (self.local_ip, 5559,) )
-        s.connect( (self.drone_ip, self.cfg_port,) )
-        #s.send('USER anonymous')
-        #s.send(self.build_raw_command('CTRL', (4,)))
-        
-        # tell to send config via udp
-        self.send('CTRL', (CFG_GET_CONTROL_MODE,0,))
+        value: the value of the configuration (a bool, a number or a string)
         
-        config = []
-        while True:
-            data, address = s.recvfrom( 1024 )
-            print data
-            print address
-            print '======'
-            if not data:
+        The new value is in ``config`` once the drone acknowledged it, see
+        ``DroneConfig``. Returns the ``TrackedCommand``.
+        """
+        return self.config.set(name, value)
+    
+    def get_config(self, refresh=False):
+        """
+        The configuration of the drone as a dict. It is read from the config
+        port (TCP) only the first time, or after ``config.invalidate()``, or
+        with ``refresh=True``.
+        """
+        return self.config.as_dict(refresh)
+
+class NavdataReceiver(threading.Thread):
+    """
+    Owns the navdata socket and decodes every incoming packet in a background
+    thread, so the thread that sends the control commands is never blocked.
+    
+    The newest packet is published by replacing ``latest`` with a new
+    ``NavigationData`` instance. Since that is a single attribute assignment
+    readers always see a complete packet without any locking.
+    
+    >>> r = NavdataReceiver(nav_socket)
+    >>> r.add_callback(my_handler) # called with each NavigationData
+    >>> r.start()
+    >>> r.latest.sequence
+    >>> r.stop()
+    
+    Callbacks run on the receiver thread: keep them short, or hand the data
+    over to another thread. Raw callbacks are called with ``(data, timestamp)``
+    for every datagram, before it is decoded or dropped (eg. to record it
+    with a ``NavdataRecorder``). An exception in a callback is logged and
+    counted in ``callback_errors``; the receiver keeps going.
+    
+    Packets with a bad checksum, duplicated or reordered packets are dropped
+    by a ``SequenceTracker`` (``tracker``), whose counters measure the link
+    quality. Pass ``verify=False`` to skip the checksum verification.
+    
+    ``metrics`` (optional) is a metrics hook, see ``ardroneapi.metrics``.
+    """
+    buffer_size = 4096
+    
+    def __init__(self, sock, timeout=0.5, verify=True, metrics=None):
+        super(NavdataReceiver, self).__init__()
+        self.daemon = True
+        self.sock = sock
+        # the timeout only limits how long ``stop`` has to wait
+        self.sock.settimeout(timeout)
+        self.callbacks = []
+        self.raw_callbacks = []
+        self.running = False
+        self.latest = None
+        self.sender = None
+        self.verify = verify
+        self.metrics = metrics
+        self.tracker = SequenceTracker()
+        self.received = 0
+        self.errors = 0
+        self.callback_errors = 0
+    
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+    
+    def remove_callback(self, callback):
+        self.callbacks.remove(callback)
+    
+    def add_raw_callback(self, callback):
+        self.raw_callbacks.append(callback)
+    
+    def remove_raw_callback(self, callback):
+        self.raw_callbacks.remove(callback)
+    
+    def start(self):
+        self.running = True
+        super(NavdataReceiver, self).start()
+    
+    def run(self):
+        try:
+            self.receive()
+        finally:
+            self.running = False
+    
+    def receive(self):
+        while self.running:
+            try:
+                data, sender = self.sock.recvfrom(self.buffer_size)
+            except socket.timeout:
+                continue
+            except socket.error:
+                # the socket has been closed underneath us
                 break
-            config.append(data)
-        config = ''.join(config)
-        lines = config.split('\n')
-        cfg = {}
-        for line in lines:
-            if '=' in line:
-                key, value = line.split('=')
-                key = key.strip()
-                value = value.strip()
-                cfg[key] = value
-        pprint.pprint(cfg)
+            received = clock()
+            self.received += 1
+            if self.raw_callbacks:
+                timestamp = time.time()
+                for callback in self.raw_callbacks:
+                    try:
+                        callback(data, timestamp)
+                    except Exception:
+                        self.callback_errors += 1
+                        log.exception('raw navdata callback %r failed', callback)
+            metrics = self.metrics
+            if metrics is not None:
+                metrics.count('navdata.packets')
+                metrics.count('navdata.bytes', len(data))
+                start = clock()
+            try:
+                navdata = NavigationData(data)
+            except (NavdataError, struct.error):
+                self.errors += 1
+                if metrics is not None:
+                    metrics.count('navdata.errors')
+                continue
+            navdata.received = received
+            if metrics is not None:
+                metrics.observe('navdata.decode_time', clock() - start)
+            if not self.tracker.check(navdata, self.verify):
+                if metrics is not None:
+                    metrics.count('navdata.dropped')
+                continue
+            self.sender = sender
+            self.latest = navdata
+            for callback in self.callbacks:
+                try:
+                    callback(navdata)
+                except Exception:
+                    self.callback_errors += 1
+                    log.exception('navdata callback %r failed', callback)
+    
+    def stop(self, timeout=None):
+        self.running = False
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
 
-class NavigationData(object):
-    def __init__(self, raw_data):
-        self.raw_data = raw_data
-        self.unpack()
+class CommandEncoder(object):
+    """
+    Builds the AT commands of one method (``PCMD``, ``REF``, ...).
     
-    def unpack_state(self, state):
-        '''
-        state is a bit field representing ARDrone' state
-        
-        Define masks for ARDrone state
-        31                                                             0
-         x x x x x x x x x x x x x x x x x x x x x x x x x x x x x x x x -> state
-         | | | | | | | | | | | | | | | | | | | | | | | | | | | | | | | |
-         | | | | | | | | | | | | | | | | | | | | | | | | | | | | | | | FLY MASK : (0) ardrone is landed, (1) ardrone is flying
-         | | | | | | | | | | | | | | | | | | | | | | | | | | | | | | VIDEO MASK : (0) video disable, (1) video enable
-         | | | | | | | | | | | | | | | | | | | | | | | | | | | | | VISION MASK : (0) vision disable, (1) vision enable
-         | | | | | | | | | | | | | | | | | | | | | | | | | | | | CONTROL ALGO : (0) euler angles control, (1) angular speed control
-         | | | | | | | | | | | | | | | | | | | | | | | | | | | ALTITUDE CONTROL ALGO : (0) altitude control inactive (1) altitude control active
-         | | | | | | | | | | | | | | | | | | | | | | | | | | USER feedback : Start button state
-         | | | | | | | | | | | | | | | | | | | | | | | | | Control command ACK : (0) None, (1) one received
-         | | | | | | | | | | | | | | | | | | | | | | | | Trim command ACK : (0) None, (1) one received
-         | | | | | | | | | | | | | | | | | | | | | | | Trim running : (0) none, (1) running
-         | | | | | | | | | | | | | | | | | | | | | | Trim result : (0) failed, (1) succeeded
-         | | | | | | | | | | | | | | | | | | | | | Navdata demo : (0) All navdata, (1) only navdata demo
-         | | | | | | | | | | | | | | | | | | | | Navdata bootstrap : (0) options sent in all or demo mode, (1) no navdata options sent
-         | | | | | | | | | | | | | | | | | | | | Motors status : (0) Ok, (1) Motors Com is down
-         | | | | | | | | | | | | | | | | | |
-         | | | | | | | | | | | | | | | | | Bit means that there's an hardware problem with gyrometers
-         | | | | | | | | | | | | | | | | VBat low : (1) too low, (0) Ok
-         | | | | | | | | | | | | | | | VBat high (US mad) : (1) too high, (0) Ok
-         | | | | | | | | | | | | | | Timer elapsed : (1) elapsed, (0) not elapsed
-         | | | | | | | | | | | | | Power : (0) Ok, (1) not enough to fly
-         | | | | | | | | | | | | Angles : (0) Ok, (1) out of range
-         | | | | | | | | | | | Wind : (0) Ok, (1) too much to fly
-         | | | | | | | | | | Ultrasonic sensor : (0) Ok, (1) deaf
-         | | | | | | | | | Cutout system detection : (0) Not detected, (1) detected
-         | | | | | | | | PIC Version number OK : (0) a bad version number, (1) version number is OK
-         | | | | | | | ATCodec thread ON : (0) thread OFF (1) thread ON
-         | | | | | | Navdata thread ON : (0) thread OFF (1) thread ON
-         | | | | | Video thread ON : (0) thread OFF (1) thread ON
-         | | | | Acquisition thread ON : (0) thread OFF (1) thread ON
-         | | | CTRL watchdog : (1) delay in control execution (> 5ms), (0) control is well scheduled // Check frequency of control loop
-         | | ADC Watchdog : (1) delay in uart2 dsr (> 5ms), (0) uart2 is good // Check frequency of uart2 dsr (com with adc)
-         | Communication Watchdog : (1) com problem, (0) Com is ok // Check if we have an active connection with a client
-         Emergency landing : (0) no emergency, (1) emergency
-        '''
-        
-        desc = {
-            0: ('flying', 'ardrone is landed', 'ardrone is flying'),
-            1: ('video', 'video disabled', 'video enabled'),
-            2: ('vision', 'vision disabled', 'vision enabled'),
-            10: ('navdata_demo', 'all navdata', 'only navdata demo'),
-            26: ('navdata', 'navdata thread is ON', 'navdata thread is OFF'),
-            31: ('emergency', 'no emergency', 'emergency'),
-        }
-        values = {}
-        bits = str(bin(state)).lstrip('-b0')
-        # reverse the bitmask
-        print bits
-        bits = bits[::-1]
-        print bits
-        for thebit in range(0,31):
-            try:
-                s = bits[thebit]
-                if s == '1':
-                    s = True
-                else:
-                    s = False
-                d = desc.get(thebit, None)
-                if not d is None:
-                    if s:
-                        print d[0], d[2]
-                    else:
-                        print d[0], d[1]
-            except IndexError:
-                pass
-    
-    
-    def unpack(self):
-        '''
-        Exact-width integer types
-        
-        Integer types having exactly the specified width
-        typedef signed char int8_t
-        typedef unsigned char uint8_t
-        typedef signed int int16_t
-        typedef unsigned int uint16_t
-        typedef signed long int int32_t
-        typedef unsigned long int uint32_t
-        typedef signed long long int int64_t
-        typedef unsigned long long int uint64_t
-        
-        
-        Header:
-        HEADER      State     Seq       Vision
-        uint32_t    uint32_t  uint32_t  bool_t
-        
-        
-        
-        Checksum:
-        TAG        SIZE        CKS
-        uint16_t   uint16_t    uint32_t
-        
-        
-        
-        '''
-        r = self.raw_data
-        header = r[:13]
-        checksum = r[-12:]
-        options = r[13:-12]
-        print 'length: %s (header: %s, options: %s, checksum: %s)' % (len(r), 
-                                                                      len(header), 
-                                                                      len(options),
-                                                                      len(checksum),)
-        print 'correct?: ', len(r), '==', len(header)+len(options)+len(checksum)
-        
-        h, state, seq, vision = struct.unpack('<LLL?', header)
-        print 'header: %s %s %s %s' % (hex(h), bin(state), seq, vision)
-        self.unpack_state(state)
-        cks_id, size, chks_data = struct.unpack('<IIL', checksum)
-        print 'checksum: %s %s %s' % (cks_id, size, chks_data)
-        has_more = True
-        o = options[:]
-        while has_more:
-            tag, size = struct.unpack('<II', o[:8])
-            size_bytes = size/8
-            rest = o[4:size_bytes]
-            print tag, size, repr(rest)
-            o = o[4+size_bytes:]
-            if not len(o):
-                has_more = False
-#        opt1, s1 = struct.unpack('<hh', options[:4])
-#        print 'id: %s size: %s' % (opt1, s1)
+    The prefix is built once and the encoded parameters of the last call are
+    kept: a control loop sending the same setpoint tuple over and over (like
+    the ``CommandScheduler`` does) only has to format the sequence number.
+    Commands are ASCII bytes, ready for the socket on Python 2 and 3.
+    
+    >>> CommandEncoder('PCMD').encode(5, (1, -0.8, 0, 0, 0))
+    b'AT*PCMD=5,1,-1085485875,0,0,0\\r'
+    """
+    def __init__(self, method):
+        self.method = method
+        self.prefix = ('AT*' + method + '=').encode('ascii')
+        # (params, encoded params), replaced as a whole to be thread safe
+        self._cache = (None, b'\r')
+    
+    def encode_params(self, params):
+        if not params:
+            return b'\r'
+        return (',' + ','.join([
+            str(float2int(param)) if type(param) is float else str(param)
+            for param in params]) + '\r').encode('ascii')
+    
+    def encode(self, sequence, params=None):
+        cached_params, encoded = self._cache
+        # only immutable tuples (and None) can be recognized by identity
+        if params is not cached_params or (params is not None and
+                                           type(params) is not tuple):
+            encoded = self.encode_params(params)
+            self._cache = (params, encoded)
+        return self.prefix + b'%d' % sequence + encoded
+
+
+_float_struct = struct.Struct("=f")
+_int_struct = struct.Struct("=i")
 
 def float2int(f):
     """
@@ -502,7 +647,7 @@ def float2int(f):
     -1085485875
     
     """
-    return struct.unpack("=i", struct.pack("=f",f) )[0]
+    return _int_struct.unpack(_float_struct.pack(f))[0]
 def int2float(i):
     """
     Converts a IEEE-754 32bit int representation of a float back to a float
@@ -514,4 +659,4 @@ def int2float(i):
      
      -0.8
     """
-    return struct.unpack("=f", struct.pack("=i",i) )[0]
+    return _float_struct.unpack(_int_struct.pack(i))[0]
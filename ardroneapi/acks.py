@@ -0,0 +1,324 @@
+"""
+Reliable delivery of the AT commands whose effect shows in the state word.
+
+AT commands are sent over UDP, so any of them can be lost. Instead of sending
+the important ones several times "just in case", an ``AckTracker`` sends them
+once and watches the state word of the navdata for their acknowledgement:
+
+``CONFIG``: the "command ACK" bit, which stays set until it is reset with a
+``CTRL`` in ``ACK_CONTROL_MODE``. Since the bit can not tell two commands
+apart, only one ``CONFIG`` is in flight at a time and the next one is sent
+once the bit has been reset. One that waited more than ``queue_timeout``
+seconds (eg. because the bit is stuck) is sent anyway, untracked, and given
+up.
+
+``FTRIM``: the "trim command ACK" bit.
+
+``REF`` takeoff/land: the "flying" bit being set/cleared.
+
+A command that is not acknowledged within ``timeout`` seconds is sent again
+(with a new sequence number, the drone ignores old ones), waiting ``backoff``
+times longer after every attempt, and is given up after ``retries``
+retransmissions.
+
+>>> command = drone.acks.send('FTRIM', ack=constants.ARDRONE_TRIM_COMMAND_MASK)
+>>> command.wait(2.0)
+True
+>>> command.latency
+0.0213
+>>> drone.acks.stats()['FTRIM']
+{'sent': 1, 'acked': 1, 'failed': 0, 'retransmissions': 0, ...}
+
+The tracker is driven by ``navdata_received``, a navdata callback registered
+by ``Drone.connect_nav``: without navdata nothing is retransmitted and the
+commands are never acknowledged. While no navdata has been received for
+``stale_after`` seconds the commands are all sent right away, ``CONFIG``s
+included, and the ones last sent more than ``stale_after`` seconds ago are
+given up instead of being retransmitted all at once when navdata comes back.
+"""
+import collections
+import logging
+import threading
+
+from ardroneapi import constants
+from ardroneapi.scheduler import clock
+
+log = logging.getLogger(__name__)
+
+
+class TrackedCommand(object):
+    """
+    A command sent through an ``AckTracker``. ``acked`` is the time it was
+    acknowledged and ``failed`` is True once it was given up.
+    """
+    def __init__(self, method, params, ack, expected, callback, watch=False):
+        self.method = method
+        self.params = params
+        self.ack = ack
+        self.expected = ack if expected else 0
+        self.callback = callback
+        self.watch = watch
+        # the AT sequence numbers of every attempt (None when watched)
+        self.sequences = []
+        self.sent = None
+        # when it was last sent
+        self.last = None
+        # when it was put in the queue of the commands waiting for the ACK bit
+        self.queued = None
+        self.retry_at = None
+        self.timeout = None
+        # the count of navdata packets received when last sent
+        self.after = 0
+        self.acked = None
+        self.failed = False
+        self.done = threading.Event()
+
+    @property
+    def attempts(self):
+        return len(self.sequences)
+
+    @property
+    def latency(self):
+        """
+        Seconds from the first attempt to the acknowledgement.
+        """
+        if self.acked is None:
+            return None
+        return self.acked - self.sent
+
+    def wait(self, timeout=None):
+        """
+        Waits until the command is acknowledged or given up, returns True if
+        it was acknowledged.
+        """
+        self.done.wait(timeout)
+        return self.acked is not None
+
+    def __repr__(self):
+        return '<TrackedCommand %s %r attempts=%d acked=%s failed=%s>' % (
+            self.method, self.params, self.attempts, self.acked is not None,
+            self.failed)
+
+
+class AckTracker(object):
+    """
+    Sends commands for ``drone`` and retransmits them until they are
+    acknowledged, see the module documentation.
+    """
+    def __init__(self, drone, timeout=0.1, backoff=2.0, retries=5,
+                 queue_timeout=2.0, stale_after=0.5):
+        self.drone = drone
+        self.timeout = timeout
+        self.backoff = backoff
+        self.retries = retries
+        self.queue_timeout = queue_timeout
+        self.stale_after = stale_after
+        self.in_flight = []
+        # CONFIG commands waiting for the command ACK bit to be free
+        self.waiting = collections.deque()
+        self.command_ack = False
+        self.reset_at = 0.0
+        self.packets = 0
+        # when the last navdata packet was received
+        self.received = None
+        self.unexpected_acks = 0
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self._stats = {}
+
+    def send(self, method, params=None, ack=constants.ARDRONE_COMMAND_MASK,
+             expected=True, callback=None, replace=False, watch=False):
+        """
+        Sends the command ``method`` and tracks it until the bits ``ack`` of
+        the state word are set (or cleared if ``expected`` is False).
+        ``callback`` is called with the ``TrackedCommand`` once it is
+        acknowledged or given up, on the thread that receives the navdata
+        (or on this one for the commands it replaces).
+
+        With ``replace`` the tracked commands of the same ``method`` are given
+        up, eg. so an old takeoff is not retransmitted after a land.
+
+        With ``watch`` the command is only tracked, never sent: for a command
+        someone else keeps sending, eg. the ``REF`` of the command scheduler.
+        """
+        command = TrackedCommand(method, params, ack, expected, callback, watch)
+        now = clock()
+        with self._lock:
+            replaced = self.expire(now)
+            if replace:
+                replaced.extend(self.remove(method))
+            self.method_stats(method)['sent'] += 1
+            flowing = self.navdata_flowing(now)
+            if not flowing:
+                # nothing would ever take the waiting commands off the queue
+                while self.waiting:
+                    self.in_flight.append(self.waiting.popleft())
+                    self.transmit(self.in_flight[-1], now)
+            if ack == constants.ARDRONE_COMMAND_MASK and flowing and (
+                    self.command_ack or self.uses_command_ack()):
+                command.queued = now
+                self.waiting.append(command)
+            else:
+                self.in_flight.append(command)
+                self.transmit(command, now)
+        self.finish(replaced)
+        return command
+
+    def cancel(self, method):
+        """
+        Gives up the tracked commands ``method``, eg. the ``REF`` takeoff
+        before an emergency, and returns them.
+        """
+        with self._lock:
+            cancelled = self.remove(method)
+        self.finish(cancelled)
+        return cancelled
+
+    def remove(self, method):
+        removed = [c for c in self.in_flight + list(self.waiting) if c.method == method]
+        for command in removed:
+            command.failed = True
+        self.in_flight = [c for c in self.in_flight if c.method != method]
+        self.waiting = collections.deque(c for c in self.waiting if c.method != method)
+        return removed
+
+    def expire(self, now):
+        """
+        Gives up the commands last sent more than ``stale_after`` seconds ago
+        while no navdata is flowing, and returns them.
+        """
+        if self.navdata_flowing(now):
+            return []
+        expired = [c for c in self.in_flight if now - c.last >= self.stale_after]
+        for command in expired:
+            command.failed = True
+            self.method_stats(command.method)['failed'] += 1
+            log.warning('%s %r not acknowledged, no navdata for %.1fs',
+                        command.method, command.params, now - command.last)
+            self.in_flight.remove(command)
+        return expired
+
+    def navdata_flowing(self, now):
+        return self.received is not None and now - self.received < self.stale_after
+
+    def uses_command_ack(self):
+        for command in self.in_flight:
+            if command.ack == constants.ARDRONE_COMMAND_MASK:
+                return True
+        return False
+
+    def transmit(self, command, now):
+        sequence = None
+        if not command.watch:
+            sequence = self.drone.sequence()
+            self.drone.raw_send(
+                self.drone.encoder(command.method).encode(sequence, command.params))
+        if command.sent is None:
+            command.sent = now
+            command.timeout = self.timeout
+        else:
+            command.timeout *= self.backoff
+            if not command.watch:
+                self.method_stats(command.method)['retransmissions'] += 1
+        command.last = now
+        command.sequences.append(sequence)
+        command.retry_at = now + command.timeout
+        command.after = self.packets
+
+    def navdata_received(self, navdata):
+        now = clock()
+        state = navdata.state
+        acked_config = False
+        unexpected = False
+        reset = False
+        with self._lock:
+            finished = self.expire(now)
+            self.packets += 1
+            self.received = now
+            for command in list(self.in_flight):
+                if command.after < self.packets and state & command.ack == command.expected:
+                    command.acked = now
+                    stats = self.method_stats(command.method)
+                    stats['acked'] += 1
+                    stats['latency_total'] += command.latency
+                    stats['latency_max'] = max(stats['latency_max'], command.latency)
+                    if command.ack == constants.ARDRONE_COMMAND_MASK:
+                        acked_config = True
+                elif now < command.retry_at:
+                    continue
+                elif command.attempts <= self.retries:
+                    self.transmit(command, now)
+                    continue
+                else:
+                    command.failed = True
+                    self.method_stats(command.method)['failed'] += 1
+                    log.warning('%s %r not acknowledged after %d attempts',
+                                command.method, command.params, command.attempts)
+                self.in_flight.remove(command)
+                finished.append(command)
+            command_ack = bool(state & constants.ARDRONE_COMMAND_MASK)
+            if command_ack and not self.uses_command_ack():
+                if not (self.command_ack or acked_config):
+                    # acknowledges a CONFIG someone else sent
+                    log.debug('unexpected command ACK, invalidating the configuration')
+                    self.unexpected_acks += 1
+                    unexpected = True
+                # resend the reset if the bit stays set
+                if acked_config or unexpected or now >= self.reset_at:
+                    reset = True
+                    self.reset_at = now + self.timeout
+            self.command_ack = command_ack
+            if not command_ack and self.waiting and not self.uses_command_ack():
+                command = self.waiting.popleft()
+                self.in_flight.append(command)
+                self.transmit(command, now)
+            while self.waiting and now - self.waiting[0].queued >= self.queue_timeout:
+                # the ACK bit is stuck, sending it is the best we can do
+                command = self.waiting.popleft()
+                self.transmit(command, now)
+                command.failed = True
+                self.method_stats(command.method)['failed'] += 1
+                log.warning('%s %r waited %.1fs for the command ACK bit, sent untracked',
+                            command.method, command.params, now - command.queued)
+                finished.append(command)
+        if reset:
+            self.drone.send('CTRL', (constants.ACK_CONTROL_MODE, 0))
+        if unexpected:
+            self.drone.config.invalidate()
+        self.finish(finished)
+
+    def finish(self, commands):
+        for command in commands:
+            command.done.set()
+            if command.callback is not None:
+                command.callback(command)
+
+    def method_stats(self, method):
+        try:
+            return self._stats[method]
+        except KeyError:
+            stats = self._stats[method] = {
+                'sent': 0,
+                'acked': 0,
+                'failed': 0,
+                'retransmissions': 0,
+                'latency_total': 0.0,
+                'latency_max': 0.0,
+            }
+            return stats
+
+    def stats(self):
+        """
+        Per command: how many were sent, acknowledged, given up and
+        retransmitted, and the mean/max latency of the acknowledgements.
+        """
+        with self._lock:
+            result = {}
+            for method, stats in self._stats.items():
+                stats = dict(stats)
+                total = stats.pop('latency_total')
+                stats['latency_mean'] = total / stats['acked'] if stats['acked'] else 0.0
+                result[method] = stats
+            return result
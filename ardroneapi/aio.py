@@ -0,0 +1,216 @@
+"""
+An asyncio client for the drone (Python 3 only).
+
+``AsyncDrone`` talks to the same ports as ``Drone`` but never blocks the
+event loop: commands go out through a datagram transport, navdata is
+decoded as it arrives and the configuration is read with an asyncio stream.
+
+>>> async def fly():
+...     drone = AsyncDrone()
+...     await drone.connect()
+...     await drone.connect_nav()
+...     await drone.takeoff()
+...     async for navdata in drone.navdata():
+...         if navdata.options['demo'].altitude > 1000:
+...             break
+...     await drone.land()
+...     drone.close()
+"""
+import asyncio
+import logging
+import struct
+
+from ardroneapi import Drone, constants
+from ardroneapi.config import ConfigParser
+from ardroneapi.navdata import NavigationData, NavdataError, SequenceTracker
+from ardroneapi.scheduler import clock
+
+log = logging.getLogger(__name__)
+
+# put in the navdata queue by ``AsyncDrone.close`` to end ``navdata()``
+CLOSED = object()
+
+
+class TransportDrone(Drone):
+    """
+    A ``Drone`` that sends its commands through an asyncio datagram
+    transport. ``DatagramTransport.sendto`` only buffers, so none of the
+    command methods block.
+    """
+    transport = None
+
+    def raw_send(self, data):
+        if self.transport is None:
+            raise Exception("Not connected yet!")
+        self.transport.sendto(data)
+
+
+class NavdataProtocol(asyncio.DatagramProtocol):
+    """
+    Decodes each navdata datagram and puts it in a bounded queue. When the
+    consumer falls behind the oldest packets are dropped, the newest
+    telemetry is never held back. ``callbacks`` are called with every
+    packet as it is decoded; an exception in one is logged.
+    """
+    def __init__(self, queue_size=16, verify=True):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.verify = verify
+        self.tracker = SequenceTracker()
+        self.latest = None
+        self.callbacks = []
+        self.errors = 0
+        self.callback_errors = 0
+        self.overflows = 0
+
+    def datagram_received(self, data, addr):
+        received = clock()
+        try:
+            navdata = NavigationData(data)
+        except (NavdataError, struct.error):
+            self.errors += 1
+            return
+        navdata.received = received
+        if not self.tracker.check(navdata, self.verify):
+            return
+        self.latest = navdata
+        for callback in self.callbacks:
+            try:
+                callback(navdata)
+            except Exception:
+                self.callback_errors += 1
+                log.exception('navdata callback %r failed', callback)
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.overflows += 1
+        self.queue.put_nowait(navdata)
+
+    def close_queue(self):
+        """
+        Wakes up and stops the consumers of the queue.
+        """
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(CLOSED)
+
+
+class AsyncDrone(object):
+    """
+    The asyncio counterpart of ``Drone``. The control methods are coroutines
+    with the same arguments as those of ``Drone``.
+    """
+    cmd_port = Drone.cmd_port
+    nav_port = Drone.nav_port
+    cfg_port = Drone.cfg_port
+
+    def __init__(self, drone_ip=None, local_ip=None, multicast_ip=None):
+        self.drone = TransportDrone(drone_ip, local_ip, multicast_ip)
+        self.drone_ip = self.drone.drone_ip
+        self.local_ip = self.drone.local_ip
+        self.nav_transport = None
+        self.nav_protocol = None
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        transport, protocol = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol,
+            local_addr=(self.local_ip, self.cmd_port),
+            remote_addr=(self.drone_ip, self.cmd_port))
+        self.drone.transport = transport
+
+    async def connect_nav(self, queue_size=16, verify=True):
+        """
+        Starts receiving navdata. Iterate over ``navdata()`` to get the
+        packets, or read ``latest``.
+        """
+        self.drone.activate_detailed_navdata()
+        sock = self.drone.create_nav_socket()
+        sock.setblocking(False)
+        loop = asyncio.get_running_loop()
+        self.nav_transport, self.nav_protocol = await loop.create_datagram_endpoint(
+            lambda: NavdataProtocol(queue_size, verify), sock=sock)
+        self.nav_protocol.callbacks.append(self.drone.acks.navdata_received)
+        # pokes the drone from the navdata port (see Drone.poke_nav)
+        self.nav_transport.sendto(b'\0', (self.drone_ip, self.nav_port))
+
+    def close(self):
+        if self.drone.transport is not None:
+            self.drone.transport.close()
+            self.drone.transport = None
+        if self.nav_transport is not None:
+            self.nav_transport.close()
+            self.nav_transport = None
+            self.nav_protocol.close_queue()
+
+    @property
+    def latest(self):
+        """
+        The most recently received ``NavigationData`` (or ``None``).
+        """
+        if self.nav_protocol is None:
+            return None
+        return self.nav_protocol.latest
+
+    async def navdata(self):
+        """
+        Yields the decoded navdata packets as they arrive, until ``close``.
+        """
+        if self.nav_protocol is None:
+            raise Exception("Navdata not connected yet!")
+        queue = self.nav_protocol.queue
+        while self.nav_transport is not None:
+            navdata = await queue.get()
+            if navdata is CLOSED:
+                # for the other consumers
+                queue.put_nowait(CLOSED)
+                return
+            yield navdata
+
+    async def send(self, method, params=None):
+        self.drone.send(method, params)
+
+    async def send_many(self, commands):
+        self.drone.send_many(commands)
+
+    async def get_config(self, timeout=1.0, refresh=False):
+        """
+        The configuration of the drone as a dict, see ``Drone.get_config``.
+        It is read from the TCP config port when the cache is stale. The
+        drone keeps the connection open, so reading stops once no data
+        arrived for ``timeout`` seconds.
+        """
+        config = self.drone.config
+        if not (refresh or config.stale):
+            return config.as_dict()
+        reader, writer = await asyncio.open_connection(self.drone_ip, self.cfg_port)
+        parser = ConfigParser()
+        try:
+            self.drone.send('CTRL', (constants.CFG_GET_CONTROL_MODE, 0))
+            while True:
+                try:
+                    data = await asyncio.wait_for(reader.read(4096), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not data:
+                    break
+                parser.feed(data)
+        finally:
+            writer.close()
+        config.update(parser.close())
+        return config.as_dict()
+
+
+def _command(name):
+    method = getattr(Drone, name)
+
+    async def command(self, *args, **kwargs):
+        return method(self.drone, *args, **kwargs)
+    command.__name__ = name
+    command.__doc__ = method.__doc__
+    return command
+
+for _name in ('takeoff', 'land', 'emergency', 'recover', 'hover', 'move',
+              'flat_trims', 'select_video_channel', 'enable_autonomous_flight',
+              'disable_autonomous_flight', 'animate_leds', 'animate',
+              'reset_communications_watchdog', 'set_config'):
+    setattr(AsyncDrone, _name, _command(_name))
+del _name
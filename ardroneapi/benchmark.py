@@ -0,0 +1,214 @@
+"""
+Benchmarks of the hot paths: command encoding, navdata decoding and the
+latency from ``Drone.move`` to the bytes on the (loopback) wire.
+
+    python -m ardroneapi.benchmark
+    python -m ardroneapi.benchmark --save baseline.json
+    python -m ardroneapi.benchmark --compare baseline.json --tolerance 0.2
+
+For every benchmark it reports the calls per second, the p50/p99 time per
+call and the peak memory allocated during one call (needs ``tracemalloc``,
+ie. Python 3). The times are measured over batches of calls, so p50/p99 are
+percentiles of the per-batch average, which hides the timer's resolution.
+
+With ``--compare`` the exit status is 1 if a benchmark got slower than the
+saved results by more than the tolerance.
+
+The navdata packets are built by the simulator's flight model, in demo mode
+(demo option only) and in full mode (every known option).
+"""
+import gc
+import json
+import socket
+import sys
+
+from ardroneapi import Drone, float2int
+from ardroneapi.navdata import NavigationData, NavdataRecord, unpack_into
+from ardroneapi.scheduler import clock
+from ardroneapi.simulator import DroneSimulator
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def navdata_fixtures():
+    """
+    ``(demo packet, full packet)`` of a flying drone.
+    """
+    sim = DroneSimulator()
+    sim.model.takeoff = True
+    sim.model.setpoint = (0.1, -0.2, 0.3, 0.4)
+    for i in range(50):
+        sim.model.step(0.02)
+    demo = sim.navdata()
+    sim.config['general:navdata_demo'] = 'FALSE'
+    full = sim.navdata()
+    return demo, full
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def peak_allocation(function):
+    if tracemalloc is None:
+        return None
+    function() # warm up caches
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        function()
+        return tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+
+
+def measure(function, batches=200, batch_size=100):
+    """
+    Runs ``function`` ``batches * batch_size`` times and returns the results
+    as a dict.
+    """
+    for i in range(batch_size):
+        function()
+    times = []
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for i in range(batches):
+            start = clock()
+            for j in range(batch_size):
+                function()
+            times.append((clock() - start) / batch_size)
+    finally:
+        if enabled:
+            gc.enable()
+    total = sum(times)
+    return {
+        'ops': len(times) / total if total else float('inf'),
+        'p50': percentile(times, 0.5),
+        'p99': percentile(times, 0.99),
+        'alloc': peak_allocation(function),
+    }
+
+
+def benchmarks():
+    """
+    ``(name, function, batch_size)`` of every benchmark, setting up what they
+    need.
+    """
+    drone = Drone()
+    demo, full = navdata_fixtures()
+    record = NavdataRecord()
+    navdata = NavigationData(full)
+    pcmd = (1, 0.1, -0.2, 0.3, 0.4)
+    values = [i / 1000.0 for i in range(1000)]
+    batch = [('COMWDG',), ('REF', ('512',)), ('PCMD', pcmd)] * 20
+
+    def new_setpoint():
+        # a new tuple with a new value each call, like a control loop
+        new_setpoint.i = (new_setpoint.i + 1) % 1000
+        drone.build_raw_command('PCMD', (1, values[new_setpoint.i], -0.2, 0.3, 0.4))
+    new_setpoint.i = 0
+
+    yield 'float2int', lambda: float2int(-0.8), 100
+    yield 'build_raw_command PCMD same', lambda: drone.build_raw_command('PCMD', pcmd), 100
+    yield 'build_raw_command PCMD new', new_setpoint, 100
+    yield 'build_raw_command REF', lambda: drone.build_raw_command('REF', ('512',)), 100
+    yield 'build_raw_commands x60', lambda: drone.build_raw_commands(batch), 10
+    yield 'NavigationData demo', lambda: NavigationData(demo), 100
+    yield 'NavigationData full', lambda: NavigationData(full), 10
+    yield 'NavigationData full altitude', lambda: NavigationData(full).altitude, 10
+    yield 'NavigationData full all', lambda: NavigationData(full).options.unpack_all(), 10
+    yield 'unpack_into full', lambda: unpack_into(full, record), 100
+    yield 'verify_checksum full', navdata.verify_checksum, 100
+    yield 'unpack_state', lambda: navdata.unpack_state().flying, 100
+
+
+def round_trip(samples=2000):
+    """
+    Time from calling ``Drone.move`` until the datagram can be read from the
+    receiving socket.
+    """
+    drone = Drone()
+    wire = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    wire.bind(('127.0.0.1', 0))
+    drone.cmd_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    drone.cmd_socket.connect(wire.getsockname())
+    recv = wire.recv
+    times = []
+    try:
+        for i in range(samples):
+            start = clock()
+            drone.move(0.1, 0, 0, (i % 100) / 100.0)
+            recv(2048)
+            times.append(clock() - start)
+    finally:
+        wire.close()
+        drone.disconnect_cmd()
+    return {
+        'ops': len(times) / sum(times),
+        'p50': percentile(times, 0.5),
+        'p99': percentile(times, 0.99),
+        'alloc': None,
+    }
+
+
+def run():
+    results = {}
+    for name, function, batch_size in benchmarks():
+        results[name] = measure(function, batch_size=batch_size)
+        report(name, results[name])
+    try:
+        results['move -> wire'] = round_trip()
+        report('move -> wire', results['move -> wire'])
+    except socket.error as e:
+        sys.stderr.write('move -> wire: skipped (%s)\n' % e)
+    return results
+
+
+def report(name, result):
+    alloc = result['alloc']
+    sys.stdout.write('%-30s %12.0f ops/s  p50 %8.2fus  p99 %8.2fus  alloc %s\n' % (
+        name, result['ops'], result['p50'] * 1e6, result['p99'] * 1e6,
+        '%6d B' % alloc if alloc is not None else '     n/a'))
+
+
+def compare(results, baseline, tolerance):
+    """
+    The names of the benchmarks that are slower than in ``baseline`` by more
+    than ``tolerance`` (a fraction).
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        if result['ops'] < baseline[name]['ops'] * (1 - tolerance):
+            regressions.append(name)
+            sys.stdout.write('REGRESSION %s: %.0f ops/s (was %.0f)\n' % (
+                name, result['ops'], baseline[name]['ops']))
+    return regressions
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmarks ardroneapi.')
+    parser.add_argument('--save', metavar='FILE', help='save the results as json')
+    parser.add_argument('--compare', metavar='FILE', help='compare with saved results')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown when comparing (default: 0.2)')
+    args = parser.parse_args()
+    results = run()
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""
+Decoding many navdata packets at once into NumPy arrays, for offline
+analysis of recorded flights. Needs NumPy.
+
+>>> from ardroneapi.recorder import NavdataLog
+>>> columns = decode_log(NavdataLog('flights/2011-05-01'))
+>>> columns['altitude'].mean()
+>>> columns[columns['valid']]['sequence']
+>>> save_csv(columns, 'flight.csv')
+
+Instead of walking each packet, the packets are grouped by length and every
+group is viewed through one structured dtype (``packet_dtype``) mirroring
+the packet layout: the header at 0, the demo option block at 16, which is
+where the drone always puts it, and the checksum block in the last 8 bytes.
+All the fields and the checksums of a group are then computed with a
+handful of array operations.
+
+The result has one row per packet with the fields of ``RECORD_DTYPE``:
+the receive timestamp (if given), the header, the checksum and whether it
+verified (``valid``), whether the packet has a demo option (``has_demo``)
+and the fields of the demo option (zero if it has none).
+"""
+from ardroneapi.navdata import (OPTIONS, NAVDATA_HEADER, NAVDATA_DEMO_TAG,
+    NAVDATA_CKS_TAG, header_struct)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# struct format characters to little endian NumPy types
+NUMPY_TYPES = {
+    'B': 'u1',
+    'h': '<i2',
+    'H': '<u2',
+    'i': '<i4',
+    'I': '<u4',
+    'f': '<f4',
+}
+
+CHECKSUM_SIZE = 8
+DEMO_OFFSET = header_struct.size
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError("ardroneapi.bulk needs NumPy (pip install numpy)")
+
+
+def layout_fields(layout):
+    """
+    ``(name, type, offset)`` of every field of an ``OptionLayout``, offsets
+    relative to the DATA of the option.
+    """
+    fields = []
+    offset = 0
+    for name, code in layout.fields:
+        count = int(code[:-1] or 1)
+        base = NUMPY_TYPES[code[-1]]
+        fields.append((name, base if count == 1 else (base, (count,)), offset))
+        offset += np.dtype(base).itemsize * count
+    return fields
+
+
+def packet_dtype(length):
+    """
+    A structured dtype viewing a whole packet of ``length`` bytes that has
+    its demo option first (if it is long enough to have one at all).
+    """
+    names = ['header', 'state', 'sequence', 'vision_defined']
+    formats = ['<u4'] * 4
+    offsets = [0, 4, 8, 12]
+    demo = OPTIONS[NAVDATA_DEMO_TAG]
+    if length >= DEMO_OFFSET + 4 + demo.size + CHECKSUM_SIZE:
+        names += ['demo_tag', 'demo_size']
+        formats += ['<u2', '<u2']
+        offsets += [DEMO_OFFSET, DEMO_OFFSET + 2]
+        for name, format, offset in layout_fields(demo):
+            names.append(name)
+            formats.append(format)
+            offsets.append(DEMO_OFFSET + 4 + offset)
+    names += ['cks_tag', 'cks_size', 'cks']
+    formats += ['<u2', '<u2', '<u4']
+    offsets += [length - 8, length - 6, length - 4]
+    return np.dtype({'names': names, 'formats': formats, 'offsets': offsets,
+                     'itemsize': length})
+
+
+def record_dtype():
+    fields = [
+        ('timestamp', '<f8'),
+        ('state', '<u4'),
+        ('sequence', '<u4'),
+        ('vision_defined', '<u4'),
+        ('checksum', '<u4'),
+        ('valid', '?'),
+        ('has_demo', '?'),
+    ]
+    for name, format, offset in layout_fields(OPTIONS[NAVDATA_DEMO_TAG]):
+        fields.append((name, format))
+    return np.dtype(fields)
+
+RECORD_DTYPE = record_dtype() if np is not None else None
+
+
+def decode_packets(packets, timestamps=None):
+    """
+    Decodes a sequence of packets (bytes) into a structured array of
+    ``RECORD_DTYPE``, one row per packet in the same order.
+    """
+    require_numpy()
+    n = len(packets)
+    out = np.zeros(n, dtype=RECORD_DTYPE)
+    if timestamps is not None:
+        out['timestamp'] = timestamps
+    lengths = np.fromiter((len(p) for p in packets), dtype=np.int64, count=n)
+    minimum = header_struct.size + CHECKSUM_SIZE
+    for length in np.unique(lengths):
+        length = int(length)
+        if length < minimum:
+            continue
+        rows = np.nonzero(lengths == length)[0]
+        buf = b''.join([packets[i] for i in rows])
+        decode_group(out, rows, buf, length)
+    return out
+
+
+def decode_group(out, rows, buf, length):
+    """
+    Decodes ``buf``, the concatenation of packets that are all ``length``
+    bytes long, into the ``rows`` of ``out``.
+    """
+    packets = np.frombuffer(buf, dtype=packet_dtype(length))
+    data = np.frombuffer(buf, dtype=np.uint8).reshape(len(rows), length)
+    checksums = data[:, :length - CHECKSUM_SIZE].sum(axis=1, dtype=np.uint32)
+    valid = ((packets['header'] == NAVDATA_HEADER) &
+             (packets['cks_tag'] == NAVDATA_CKS_TAG) &
+             (packets['cks_size'] == CHECKSUM_SIZE) &
+             (packets['cks'] == checksums))
+    for name in ('state', 'sequence', 'vision_defined'):
+        out[name][rows] = packets[name]
+    out['checksum'][rows] = packets['cks']
+    out['valid'][rows] = valid
+    if 'demo_tag' not in packets.dtype.names:
+        return
+    demo = OPTIONS[NAVDATA_DEMO_TAG]
+    has_demo = ((packets['demo_tag'] == NAVDATA_DEMO_TAG) &
+                (packets['demo_size'] >= demo.size + 4))
+    out['has_demo'][rows] = has_demo
+    demo_rows = rows[has_demo]
+    for name, code in demo.fields:
+        out[name][demo_rows] = packets[name][has_demo]
+
+
+def decode_log(log):
+    """
+    Decodes every entry of a ``NavdataLog`` (or any iterable of
+    ``(timestamp, data)``).
+    """
+    timestamps = []
+    packets = []
+    for timestamp, data in log:
+        timestamps.append(timestamp)
+        packets.append(data)
+    return decode_packets(packets, timestamps)
+
+
+def scalar_columns(records):
+    """
+    The names of the fields of ``records`` that are scalars (the camera
+    matrices of the demo option are left out).
+    """
+    return [name for name in records.dtype.names
+            if records.dtype[name].shape == ()]
+
+
+def save_csv(records, path, columns=None):
+    """
+    Writes the scalar fields (or ``columns``) of ``records`` as CSV.
+    """
+    require_numpy()
+    columns = columns or scalar_columns(records)
+    table = np.column_stack([records[name].astype(np.float64) for name in columns])
+    np.savetxt(path, table, delimiter=',', header=','.join(columns),
+               comments='', fmt='%.17g')
+
+
+def save_parquet(records, path, columns=None):
+    """
+    Writes the scalar fields (or ``columns``) of ``records`` as Parquet.
+    Needs pandas and pyarrow (or fastparquet).
+    """
+    import pandas
+    columns = columns or scalar_columns(records)
+    pandas.DataFrame(dict((name, records[name]) for name in columns),
+                     columns=columns).to_parquet(path)
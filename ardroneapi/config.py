@@ -0,0 +1,210 @@
+"""
+The configuration of the drone.
+
+The drone sends its whole configuration, one ``name = value`` line per key,
+on the TCP config port after a ``CTRL`` command with
+``CFG_GET_CONTROL_MODE``. Keys are changed one at a time with the ``CONFIG``
+AT command, which the drone acknowledges by setting the "command ACK" bit of
+the state word until it receives a ``CTRL`` with ``ACK_CONTROL_MODE``.
+
+>>> drone.connect()
+>>> drone.connect_nav()
+>>> drone.config['control:altitude_max'] # reads the configuration once
+3000
+>>> drone.set_config('control:altitude_max', 5000)
+>>> drone.config['control:altitude_max'] # from the cache, once acknowledged
+5000
+>>> drone.config.invalidate() # read it again on the next access
+
+Values are typed: ``TRUE``/``FALSE`` are booleans, numbers are ints or
+floats and everything else stays a string.
+"""
+import logging
+import socket
+import threading
+
+from ardroneapi import constants
+from ardroneapi.scheduler import clock
+
+log = logging.getLogger(__name__)
+
+
+def parse_value(text):
+    """
+    The Python value of a configuration value as sent by the drone.
+    """
+    upper = text.upper()
+    if upper == 'TRUE':
+        return True
+    if upper == 'FALSE':
+        return False
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def format_value(value):
+    """
+    The inverse of ``parse_value``.
+    """
+    if value is True:
+        return 'TRUE'
+    if value is False:
+        return 'FALSE'
+    if isinstance(value, float):
+        return repr(value)
+    value = str(value)
+    if '"' in value:
+        raise ValueError("Configuration values can not contain '\"': %r" % value)
+    return value
+
+
+class ConfigParser(object):
+    """
+    Parses a configuration dump incrementally: ``feed`` it the data as it is
+    received and every complete line is parsed right away, so only a partial
+    line is ever kept around.
+    """
+    def __init__(self):
+        self.values = {}
+        self.rest = b''
+
+    def feed(self, data):
+        lines = (self.rest + data).split(b'\n')
+        self.rest = lines.pop()
+        for line in lines:
+            self.parse_line(line)
+
+    def parse_line(self, line):
+        line = line.strip(b'\0 \t\r').decode('ascii', 'replace')
+        if '=' in line:
+            key, value = line.split('=', 1)
+            self.values[key.strip()] = parse_value(value.strip())
+
+    def close(self):
+        """
+        Parses the last line (if it was not terminated) and returns the values.
+        """
+        if self.rest:
+            self.parse_line(self.rest)
+            self.rest = b''
+        return self.values
+
+
+def read_config(drone, timeout=1.0, buffer_size=4096):
+    """
+    Reads the configuration from the TCP config port of ``drone`` and returns
+    it as a dict. The drone keeps the connection open, so reading stops once
+    no data arrived for ``timeout`` seconds.
+    """
+    s = socket.create_connection((drone.drone_ip, drone.cfg_port), timeout)
+    parser = ConfigParser()
+    buf = bytearray(buffer_size)
+    try:
+        drone.send('CTRL', (constants.CFG_GET_CONTROL_MODE, 0))
+        while True:
+            try:
+                n = s.recv_into(buf)
+            except socket.timeout:
+                break
+            if not n:
+                break
+            parser.feed(bytes(buf[:n]))
+    finally:
+        s.close()
+    return parser.close()
+
+
+class DroneConfig(object):
+    """
+    A cache of the configuration of ``drone`` (``Drone.config``).
+
+    The configuration is read from the drone on the first access, and again
+    only after ``invalidate``: when a ``set`` was not acknowledged or when
+    the drone acknowledged a ``CONFIG`` that was not sent through the
+    drone's ``AckTracker`` (eg. by another client).
+
+    ``set`` sends the new value through the drone's ``AckTracker`` and the
+    cache is updated once the drone acknowledged it.
+    """
+    def __init__(self, drone, timeout=1.0):
+        self.drone = drone
+        self.timeout = timeout
+        self.values = {}
+        self.stale = True
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self.stale = True
+
+    def refresh(self):
+        """
+        Reads the whole configuration from the drone.
+        """
+        start = clock()
+        values = read_config(self.drone, self.timeout)
+        elapsed = clock() - start
+        log.debug('read %d configuration values in %.3fs', len(values), elapsed)
+        metrics = self.drone.metrics
+        if metrics is not None:
+            metrics.count('config.reads')
+            metrics.observe('config.read_time', elapsed)
+        self.update(values)
+
+    def update(self, values):
+        """
+        Replaces the cached configuration with ``values`` (eg. read by
+        ``AsyncDrone.get_config``).
+        """
+        with self._lock:
+            self.values = dict(values)
+            self.stale = False
+
+    def as_dict(self, refresh=False):
+        """
+        A copy of the configuration, read from the drone if needed.
+        """
+        if refresh or self.stale:
+            self.refresh()
+        with self._lock:
+            return dict(self.values)
+
+    # lookups read the cache in place, without copying it like as_dict
+
+    def get(self, name, default=None):
+        if self.stale:
+            self.refresh()
+        with self._lock:
+            return self.values.get(name, default)
+
+    def __getitem__(self, name):
+        if self.stale:
+            self.refresh()
+        with self._lock:
+            return self.values[name]
+
+    def __contains__(self, name):
+        if self.stale:
+            self.refresh()
+        with self._lock:
+            return name in self.values
+
+    def set(self, name, value):
+        """
+        Sends ``value`` (a bool, a number or a string) for the key ``name``.
+        Returns the ``TrackedCommand``.
+        """
+        def done(command):
+            if command.acked is None:
+                # we don't know whether the drone took the value
+                self.stale = True
+                return
+            with self._lock:
+                self.values[name] = value
+        params = ('"%s"' % name, '"%s"' % format_value(value))
+        return self.drone.acks.send('CONFIG', params, callback=done)
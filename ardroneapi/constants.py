@@ -34,4 +34,50 @@ ARDRONE_ANIMATION_THETA_20DEG_YAW_200DEG = 4
 ARDRONE_ANIMATION_THETA_20DEG_YAW_M200DEG = 5
 ARDRONE_ANIMATION_TURNAROUND = 6
 ARDRONE_ANIMATION_TURNAROUND_GODOWN = 7
-ARDRONE_ANIMATION_YAW_SHAKE = 8
\ No newline at end of file
+ARDRONE_ANIMATION_YAW_SHAKE = 8
+
+#===============================================================================
+# State Masks (see ardroneapi.navdata.DroneState)
+#===============================================================================
+ARDRONE_FLY_MASK = 1 << 0
+ARDRONE_VIDEO_MASK = 1 << 1
+ARDRONE_VISION_MASK = 1 << 2
+ARDRONE_CONTROL_MASK = 1 << 3
+ARDRONE_ALTITUDE_MASK = 1 << 4
+ARDRONE_USER_FEEDBACK_START = 1 << 5
+ARDRONE_COMMAND_MASK = 1 << 6
+ARDRONE_TRIM_COMMAND_MASK = 1 << 7
+ARDRONE_TRIM_RUNNING_MASK = 1 << 8
+ARDRONE_TRIM_RESULT_MASK = 1 << 9
+ARDRONE_NAVDATA_DEMO_MASK = 1 << 10
+ARDRONE_NAVDATA_BOOTSTRAP = 1 << 11
+ARDRONE_MOTORS_MASK = 1 << 12
+ARDRONE_COM_LOST_MASK = 1 << 13
+ARDRONE_GYROMETERS_DOWN = 1 << 14
+ARDRONE_VBAT_LOW = 1 << 15
+ARDRONE_VBAT_HIGH = 1 << 16
+ARDRONE_TIMER_ELAPSED = 1 << 17
+ARDRONE_NOT_ENOUGH_POWER = 1 << 18
+ARDRONE_ANGLES_OUT_OF_RANGE = 1 << 19
+ARDRONE_WIND_MASK = 1 << 20
+ARDRONE_ULTRASOUND_MASK = 1 << 21
+ARDRONE_CUTOUT_MASK = 1 << 22
+ARDRONE_PIC_VERSION_MASK = 1 << 23
+ARDRONE_ATCODEC_THREAD_ON = 1 << 24
+ARDRONE_NAVDATA_THREAD_ON = 1 << 25
+ARDRONE_VIDEO_THREAD_ON = 1 << 26
+ARDRONE_ACQ_THREAD_ON = 1 << 27
+ARDRONE_CTRL_WATCHDOG_MASK = 1 << 28
+ARDRONE_ADC_WATCHDOG_MASK = 1 << 29
+ARDRONE_COM_WATCHDOG_MASK = 1 << 30
+ARDRONE_EMERGENCY_MASK = 1 << 31
+
+#===============================================================================
+# Control Modes (of the CTRL command)
+#===============================================================================
+NO_CONTROL_MODE = 0
+ARDRONE_UPDATE_CONTROL_MODE = 1
+PIC_UPDATE_CONTROL_MODE = 2
+LOGS_GET_CONTROL_MODE = 3
+CFG_GET_CONTROL_MODE = 4
+ACK_CONTROL_MODE = 5
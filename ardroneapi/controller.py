@@ -0,0 +1,301 @@
+"""
+Holding the altitude, heading and position of the drone in closed loop.
+
+A ``HoldController`` is a navdata callback: every packet is turned into a
+``PCMD`` by PID controllers and sent right away, on the navdata thread, so
+there is no polling nor waiting for a scheduler tick between a measurement
+and the command correcting it:
+
+>>> controller = HoldController(drone)
+>>> drone.connect_nav(controller.update)
+>>> drone.takeoff()
+>>> controller.hold(altitude=1.5) # heading and position: where it is now
+>>> ...
+>>> controller.hold(altitude=1.0, heading=math.pi / 2)
+>>> controller.release() # hover, the application flies again
+>>> controller.stats()['latency']['p99']
+
+The controlled axes are:
+
+``altitude`` (m): ``gaz``, from the altitude of the demo option.
+``heading`` (rad, within [-pi, pi]): ``yaw``, from the ``psi`` of the demo
+option.
+``position`` ((x, y) in m): ``pitch`` and ``roll``, from the velocities of
+the demo option, integrated while the controller holds. Nothing measures the
+position, so it drifts: this holds the drone still rather than in place.
+
+By default the controllers use the demo option as it is, which costs a few
+microseconds per packet. With an ``estimator`` (a ``StateEstimator``, which
+the controller then updates itself) they use the filtered state, predicted
+``lookahead`` seconds ahead to make up for the delay of the link.
+
+While the controller holds, the commands of the application (``move``,
+``hover``, ...) are overridden with the next packet. If the scheduler runs,
+its setpoint is replaced too, so its ticks repeat the last command between
+two packets.
+
+``stats()`` measures the loop: ``latency`` (from the packet being received
+to its command being sent), ``compute_time`` (the controllers alone),
+``interval`` (between two commands) and ``jitter`` (the change of the
+interval from one command to the next). They also go to the drone's
+``metrics`` hook as ``control.latency``, ``control.jitter`` and
+``control.commands``.
+"""
+import math
+import threading
+
+from ardroneapi.estimator import MILLIDEGREES, MILLIMETERS
+from ardroneapi.metrics import Histogram
+from ardroneapi.scheduler import clock
+
+AXES = ('altitude', 'heading', 'position')
+
+
+def wrap_angle(angle):
+    return (angle + math.pi) % (2 * math.pi) - math.pi
+
+
+class PID(object):
+    """
+    A PID controller with an output limited to ``[-limit, limit]``.
+
+    The integral is bounded so ``ki * integral`` stays within ``limit``
+    (anti-windup). The derivative is that of the error: given to ``update``
+    when it is measured, otherwise differentiated and low-pass filtered with
+    the time constant ``derivative_time_constant``.
+    """
+    def __init__(self, kp, ki=0.0, kd=0.0, limit=1.0, derivative_time_constant=0.05):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.limit = limit
+        self.derivative_time_constant = derivative_time_constant
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.error = None
+
+    def update(self, error, dt, derivative=None):
+        """
+        The output for ``error``, ``dt`` seconds after the previous update.
+        """
+        if dt > 0:
+            if self.ki:
+                bound = self.limit / abs(self.ki)
+                self.integral = max(-bound, min(bound, self.integral + error * dt))
+            if derivative is None and self.error is not None:
+                alpha = dt / (self.derivative_time_constant + dt)
+                self.derivative += ((error - self.error) / dt - self.derivative) * alpha
+        if derivative is not None:
+            self.derivative = derivative
+        self.error = error
+        output = self.kp * error + self.ki * self.integral + self.kd * self.derivative
+        return max(-self.limit, min(self.limit, output))
+
+
+class HoldController(object):
+    """
+    Holds ``drone`` where ``hold`` says, see the module documentation.
+    """
+    def __init__(self, drone, estimator=None, lookahead=0.0, altitude_pid=None,
+                 heading_pid=None, position_pid=None):
+        self.drone = drone
+        self.estimator = estimator
+        self.lookahead = lookahead
+        self.altitude_pid = altitude_pid or PID(1.0, 0.2, 0.5)
+        self.heading_pid = heading_pid or PID(1.0, 0.0, 0.2)
+        # one for x and one for y, with the gains of ``position_pid``
+        pid = position_pid or PID(0.15, 0.0, 0.25, limit=0.3)
+        self.x_pid = pid
+        self.y_pid = PID(pid.kp, pid.ki, pid.kd, pid.limit, pid.derivative_time_constant)
+        # replaced as a whole by ``hold``, so ``update`` never sees a half
+        # updated one
+        self.targets = None
+        self.pcmd = None
+        # dead reckoning of the position, without an estimator
+        self.x = 0.0
+        self.y = 0.0
+        self.timestamp = None
+        self.updates = 0
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def holding(self):
+        return self.targets is not None
+
+    def hold(self, altitude=None, heading=None, position=None, axes=AXES):
+        """
+        Starts holding (or changes the targets of) the ``axes``. A target
+        that is None is where the drone is at the next packet.
+        """
+        scheduler = self.drone.scheduler
+        if scheduler is not None and scheduler.setpoint_filter is not None:
+            raise ValueError("The scheduler filters its setpoint, "
+                             "start it without a setpoint_filter")
+        for axis in axes:
+            if axis not in AXES:
+                raise ValueError("Unknown axis %r, not one of %s" % (axis, AXES))
+        if position is not None:
+            position = tuple(position)
+        self.targets = {
+            'altitude': altitude,
+            'heading': None if heading is None else wrap_angle(heading),
+            'position': position,
+            'axes': tuple(axes),
+            # the controllers start over with the next packet
+            'new': True,
+        }
+
+    def release(self):
+        """
+        Stops holding, and hovers.
+        """
+        # after the command of a packet being handled, not before
+        with self._lock:
+            self.targets = None
+            self.pcmd = None
+            self.drone.hover()
+
+    def measure(self, navdata, now):
+        """
+        ``(z, yaw, x, y, vx, vy, vz, yaw_rate)`` from ``navdata``, the rates
+        being None when they are not measured.
+        """
+        if self.estimator is not None:
+            self.estimator.update(navdata, now)
+            s = self.estimator.predict(now + self.lookahead)
+            return s.z, s.yaw, s.x, s.y, s.vx, s.vy, s.vz, s.yaw_rate
+        demo = navdata.demo
+        if demo is None:
+            return None
+        yaw = wrap_angle(demo.psi * MILLIDEGREES)
+        cos, sin = math.cos(yaw), math.sin(yaw)
+        forward, right = demo.vx * MILLIMETERS, demo.vy * MILLIMETERS
+        vx, vy = forward * cos - right * sin, forward * sin + right * cos
+        if self.timestamp is not None:
+            dt = now - self.timestamp
+            self.x += vx * dt
+            self.y += vy * dt
+        return demo.altitude * MILLIMETERS, yaw, self.x, self.y, vx, vy, None, None
+
+    def update(self, navdata):
+        """
+        Computes and sends the ``PCMD`` for ``navdata`` (a navdata callback).
+        """
+        now = navdata.received or clock()
+        with self._lock:
+            targets = self.targets
+            if targets is None:
+                if self.estimator is not None:
+                    self.estimator.update(navdata, now)
+                self.timestamp = None
+                return
+            started = clock()
+            measured = self.measure(navdata, now)
+            if measured is None:
+                return
+            dt = 0.0 if self.timestamp is None else now - self.timestamp
+            self.timestamp = now
+            pcmd = self.compute(targets, measured, dt)
+            computed = clock()
+            # under the lock, so ``release`` can not hover in between and
+            # be overwritten by this command
+            self.send(pcmd)
+            sent = clock()
+        self.record(now, started, computed, sent)
+
+    def compute(self, targets, measured, dt):
+        z, yaw, x, y, vx, vy, vz, yaw_rate = measured
+        if targets['new']:
+            # fill in the targets that are where the drone is now
+            held, targets = targets, dict(targets, new=False)
+            if targets['altitude'] is None:
+                targets['altitude'] = z
+            if targets['heading'] is None:
+                targets['heading'] = yaw
+            if targets['position'] is None:
+                targets['position'] = (x, y)
+            for pid in (self.altitude_pid, self.heading_pid, self.x_pid, self.y_pid):
+                pid.reset()
+            # unless ``hold`` was called again in the meantime
+            if self.targets is held:
+                self.targets = targets
+        axes = targets['axes']
+        roll = pitch = gaz = turn = 0.0
+        if 'altitude' in axes:
+            gaz = self.altitude_pid.update(
+                targets['altitude'] - z, dt, None if vz is None else -vz)
+        if 'heading' in axes:
+            turn = self.heading_pid.update(
+                wrap_angle(targets['heading'] - yaw), dt,
+                None if yaw_rate is None else -yaw_rate)
+        if 'position' in axes:
+            target_x, target_y = targets['position']
+            ax = self.x_pid.update(target_x - x, dt, -vx)
+            ay = self.y_pid.update(target_y - y, dt, -vy)
+            # from the world frame to the drone's: forwards is a negative
+            # pitch, right a positive roll
+            cos, sin = math.cos(yaw), math.sin(yaw)
+            pitch = -(ax * cos + ay * sin)
+            roll = -ax * sin + ay * cos
+        # a PID with an int limit clamps to an int, PCMD would send 1 not 1.0
+        return (1, float(roll), float(pitch), float(gaz), float(turn))
+
+    def send(self, pcmd):
+        drone = self.drone
+        scheduler = drone.scheduler
+        self.pcmd = pcmd
+        if scheduler is not None:
+            # the ticks repeat it until the next packet
+            scheduler.pcmd = pcmd
+            drone.send('PCMD', pcmd)
+        else:
+            drone.send_many([('COMWDG',), ('PCMD', pcmd)])
+
+    #===========================================================================
+    # statistics
+    #===========================================================================
+
+    def reset_stats(self):
+        self.latencies = Histogram()
+        self.compute_times = Histogram()
+        self.intervals = Histogram()
+        self.jitters = Histogram()
+        self._sent = None
+        self._interval = None
+
+    def record(self, received, started, computed, sent):
+        self.updates += 1
+        latency = sent - received
+        self.latencies.add(latency)
+        self.compute_times.add(computed - started)
+        metrics = self.drone.metrics
+        if metrics is not None:
+            metrics.count('control.commands')
+            metrics.observe('control.latency', latency)
+        if self._sent is not None:
+            interval = sent - self._sent
+            self.intervals.add(interval)
+            if self._interval is not None:
+                jitter = abs(interval - self._interval)
+                self.jitters.add(jitter)
+                if metrics is not None:
+                    metrics.observe('control.jitter', jitter)
+            self._interval = interval
+        self._sent = sent
+
+    def stats(self):
+        """
+        The number of commands sent and a summary (see ``Histogram``) of the
+        ``latency``, ``compute_time``, ``interval`` and ``jitter`` (seconds).
+        """
+        return {
+            'updates': self.updates,
+            'latency': self.latencies.summary(),
+            'compute_time': self.compute_times.summary(),
+            'interval': self.intervals.summary(),
+            'jitter': self.jitters.summary(),
+        }
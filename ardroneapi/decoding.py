@@ -0,0 +1,235 @@
+"""
+Decoding video frames in a pool of worker processes.
+
+Decoding video takes far more CPU than flying the drone. Done in the process
+that sends the commands it would delay them, so a ``DecoderPool`` hands the
+frames to worker processes instead:
+
+>>> pool = DecoderPool(my_decoder, workers=2)
+>>> pool.start()
+>>> receiver = drone.connect_video()
+>>> pool.submit(receiver.frames.get()) # releases the frame
+>>> decoded = pool.results.get()
+>>> decoded.header.frame_number, decoded.result, decoded.latency
+>>> pool.stop()
+
+``my_decoder(data, header)`` runs in the workers with a memoryview of the
+payload and the ``PaVEHeader`` of a frame. It has to be a module level
+function (it is pickled), and what it returns (eg. an image as a NumPy array,
+or some metadata) is sent back to the ``results`` queue.
+
+The payloads go through shared memory: ``slots`` buffers of ``slot_size``
+bytes, allocated once and shared with the workers, so ``submit`` costs one
+copy and a small message whatever the size of the frame. If every slot is
+busy the frame is dropped (``dropped``) rather than waiting for the workers,
+and the workers run with a lower priority (``nice``), so decoding never
+holds up the caller.
+
+Recorded streams can be decoded the same way, eg. a capture of the video
+port made with ``nc 192.168.1.1 5555 > flight.pave``:
+
+>>> with open('flight.pave', 'rb') as f:
+...     for header, payload in read_frames(f):
+...         pool.submit_data(payload, header)
+"""
+import collections
+import multiprocessing
+import os
+import threading
+import time
+import zlib
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from multiprocessing.sharedctypes import RawArray
+
+from ardroneapi.video import PaVEHeader, pave_struct, PAVE_SIGNATURE
+
+DecodedFrame = collections.namedtuple('DecodedFrame', (
+    'header', 'result', 'error', 'decode_time', 'latency'))
+
+
+def frame_info(data, header):
+    """
+    A decoder that does not decode: the size, type and CRC32 of the frame.
+    """
+    try:
+        crc32 = zlib.crc32(data)
+    except TypeError:
+        # Python 2 does not take memoryviews
+        crc32 = zlib.crc32(data.tobytes())
+    return {
+        'frame_number': header.frame_number,
+        'frame_type': header.frame_type,
+        'size': len(data),
+        'crc32': crc32 & 0xFFFFFFFF,
+    }
+
+
+def read_frames(f):
+    """
+    Yields ``(header, payload)`` for every frame of a recorded stream (a file
+    object).
+    """
+    while True:
+        data = f.read(pave_struct.size)
+        if len(data) < pave_struct.size:
+            return
+        header = PaVEHeader._make(pave_struct.unpack(data))
+        if header.signature != PAVE_SIGNATURE:
+            raise ValueError("Not a PaVE frame at offset %d" % (f.tell() - len(data)))
+        f.read(header.header_size - pave_struct.size)
+        payload = f.read(header.payload_size)
+        if len(payload) < header.payload_size:
+            return
+        yield header, payload
+
+
+def byte_view(buffer):
+    view = memoryview(buffer)
+    # a ctypes array has the format '<B', which bytes can not be assigned to
+    if hasattr(view, 'cast'):
+        view = view.cast('B')
+    return view
+
+
+def decoder_worker(buffer, slot_size, decoder, tasks, results, nice):
+    """
+    The loop of the worker processes: decodes the slots named in ``tasks``
+    until it gets None.
+    """
+    if nice and hasattr(os, 'nice'):
+        os.nice(nice)
+    view = byte_view(buffer)
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        slot, length, header = task
+        start = slot * slot_size
+        data = view[start:start + length]
+        started = time.time()
+        try:
+            result, error = decoder(data, header), None
+        except Exception as e:
+            result, error = None, '%s: %s' % (type(e).__name__, e)
+        results.put((slot, header, result, error, time.time() - started))
+
+
+class DecoderPool(object):
+    """
+    Decodes frames with ``decoder`` in ``workers`` processes (one less than
+    the number of CPUs by default). See the module documentation.
+    """
+    def __init__(self, decoder=frame_info, workers=None, slots=None,
+                 slot_size=256 * 1024, queue_size=16, nice=5):
+        if workers is None:
+            workers = max(multiprocessing.cpu_count() - 1, 1)
+        self.decoder = decoder
+        self.workers = workers
+        self.slot_size = slot_size
+        self.slot_count = slots or 2 * workers
+        self.nice = nice
+        self.buffer = RawArray('B', self.slot_count * slot_size)
+        self.view = byte_view(self.buffer)
+        self.free = collections.deque(range(self.slot_count))
+        self.submitted_at = [None] * self.slot_count
+        self.tasks = multiprocessing.Queue()
+        self.decoded = multiprocessing.Queue()
+        self.results = queue.Queue(queue_size)
+        self.callbacks = []
+        self.processes = []
+        self.collector = None
+        self.submitted = 0
+        self.dropped = 0
+        self.errors = 0
+        self.overflows = 0
+
+    def add_callback(self, callback):
+        """
+        ``callback`` is called with each ``DecodedFrame``, on the thread
+        collecting the results.
+        """
+        self.callbacks.append(callback)
+
+    def start(self):
+        for i in range(self.workers):
+            p = multiprocessing.Process(target=decoder_worker, args=(
+                self.buffer, self.slot_size, self.decoder, self.tasks,
+                self.decoded, self.nice))
+            p.daemon = True
+            p.start()
+            self.processes.append(p)
+        self.collector = threading.Thread(target=self.collect)
+        self.collector.daemon = True
+        self.collector.start()
+
+    def submit(self, frame):
+        """
+        Submits a frame of a ``VideoReceiver`` and releases it. Returns False
+        if it was dropped.
+        """
+        try:
+            return self.submit_data(frame.data, frame.header)
+        finally:
+            frame.release()
+
+    def submit_data(self, data, header):
+        """
+        Submits the payload ``data`` of a frame with its ``PaVEHeader``.
+        Returns False if it was dropped.
+        """
+        length = len(data)
+        if length > self.slot_size:
+            self.dropped += 1
+            return False
+        try:
+            slot = self.free.popleft()
+        except IndexError:
+            # every slot is still being decoded
+            self.dropped += 1
+            return False
+        start = slot * self.slot_size
+        self.view[start:start + length] = data
+        self.submitted_at[slot] = time.time()
+        self.tasks.put((slot, length, header))
+        self.submitted += 1
+        return True
+
+    def collect(self):
+        while True:
+            item = self.decoded.get()
+            if item is None:
+                return
+            slot, header, result, error, decode_time = item
+            latency = time.time() - self.submitted_at[slot]
+            self.free.append(slot)
+            if error is not None:
+                self.errors += 1
+            decoded = DecodedFrame(header, result, error, decode_time, latency)
+            try:
+                self.results.put_nowait(decoded)
+            except queue.Full:
+                # drop the oldest result, the consumer is behind
+                try:
+                    self.results.get_nowait()
+                except queue.Empty:
+                    pass
+                self.overflows += 1
+                self.results.put_nowait(decoded)
+            for callback in self.callbacks:
+                callback(decoded)
+
+    def stop(self, timeout=None):
+        for p in self.processes:
+            self.tasks.put(None)
+        for p in self.processes:
+            p.join(timeout)
+        self.processes = []
+        if self.collector is not None:
+            self.decoded.put(None)
+            self.collector.join(timeout)
+            self.collector = None
@@ -0,0 +1,270 @@
+"""
+Estimating the pose and velocity of the drone from its navdata. Needs NumPy.
+
+The demo option gives the attitude, the altitude and the velocities measured
+by the drone, with noise and at irregular intervals. A ``StateEstimator``
+fuses them into a smoothed state that can be asked for at any time, eg. a
+little ahead to make up for the latency of the link:
+
+>>> estimator = StateEstimator()
+>>> drone.connect_nav(estimator.update)
+>>> estimator.state.z # at the last packet
+>>> estimator.predict(clock() + 0.05).yaw # 50ms from now
+
+and the same filter runs over recorded flights:
+
+>>> from ardroneapi.recorder import NavdataLog
+>>> states = estimate_log(NavdataLog('flights/2011-05-01'))
+>>> states['vz'].max()
+
+Each of the six axes (x, y, z, roll, pitch and yaw) has its own constant
+velocity Kalman filter: a position and a rate, driven by a random
+acceleration of ``acceleration_noise`` (the standard deviation, per axis).
+The six filters are updated together, as arrays. They are fed with:
+
+- the altitude, roll, pitch and yaw as positions;
+- the horizontal velocities, turned from the drone's frame into the world
+  frame with the measured yaw, as rates of x and y;
+- the vertical velocity as the rate of z, only if ``vz_noise`` is given
+  (most firmwares send 0).
+
+Everything is in SI units (m, m/s, rad, rad/s) and the yaw is kept within
+[-pi, pi]. Nothing measures x and y: they start at 0 at the first packet and
+are integrated from the velocities, so they drift.
+
+Live, timestamps are the ``clock()`` times the packets were received at,
+so ``predict`` should be given times from ``clock()`` too.
+Replayed, they are the timestamps of the log.
+"""
+import collections
+import math
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ardroneapi.scheduler import clock
+
+AXES = ('x', 'y', 'z', 'roll', 'pitch', 'yaw')
+RATES = ('vx', 'vy', 'vz', 'roll_rate', 'pitch_rate', 'yaw_rate')
+YAW = AXES.index('yaw')
+
+State = collections.namedtuple('State', ('timestamp',) + AXES + RATES)
+
+# demo option units to SI
+MILLIDEGREES = math.pi / 180000.0
+MILLIMETERS = 0.001
+
+# the variance of what is not known yet at the first packet
+INITIAL_VARIANCE = 1.0
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError("ardroneapi.estimator needs NumPy (pip install numpy)")
+
+
+def wrap_angle(angle):
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+
+def demo_measurements(theta, phi, psi, altitude, vx, vy, vz):
+    """
+    The positions and rates measured by demo option values, in SI units and
+    the world frame, as two arrays whose last dimension is the axis. Works on
+    scalars as well as on whole columns.
+    """
+    roll = np.asarray(phi, dtype=np.float64) * MILLIDEGREES
+    pitch = np.asarray(theta, dtype=np.float64) * MILLIDEGREES
+    yaw = wrap_angle(np.asarray(psi, dtype=np.float64) * MILLIDEGREES)
+    vx = np.asarray(vx, dtype=np.float64) * MILLIMETERS
+    vy = np.asarray(vy, dtype=np.float64) * MILLIMETERS
+    cos, sin = np.cos(yaw), np.sin(yaw)
+    zero = np.zeros_like(yaw)
+    positions = np.stack([zero, zero, np.asarray(altitude, dtype=np.float64) * MILLIMETERS,
+                          roll, pitch, yaw], axis=-1)
+    rates = np.stack([vx * cos - vy * sin, vx * sin + vy * cos,
+                      np.asarray(vz, dtype=np.float64) * MILLIMETERS,
+                      zero, zero, zero], axis=-1)
+    return positions, rates
+
+
+class StateEstimator(object):
+    """
+    Fuses navdata into a ``State``, see the module documentation. The
+    ``*_noise`` are standard deviations of the measurements; the
+    ``acceleration_noise`` is per axis, in the order of ``AXES``.
+    """
+    def __init__(self, altitude_noise=0.03, angle_noise=0.01, velocity_noise=0.05,
+                 vz_noise=None, acceleration_noise=(1.0, 1.0, 0.5, 5.0, 5.0, 2.0)):
+        require_numpy()
+        inf = np.inf
+        # measurement variances, infinite for what is not measured
+        self.position_variance = np.array([
+            inf, inf, altitude_noise, angle_noise, angle_noise, angle_noise]) ** 2
+        self.rate_variance = np.array([
+            velocity_noise, velocity_noise, inf if vz_noise is None else vz_noise,
+            inf, inf, inf]) ** 2
+        self.acceleration_variance = np.asarray(acceleration_noise, dtype=np.float64) ** 2
+        self.updates = 0
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the state, the next packet starts over (and x, y from 0).
+        """
+        with self._lock:
+            self.timestamp = None
+            self.position = np.zeros(6)
+            self.rate = np.zeros(6)
+            # the covariance of each axis: [[p00, p01], [p01, p11]]
+            self.p00 = np.zeros(6)
+            self.p01 = np.zeros(6)
+            self.p11 = np.zeros(6)
+
+    def initialize(self, timestamp, positions, rates):
+        measured = np.isfinite(self.position_variance)
+        self.position = np.where(measured, positions, 0.0)
+        self.p00 = np.where(measured, self.position_variance, 0.0)
+        measured = np.isfinite(self.rate_variance)
+        self.rate = np.where(measured, rates, 0.0)
+        self.p11 = np.where(measured, self.rate_variance, INITIAL_VARIANCE)
+        self.p01 = np.zeros(6)
+        self.timestamp = timestamp
+
+    def step(self, timestamp, positions, rates):
+        """
+        Advances the filters to ``timestamp`` and corrects them with the
+        measured ``positions`` and ``rates`` (arrays in the order of
+        ``AXES``, see ``demo_measurements``).
+        """
+        if self.timestamp is None:
+            self.initialize(timestamp, positions, rates)
+            return
+        p, v = self.position, self.rate
+        p00, p01, p11 = self.p00, self.p01, self.p11
+        dt = timestamp - self.timestamp
+        if dt > 0:
+            q = self.acceleration_variance
+            p = p + v * dt
+            p00 = p00 + dt * (2 * p01 + dt * p11) + q * dt ** 3 / 3
+            p01 = p01 + dt * p11 + q * dt ** 2 / 2
+            p11 = p11 + q * dt
+            self.timestamp = timestamp
+        # positions (the gains are 0 on the axes that are not measured)
+        s = p00 + self.position_variance
+        k0, k1 = p00 / s, p01 / s
+        innovation = positions - p
+        innovation[YAW] = wrap_angle(innovation[YAW])
+        p = p + k0 * innovation
+        v = v + k1 * innovation
+        p00, p01, p11 = (1 - k0) * p00, (1 - k0) * p01, p11 - k1 * p01
+        # rates
+        s = p11 + self.rate_variance
+        k0, k1 = p01 / s, p11 / s
+        innovation = rates - v
+        p = p + k0 * innovation
+        v = v + k1 * innovation
+        p00, p01, p11 = p00 - k0 * p01, p01 - k0 * p11, (1 - k1) * p11
+        p[YAW] = wrap_angle(p[YAW])
+        self.position, self.rate = p, v
+        self.p00, self.p01, self.p11 = p00, p01, p11
+
+    def update(self, navdata, timestamp=None):
+        """
+        Corrects the state with a ``NavigationData`` (a navdata callback) as
+        of ``timestamp``, by default when it was received. Packets without a
+        demo option are ignored.
+        """
+        demo = navdata.demo
+        if demo is None:
+            return
+        # as demo_measurements, without its overhead on scalars
+        yaw = (demo.psi * MILLIDEGREES + math.pi) % (2 * math.pi) - math.pi
+        cos, sin = math.cos(yaw), math.sin(yaw)
+        vx, vy = demo.vx * MILLIMETERS, demo.vy * MILLIMETERS
+        positions = np.array([0.0, 0.0, demo.altitude * MILLIMETERS,
+                              demo.phi * MILLIDEGREES, demo.theta * MILLIDEGREES, yaw])
+        rates = np.array([vx * cos - vy * sin, vx * sin + vy * cos,
+                          demo.vz * MILLIMETERS, 0.0, 0.0, 0.0])
+        with self._lock:
+            if timestamp is None:
+                timestamp = navdata.received or clock()
+            self.step(timestamp, positions, rates)
+            self.updates += 1
+
+    @property
+    def state(self):
+        """
+        The ``State`` at the last update, or None before the first one.
+        """
+        with self._lock:
+            if self.timestamp is None:
+                return None
+            return State(self.timestamp, *(self.position.tolist() + self.rate.tolist()))
+
+    def predict(self, timestamp=None):
+        """
+        The ``State`` extrapolated to ``timestamp`` (now by default), or None
+        before the first update.
+        """
+        if timestamp is None:
+            timestamp = clock()
+        with self._lock:
+            if self.timestamp is None:
+                return None
+            position = self.position + self.rate * (timestamp - self.timestamp)
+            rate = self.rate
+        position[YAW] = wrap_angle(position[YAW])
+        return State(timestamp, *(position.tolist() + rate.tolist()))
+
+    def variances(self):
+        """
+        The variances of the positions and of the rates, in the order of
+        ``AXES``.
+        """
+        with self._lock:
+            return self.p00.copy(), self.p11.copy()
+
+
+def state_dtype():
+    return np.dtype([(name, '<f8') for name in State._fields])
+
+STATE_DTYPE = state_dtype() if np is not None else None
+
+
+def estimate(records, estimator=None):
+    """
+    Runs an estimator (a new ``StateEstimator`` by default) over decoded
+    records (``ardroneapi.bulk.RECORD_DTYPE``), and returns the ``State``
+    after each as an array of ``STATE_DTYPE``. Only the valid records with a
+    demo option are used, so there may be fewer states than records.
+    """
+    require_numpy()
+    estimator = estimator or StateEstimator()
+    records = records[records['valid'] & records['has_demo']]
+    # converted all at once, only the recursion goes record by record
+    positions, rates = demo_measurements(
+        records['theta'], records['phi'], records['psi'], records['altitude'],
+        records['vx'], records['vy'], records['vz'])
+    timestamps = records['timestamp'].tolist()
+    out = np.zeros((len(records), 13))
+    with estimator._lock:
+        for i, timestamp in enumerate(timestamps):
+            estimator.step(timestamp, positions[i], rates[i])
+            out[i, 0] = estimator.timestamp
+            out[i, 1:7] = estimator.position
+            out[i, 7:] = estimator.rate
+        estimator.updates += len(timestamps)
+    return out.view(STATE_DTYPE).reshape(len(records))
+
+
+def estimate_log(log, estimator=None):
+    """
+    ``estimate`` over every entry of a ``NavdataLog``.
+    """
+    from ardroneapi.bulk import decode_log
+    return estimate(decode_log(log), estimator)
@@ -0,0 +1,235 @@
+"""
+Flying several drones from one process.
+
+By default every drone is at 192.168.1.1 on its own ad-hoc network. To fly a
+fleet, the drones have to be on one network with an address each (eg.
+configured through telnet), then:
+
+>>> fleet = Fleet(['192.168.1.10', '192.168.1.11', '192.168.1.12'])
+>>> fleet.connect()
+>>> fleet.broadcast('flat_trims')
+>>> fleet.broadcast('takeoff')
+>>> fleet.drones[0].move(0.1, 0, 0, 0)
+>>> fleet.drones[1].navdata.flags.flying
+>>> fleet.broadcast('land')
+>>> fleet.disconnect()
+
+All the drones share one command socket and one navdata socket, served by a
+single thread: navdata is demultiplexed by the address of the sender and the
+setpoints of all the drones are sent on a common fixed-rate tick. Adding a
+drone costs one decode per navdata packet and one datagram per tick, not a
+thread or a socket.
+"""
+import logging
+import select
+import socket
+import struct
+import threading
+
+from ardroneapi import Drone
+from ardroneapi.navdata import NavigationData, NavdataError, SequenceTracker
+from ardroneapi.scheduler import CommandScheduler, clock
+
+log = logging.getLogger(__name__)
+
+
+class FleetDrone(Drone):
+    """
+    A drone of a ``Fleet``. It has the whole ``Drone`` API but sends through
+    the fleet's socket, and its setpoint (``move``, ``hover``, ``takeoff``,
+    ...) is sent by the fleet on every tick.
+    """
+    def __init__(self, fleet, drone_ip):
+        super(FleetDrone, self).__init__(drone_ip, fleet.local_ip, fleet.multicast_ip)
+        self.fleet = fleet
+        self.address = (self.drone_ip, self.cmd_port)
+        self.tracker = SequenceTracker()
+        self.latest = None
+        self.callbacks = [self.acks.navdata_received]
+        # only holds the setpoint: the fleet's thread does the ticking
+        self.scheduler = CommandScheduler(self, fleet.rate)
+
+    def connect(self):
+        raise Exception("Drones of a fleet are connected with Fleet.connect")
+
+    connect_cmd = connect_nav = connect
+
+    def disconnect(self):
+        raise Exception("Drones of a fleet are disconnected with Fleet.disconnect")
+
+    disconnect_cmd = disconnect_nav = disconnect
+
+    def start_scheduler(self, rate=33.0, setpoint_filter=None):
+        raise Exception("The setpoints of a fleet are sent by the fleet")
+
+    def raw_send(self, data):
+        self.fleet.sendto(data, self.address)
+
+    @property
+    def navdata(self):
+        return self.latest
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def navdata_received(self, data):
+        received = clock()
+        try:
+            navdata = NavigationData(data)
+        except (NavdataError, struct.error):
+            self.fleet.errors += 1
+            return
+        navdata.received = received
+        if not self.tracker.check(navdata, self.fleet.verify):
+            return
+        self.latest = navdata
+        for callback in self.callbacks:
+            try:
+                callback(navdata)
+            except Exception:
+                # not to stop the fleet's thread
+                self.fleet.callback_errors += 1
+                log.exception('navdata callback %r of %s failed', callback, self.drone_ip)
+
+
+class Fleet(threading.Thread):
+    """
+    Drives the drones at ``drone_ips`` from a single thread. See the module
+    documentation.
+    """
+    buffer_size = 4096
+    max_batch = 256
+
+    def __init__(self, drone_ips, local_ip=None, multicast_ip=None, rate=33.0,
+                 verify=True):
+        super(Fleet, self).__init__()
+        self.daemon = True
+        self.local_ip = local_ip
+        self.multicast_ip = multicast_ip
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.verify = verify
+        self.drones = [FleetDrone(self, ip) for ip in drone_ips]
+        self.by_ip = dict((drone.drone_ip, drone) for drone in self.drones)
+        self.cmd_socket = None
+        self.nav_socket = None
+        self.running = False
+        self.errors = 0
+        self.callback_errors = 0
+        self.unknown_senders = 0
+        # the datagrams ``call_all`` is holding back, per thread, so the
+        # commands other threads send meanwhile go out as usual
+        self._local = threading.local()
+        self._send_lock = threading.Lock()
+
+    def connect(self):
+        template = self.drones[0]
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.bind((template.local_ip, template.cmd_port))
+        self.cmd_socket = s
+        self.nav_socket = template.create_nav_socket()
+        self.nav_socket.setblocking(False)
+        self.broadcast('activate_detailed_navdata')
+        for drone in self.drones:
+            # pokes the drone from the navdata port (see Drone.poke_nav)
+            self.nav_socket.sendto(b'\0', (drone.drone_ip, drone.nav_port))
+        self.start()
+
+    def disconnect(self):
+        self.stop()
+        self.cmd_socket.close()
+        self.cmd_socket = None
+        self.nav_socket.close()
+        self.nav_socket = None
+
+    def sendto(self, data, address):
+        outbox = getattr(self._local, 'outbox', None)
+        if outbox is not None:
+            outbox.append((data, address))
+        else:
+            self.cmd_socket.sendto(data, address)
+
+    def call_all(self, function):
+        """
+        Calls ``function(drone)`` for every drone. The commands of all the
+        drones are built first and then sent back to back, so the drones
+        receive them as simultaneously as possible.
+        """
+        local = self._local
+        if getattr(local, 'outbox', None) is not None:
+            # called from within ``call_all``: part of its batch
+            for drone in self.drones:
+                function(drone)
+            return
+        with self._send_lock:
+            outbox = local.outbox = []
+            try:
+                for drone in self.drones:
+                    function(drone)
+            finally:
+                local.outbox = None
+            sendto = self.cmd_socket.sendto
+            for data, address in outbox:
+                sendto(data, address)
+
+    def broadcast(self, name, *args, **kwargs):
+        """
+        Calls the ``Drone`` method ``name`` on every drone, see ``call_all``.
+        """
+        self.call_all(lambda drone: getattr(drone, name)(*args, **kwargs))
+
+    def receive(self):
+        """
+        Reads and dispatches the datagrams waiting on the navdata socket, at
+        most ``max_batch`` of them so a flood can not delay the ticks.
+        """
+        recvfrom = self.nav_socket.recvfrom
+        by_ip = self.by_ip
+        for i in range(self.max_batch):
+            try:
+                data, sender = recvfrom(self.buffer_size)
+            except socket.error:
+                # nothing left to read (EWOULDBLOCK)
+                return
+            drone = by_ip.get(sender[0])
+            if drone is None:
+                self.unknown_senders += 1
+                continue
+            drone.navdata_received(data)
+
+    def tick(self, delay):
+        def tick(drone):
+            drone.scheduler.record_jitter(delay)
+            drone.scheduler.tick()
+        self.call_all(tick)
+
+    def start(self):
+        self.running = True
+        super(Fleet, self).start()
+
+    def run(self):
+        period = self.period
+        next_tick = clock()
+        while self.running:
+            timeout = max(next_tick - clock(), 0)
+            try:
+                readable = select.select([self.nav_socket], [], [], timeout)[0]
+            except (select.error, ValueError):
+                # the socket has been closed underneath us
+                break
+            if readable:
+                self.receive()
+            now = clock()
+            if now >= next_tick:
+                self.tick(now - next_tick)
+                next_tick += period
+                if clock() > next_tick:
+                    missed = int((clock() - next_tick) / period) + 1
+                    for drone in self.drones:
+                        drone.scheduler.overruns += missed
+                    next_tick += missed * period
+
+    def stop(self, timeout=None):
+        self.running = False
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
@@ -0,0 +1,331 @@
+"""
+Sharing the navdata of one drone between many consumers.
+
+Instead of every consumer opening the navdata port and decoding every
+packet, a ``TelemetryHub`` gets the packets decoded once by the drone's
+``NavdataReceiver`` and fans them out:
+
+>>> hub = TelemetryHub()
+>>> drone.connect_nav(hub.publish)
+>>> hub.subscribe(ui.update, policy=LATEST) # in this process
+>>> hub.subscribe(logger.write, policy=BLOCK, queue_size=1000)
+>>> hub.serve('/tmp/drone.sock') # to other processes on this host
+
+and in another process:
+
+>>> for record in HubClient('/tmp/drone.sock'):
+...     print(record.altitude)
+
+Each subscriber has its own bounded queue and thread, so a slow subscriber
+never holds up the others nor the receiver; what happens when its queue is
+full is its ``policy``:
+
+``DROP_OLDEST``: the oldest packet is dropped (the default).
+``DROP_NEWEST``: the new packet is dropped.
+``LATEST``: only the newest packet is kept (a queue of one).
+``BLOCK``: the receiver waits up to ``block_timeout`` seconds for room, then
+drops the new packet. For consumers that must not lose data, at the price
+of delaying the others.
+``INLINE``: no queue nor thread, the callback is called right away on the
+receiver's thread. Only for callbacks that are very quick.
+
+In-process subscribers get the ``NavigationData``. Other processes get
+``NavdataRecord``s over a Unix datagram socket: the record is packed once
+per packet (``record_struct``) whatever the number of clients.
+"""
+import collections
+import errno
+import os
+import socket
+import struct
+import tempfile
+import threading
+
+from ardroneapi.navdata import RECORD_FIELDS, NavdataRecord, unpack_into
+
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+LATEST = 'latest'
+BLOCK = 'block'
+INLINE = 'inline'
+
+POLICIES = (DROP_OLDEST, DROP_NEWEST, LATEST, BLOCK, INLINE)
+
+# the fields of a NavdataRecord, as sent to the clients
+record_struct = struct.Struct('<%dd' % len(RECORD_FIELDS))
+
+SUBSCRIBE = b'subscribe'
+UNSUBSCRIBE = b'unsubscribe'
+
+
+class Subscriber(threading.Thread):
+    """
+    Delivers the packets published by a ``TelemetryHub`` to ``callback``
+    according to ``policy``. ``delivered`` and ``dropped`` count the packets.
+    """
+    def __init__(self, callback, policy=DROP_OLDEST, queue_size=16,
+                 block_timeout=0.05, packed=False):
+        super(Subscriber, self).__init__()
+        if policy not in POLICIES:
+            raise ValueError("Unknown policy %r, not one of %s" % (policy, POLICIES))
+        self.daemon = True
+        self.callback = callback
+        self.policy = policy
+        self.queue_size = 1 if policy == LATEST else queue_size
+        self.block_timeout = block_timeout
+        # gets packed records instead of NavigationData
+        self.packed = packed
+        self.items = collections.deque()
+        self.running = False
+        self.delivered = 0
+        self.dropped = 0
+        self._changed = threading.Condition(threading.Lock())
+
+    def put(self, item):
+        if self.policy == INLINE:
+            self.callback(item)
+            self.delivered += 1
+            return
+        with self._changed:
+            if len(self.items) >= self.queue_size:
+                if self.policy == BLOCK:
+                    self._changed.wait(self.block_timeout)
+                if self.policy in (DROP_OLDEST, LATEST):
+                    self.items.popleft()
+                    self.dropped += 1
+                elif len(self.items) >= self.queue_size:
+                    self.dropped += 1
+                    return
+            self.items.append(item)
+            self._changed.notify_all()
+
+    def start(self):
+        self.running = True
+        if self.policy != INLINE:
+            super(Subscriber, self).start()
+
+    def run(self):
+        items = self.items
+        while self.running:
+            with self._changed:
+                while not items and self.running:
+                    self._changed.wait(0.5)
+                if not self.running:
+                    break
+                item = items.popleft()
+                # room for a blocked publisher
+                self._changed.notify_all()
+            self.callback(item)
+            self.delivered += 1
+
+    def stop(self, timeout=None):
+        self.running = False
+        with self._changed:
+            self._changed.notify_all()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+
+class TelemetryHub(object):
+    """
+    Fans out the packets given to ``publish`` (a navdata callback) to its
+    subscribers. See the module documentation.
+    """
+    def __init__(self):
+        # the subscribers getting NavigationData, and packed records
+        self.subscribers = []
+        self.packed_subscribers = []
+        self.published = 0
+        self.server = None
+        self._record = NavdataRecord()
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback, policy=DROP_OLDEST, queue_size=16,
+                  block_timeout=0.05, packed=False):
+        """
+        Calls ``callback`` with every packet published from now on, and
+        returns the ``Subscriber``. With ``packed`` the callback gets records
+        packed with ``record_struct`` instead of ``NavigationData``.
+        """
+        subscriber = Subscriber(callback, policy, queue_size, block_timeout, packed)
+        subscriber.start()
+        with self._lock:
+            # replaced, not changed, so ``publish`` needs no lock
+            if packed:
+                self.packed_subscribers = self.packed_subscribers + [subscriber]
+            else:
+                self.subscribers = self.subscribers + [subscriber]
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self.subscribers = [s for s in self.subscribers if s is not subscriber]
+            self.packed_subscribers = [s for s in self.packed_subscribers
+                                       if s is not subscriber]
+        subscriber.stop()
+
+    def publish(self, navdata):
+        self.published += 1
+        for subscriber in self.subscribers:
+            subscriber.put(navdata)
+        packed_subscribers = self.packed_subscribers
+        if packed_subscribers:
+            # unpacked and packed once, the same bytes go to every one
+            packed = pack_record(unpack_into(navdata.raw_data, self._record))
+            for subscriber in packed_subscribers:
+                subscriber.put(packed)
+
+    def serve(self, path, policy=DROP_OLDEST, queue_size=16):
+        """
+        Publishes to the ``HubClient``s of other processes, through the Unix
+        socket ``path``. Every client is a packed subscriber with ``policy``.
+        """
+        self.server = HubServer(self, path, policy, queue_size)
+        self.server.start()
+        return self.server
+
+    def close(self):
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+        with self._lock:
+            subscribers = self.subscribers + self.packed_subscribers
+            self.subscribers = self.packed_subscribers = []
+        for subscriber in subscribers:
+            subscriber.stop()
+
+
+def pack_record(record):
+    return record_struct.pack(*[getattr(record, field) for field in RECORD_FIELDS])
+
+
+def unpack_record(data, record=None):
+    record = record or NavdataRecord()
+    for field, value in zip(RECORD_FIELDS, record_struct.unpack(data)):
+        setattr(record, field, value)
+    return record
+
+
+class HubServer(threading.Thread):
+    """
+    Listens on the Unix datagram socket ``path`` for clients subscribing
+    (they send ``SUBSCRIBE`` from their own socket) and subscribes a sender
+    to ``hub`` for each of them. A client that has gone is unsubscribed.
+    """
+    def __init__(self, hub, path, policy=DROP_OLDEST, queue_size=16):
+        super(HubServer, self).__init__()
+        self.daemon = True
+        self.hub = hub
+        self.path = path
+        self.policy = policy
+        self.queue_size = queue_size
+        self.clients = {}
+        # packets not sent because a client's socket was full
+        self.full = 0
+        if os.path.exists(path):
+            os.unlink(path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(path)
+        # the timeout only limits how long ``stop`` has to wait
+        self.sock.settimeout(0.5)
+        # sending never waits: a client that is behind loses the packets
+        self.send_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.send_sock.setblocking(False)
+        self.running = False
+
+    def start(self):
+        self.running = True
+        super(HubServer, self).start()
+
+    def sender(self, address):
+        sock = self.send_sock
+
+        def send(data):
+            try:
+                sock.sendto(data, address)
+            except socket.error as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS):
+                    # the client's socket is full
+                    self.full += 1
+                else:
+                    # the client is gone
+                    self.remove(address)
+        return send
+
+    def remove(self, address):
+        subscriber = self.clients.pop(address, None)
+        if subscriber is not None:
+            self.hub.unsubscribe(subscriber)
+
+    def run(self):
+        while self.running:
+            try:
+                data, address = self.sock.recvfrom(64)
+            except socket.timeout:
+                continue
+            except socket.error:
+                # the socket has been closed underneath us
+                break
+            if data == SUBSCRIBE and address and address not in self.clients:
+                self.clients[address] = self.hub.subscribe(
+                    self.sender(address), self.policy, self.queue_size,
+                    packed=True)
+            elif data == UNSUBSCRIBE:
+                self.remove(address)
+        self.running = False
+
+    def stop(self, timeout=None):
+        self.running = False
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+        for address in list(self.clients):
+            self.remove(address)
+        self.sock.close()
+        self.send_sock.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class HubClient(object):
+    """
+    Receives the records published by the ``TelemetryHub`` serving at
+    ``path``. Iterating yields ``NavdataRecord``s (the same one, updated, if
+    ``reuse`` is True).
+    """
+    def __init__(self, path, timeout=None, reuse=False):
+        self.path = path
+        self.directory = tempfile.mkdtemp(prefix='ardrone-hub-')
+        self.local_path = os.path.join(self.directory, 'client.sock')
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.local_path)
+        self.sock.settimeout(timeout)
+        self.reuse = reuse
+        self.sock.sendto(SUBSCRIBE, path)
+
+    def receive(self, record=None):
+        """
+        The next record, or None on timeout.
+        """
+        try:
+            data = self.sock.recv(record_struct.size)
+        except socket.timeout:
+            return None
+        return unpack_record(data, record)
+
+    def __iter__(self):
+        record = NavdataRecord() if self.reuse else None
+        while True:
+            result = self.receive(record)
+            if result is None:
+                return
+            yield result
+
+    def close(self):
+        try:
+            self.sock.sendto(UNSUBSCRIBE, self.path)
+        except socket.error:
+            pass
+        self.sock.close()
+        if os.path.exists(self.local_path):
+            os.unlink(self.local_path)
+        os.rmdir(self.directory)
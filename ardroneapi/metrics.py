@@ -0,0 +1,159 @@
+"""
+Counters and histograms of what the library does, for measuring it in
+production.
+
+Nothing is measured by default: every instrumented place only checks that
+its ``metrics`` hook is ``None``. To measure, set a hook:
+
+>>> drone.metrics = Metrics()
+>>> drone.connect()
+>>> drone.connect_nav()
+>>> ...
+>>> drone.metrics.report()
+navdata.packets         6012     200.4/s
+navdata.bytes         3078144  102604.8/s
+navdata.decode_time     6012  p50   4.0us  p99  11.0us  max  52.4us
+commands.send_time       990  p50  12.0us  p99  40.0us  max 120.1us
+...
+
+A hook is any object with ``count(name, value=1)`` and
+``observe(name, value)`` methods, so the measurements can also go straight
+to statsd, Prometheus, ... ``Metrics`` keeps them in memory.
+
+The names used:
+
+``commands.packets``, ``commands.bytes``: datagrams and bytes sent to the
+AT command port.
+``commands.send_time``: seconds spent in the send call.
+``navdata.packets``, ``navdata.bytes``, ``navdata.errors``,
+``navdata.dropped``: datagrams received, not decoded and dropped by the
+``SequenceTracker``.
+``navdata.decode_time``: seconds spent decoding a packet.
+``config.reads``, ``config.read_time``: configuration reads and how long they
+took.
+``control.commands``, ``control.latency``, ``control.jitter``: the commands
+of a ``HoldController``, see ``ardroneapi.controller``.
+
+The library also logs, with the ``logging`` module, to the ``ardroneapi``
+loggers: connections, configuration reads and commands given up on (never
+once per packet).
+"""
+import bisect
+import math
+import sys
+import threading
+
+from ardroneapi.scheduler import clock
+
+
+def bucket_bounds(low=1e-7, high=100.0, per_decade=10):
+    """
+    The upper bounds of log spaced histogram buckets.
+    """
+    count = int(round(math.log10(high / low) * per_decade))
+    return [low * 10 ** (i / float(per_decade)) for i in range(count + 1)]
+
+BUCKET_BOUNDS = bucket_bounds()
+
+
+class Histogram(object):
+    """
+    Counts values in log spaced buckets (10 per decade, so percentiles are
+    within ~25%) and keeps their exact count, sum, min and max.
+    """
+    def __init__(self, bounds=BUCKET_BOUNDS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """
+        The upper bound of the bucket holding the ``p`` (0..1) percentile.
+        """
+        if not self.count:
+            return None
+        rank = p * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(0.5),
+            'p99': self.percentile(0.99),
+        }
+
+
+class Metrics(object):
+    """
+    An in-memory metrics hook: counters and histograms by name.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+            self.started = clock()
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        with self._lock:
+            try:
+                histogram = self.histograms[name]
+            except KeyError:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(value)
+
+    def snapshot(self):
+        """
+        The counters with their rate per second since the last ``reset``, and
+        a summary of every histogram.
+        """
+        with self._lock:
+            elapsed = clock() - self.started
+            return {
+                'elapsed': elapsed,
+                'counters': dict((name, {
+                    'value': value,
+                    'rate': value / elapsed if elapsed > 0 else 0.0,
+                }) for name, value in self.counters.items()),
+                'histograms': dict((name, histogram.summary())
+                                   for name, histogram in self.histograms.items()),
+            }
+
+    def report(self, out=None):
+        """
+        Writes the ``snapshot`` as text to ``out`` (stdout by default).
+        """
+        out = out or sys.stdout
+        snapshot = self.snapshot()
+        for name, counter in sorted(snapshot['counters'].items()):
+            out.write('%-22s %10d %10.1f/s\n' % (name, counter['value'], counter['rate']))
+        for name, h in sorted(snapshot['histograms'].items()):
+            out.write('%-22s %10d  p50 %8.1fus  p99 %8.1fus  max %8.1fus\n' % (
+                name, h['count'], h['p50'] * 1e6, h['p99'] * 1e6, h['max'] * 1e6))
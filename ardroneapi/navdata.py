@@ -0,0 +1,888 @@
+"""
+Decoding of the navigation data ("navdata") the drone sends to UDP port 5554.
+
+A navdata packet is a header followed by a list of option blocks. Every value
+is little endian and the blocks are packed (no alignment padding).
+
+Header:
+HEADER      State     Seq       Vision
+uint32_t    uint32_t  uint32_t  uint32_t
+
+Option:
+TAG        SIZE        DATA
+uint16_t   uint16_t    SIZE-4 bytes
+
+SIZE is the size of the whole block in bytes, including TAG and SIZE. The
+last block is always the checksum:
+
+Checksum:
+TAG (0xFFFF) SIZE (8)  CKS
+uint16_t     uint16_t  uint32_t
+
+The layout of each option's DATA is described in ``OPTIONS`` (keyed by tag).
+Options with an unknown tag are skipped, as is the tail of a known option
+that a newer firmware made longer than described here.
+"""
+import struct
+from array import array
+from collections import namedtuple
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from ardroneapi import constants
+
+NAVDATA_HEADER = 0x55667788
+
+NAVDATA_DEMO_TAG = 0
+NAVDATA_TIME_TAG = 1
+NAVDATA_RAW_MEASURES_TAG = 2
+NAVDATA_PHYS_MEASURES_TAG = 3
+NAVDATA_GYROS_OFFSETS_TAG = 4
+NAVDATA_EULER_ANGLES_TAG = 5
+NAVDATA_REFERENCES_TAG = 6
+NAVDATA_TRIMS_TAG = 7
+NAVDATA_RC_REFERENCES_TAG = 8
+NAVDATA_PWM_TAG = 9
+NAVDATA_ALTITUDE_TAG = 10
+NAVDATA_VISION_RAW_TAG = 11
+NAVDATA_VISION_OF_TAG = 12
+NAVDATA_VISION_TAG = 13
+NAVDATA_VISION_PERF_TAG = 14
+NAVDATA_TRACKERS_SEND_TAG = 15
+NAVDATA_VISION_DETECT_TAG = 16
+NAVDATA_WATCHDOG_TAG = 17
+NAVDATA_ADC_DATA_FRAME_TAG = 18
+NAVDATA_VIDEO_STREAM_TAG = 19
+NAVDATA_CKS_TAG = 0xFFFF
+
+header_struct = struct.Struct('<IIII')
+option_header_struct = struct.Struct('<HH')
+checksum_struct = struct.Struct('<I')
+
+
+class NavdataError(Exception):
+    """
+    Raised for packets that are not navdata or are truncated.
+    """
+
+
+class OptionLayout(object):
+    """
+    The layout of the DATA of one option block.
+
+    ``fields`` is a list of ``(name, code)`` tuples where ``code`` is a
+    ``struct`` format character, optionally prefixed with a count for arrays
+    (eg. ``'9f'`` for a 3x3 float matrix). Arrays are returned as tuples.
+
+    The ``struct.Struct`` is compiled once, so decoding an option is a single
+    ``unpack_from`` at its offset in the packet.
+    """
+    def __init__(self, tag, name, fields):
+        self.tag = tag
+        self.name = name
+        self.fields = fields
+        names = []
+        codes = []
+        self.items = []
+        index = 0
+        for field, code in fields:
+            count = int(code[:-1] or 1)
+            names.append(field)
+            codes.append(code)
+            if code[:-1]:
+                self.items.append(slice(index, index + count))
+            else:
+                self.items.append(index)
+            index += count
+        # no arrays: the unpacked values can be used as they are
+        self.flat = index == len(names)
+        self.struct = struct.Struct('<' + ''.join(codes))
+        self.size = self.struct.size
+        self.type = namedtuple(name, names)
+
+    def unpack_from(self, buf, offset=0):
+        values = self.struct.unpack_from(buf, offset)
+        if self.flat:
+            return self.type._make(values)
+        return self.type._make([values[item] for item in self.items])
+
+    def defaults(self):
+        """
+        An instance of ``type`` with every field (and array item) set to 0.
+        """
+        return self.type._make([
+            (0,) * (item.stop - item.start) if type(item) is slice else 0
+            for item in self.items])
+
+    def pack(self, values):
+        """
+        The whole option block (TAG, SIZE and DATA) for ``values``, an
+        instance of ``type`` or any sequence in the same order.
+        """
+        if self.flat:
+            data = self.struct.pack(*values)
+        else:
+            flat = []
+            for value, item in zip(values, self.items):
+                if type(item) is slice:
+                    flat.extend(value)
+                else:
+                    flat.append(value)
+            data = self.struct.pack(*flat)
+        return option_header_struct.pack(self.tag, self.size + 4) + data
+
+    def __repr__(self):
+        return '<OptionLayout %s (%s): %s bytes>' % (self.name, self.tag, self.size)
+
+
+OPTIONS = {}
+# option name -> tag
+OPTION_TAGS = {}
+
+def register_option(tag, name, fields):
+    OPTIONS[tag] = OptionLayout(tag, name, fields)
+    OPTION_TAGS[name] = tag
+
+register_option(NAVDATA_DEMO_TAG, 'demo', [
+    ('ctrl_state', 'I'),
+    ('vbat_flying_percentage', 'I'), # battery level [%]
+    ('theta', 'f'), # pitch [milli-degrees]
+    ('phi', 'f'), # roll [milli-degrees]
+    ('psi', 'f'), # yaw [milli-degrees]
+    ('altitude', 'i'), # [mm]
+    ('vx', 'f'), # estimated velocities [mm/s]
+    ('vy', 'f'),
+    ('vz', 'f'),
+    ('num_frames', 'I'),
+    ('detection_camera_rot', '9f'),
+    ('detection_camera_trans', '3f'),
+    ('detection_tag_index', 'I'),
+    ('detection_camera_type', 'I'),
+    ('drone_camera_rot', '9f'),
+    ('drone_camera_trans', '3f'),
+])
+register_option(NAVDATA_TIME_TAG, 'time', [
+    # 11 most significant bits: seconds, 21 least significant: microseconds
+    ('time', 'I'),
+])
+register_option(NAVDATA_RAW_MEASURES_TAG, 'raw_measures', [
+    ('raw_accs', '3H'),
+    ('raw_gyros', '3h'),
+    ('raw_gyros_110', '2h'),
+    ('vbat_raw', 'I'), # [mV]
+    ('us_debut_echo', 'H'),
+    ('us_fin_echo', 'H'),
+    ('us_association_echo', 'H'),
+    ('us_distance_echo', 'H'),
+    ('us_courbe_temps', 'H'),
+    ('us_courbe_valeur', 'H'),
+    ('us_courbe_ref', 'H'),
+])
+register_option(NAVDATA_PHYS_MEASURES_TAG, 'phys_measures', [
+    ('accs_temp', 'f'),
+    ('gyro_temp', 'H'),
+    ('phys_accs', '3f'),
+    ('phys_gyros', '3f'),
+    ('alim3V3', 'I'),
+    ('vrefEpson', 'I'),
+    ('vrefIDG', 'I'),
+])
+register_option(NAVDATA_GYROS_OFFSETS_TAG, 'gyros_offsets', [
+    ('offset_g', '3f'),
+])
+register_option(NAVDATA_EULER_ANGLES_TAG, 'euler_angles', [
+    ('theta_a', 'f'),
+    ('phi_a', 'f'),
+])
+register_option(NAVDATA_REFERENCES_TAG, 'references', [
+    ('ref_theta', 'i'),
+    ('ref_phi', 'i'),
+    ('ref_theta_I', 'i'),
+    ('ref_phi_I', 'i'),
+    ('ref_pitch', 'i'),
+    ('ref_roll', 'i'),
+    ('ref_yaw', 'i'),
+    ('ref_psi', 'i'),
+])
+register_option(NAVDATA_TRIMS_TAG, 'trims', [
+    ('angular_rates_trim_r', 'f'),
+    ('euler_angles_trim_theta', 'f'),
+    ('euler_angles_trim_phi', 'f'),
+])
+register_option(NAVDATA_RC_REFERENCES_TAG, 'rc_references', [
+    ('rc_ref_pitch', 'i'),
+    ('rc_ref_roll', 'i'),
+    ('rc_ref_yaw', 'i'),
+    ('rc_ref_gaz', 'i'),
+    ('rc_ref_ag', 'i'),
+])
+register_option(NAVDATA_PWM_TAG, 'pwm', [
+    ('motor', '4B'),
+    ('sat_motor', '4B'),
+    ('gaz_feed_forward', 'f'),
+    ('gaz_altitude', 'f'),
+    ('altitude_integral', 'f'),
+    ('vz_ref', 'f'),
+    ('u_pitch', 'i'),
+    ('u_roll', 'i'),
+    ('u_yaw', 'i'),
+    ('yaw_u_I', 'f'),
+    ('u_pitch_planif', 'i'),
+    ('u_roll_planif', 'i'),
+    ('u_yaw_planif', 'i'),
+    ('u_gaz_planif', 'f'),
+    ('current_motor', '4H'),
+    ('altitude_der', 'f'),
+])
+register_option(NAVDATA_ALTITUDE_TAG, 'altitude', [
+    ('altitude_vision', 'i'),
+    ('altitude_vz', 'f'),
+    ('altitude_ref', 'i'),
+    ('altitude_raw', 'i'),
+])
+register_option(NAVDATA_VISION_RAW_TAG, 'vision_raw', [
+    ('vision_tx_raw', 'f'),
+    ('vision_ty_raw', 'f'),
+    ('vision_tz_raw', 'f'),
+])
+register_option(NAVDATA_VISION_OF_TAG, 'vision_of', [
+    ('of_dx', '5f'),
+    ('of_dy', '5f'),
+])
+register_option(NAVDATA_VISION_TAG, 'vision', [
+    ('vision_state', 'I'),
+    ('vision_misc', 'i'),
+    ('vision_phi_trim', 'f'),
+    ('vision_phi_ref_prop', 'f'),
+    ('vision_theta_trim', 'f'),
+    ('vision_theta_ref_prop', 'f'),
+    ('new_raw_picture', 'i'),
+    ('theta_capture', 'f'),
+    ('phi_capture', 'f'),
+    ('psi_capture', 'f'),
+    ('altitude_capture', 'i'),
+    ('time_capture', 'I'),
+    ('body_v', '3f'),
+    ('delta_phi', 'f'),
+    ('delta_theta', 'f'),
+    ('delta_psi', 'f'),
+    ('gold_defined', 'I'),
+    ('gold_reset', 'I'),
+    ('gold_x', 'f'),
+    ('gold_y', 'f'),
+])
+register_option(NAVDATA_VISION_PERF_TAG, 'vision_perf', [
+    ('time_szo', 'f'),
+    ('time_corners', 'f'),
+    ('time_compute', 'f'),
+    ('time_tracking', 'f'),
+    ('time_trans', 'f'),
+    ('time_update', 'f'),
+    ('time_custom', '20f'),
+])
+register_option(NAVDATA_TRACKERS_SEND_TAG, 'trackers_send', [
+    ('locked', '30i'),
+    ('point', '60i'), # 30 (x, y) pairs
+])
+register_option(NAVDATA_VISION_DETECT_TAG, 'vision_detect', [
+    ('nb_detected', 'I'),
+    ('type', '4I'),
+    ('xc', '4I'),
+    ('yc', '4I'),
+    ('width', '4I'),
+    ('height', '4I'),
+    ('dist', '4I'),
+    ('orientation_angle', '4f'),
+])
+register_option(NAVDATA_WATCHDOG_TAG, 'watchdog', [
+    ('watchdog', 'I'),
+])
+register_option(NAVDATA_ADC_DATA_FRAME_TAG, 'adc_data_frame', [
+    ('version', 'I'),
+    ('data_frame', '32B'),
+])
+register_option(NAVDATA_VIDEO_STREAM_TAG, 'video_stream', [
+    ('quant', 'B'),
+    ('frame_size', 'I'),
+    ('frame_number', 'I'),
+    ('atcmd_ref_seq', 'I'),
+    ('atcmd_mean_ref_gap', 'I'),
+    ('atcmd_var_ref_gap', 'f'),
+    ('atcmd_ref_quality', 'I'),
+])
+
+
+class LazyOptions(Mapping):
+    """
+    The options of a ``NavigationData`` by name, each decoded the first time
+    it is read. It is a read only dict otherwise.
+    """
+    __slots__ = ('navdata', 'decoded')
+
+    def __init__(self, navdata):
+        self.navdata = navdata
+        self.decoded = {}
+
+    def __getitem__(self, name):
+        value = self.decoded.get(name)
+        if value is None:
+            tag = OPTION_TAGS[name]
+            block = self.navdata.offsets.get(tag)
+            layout = OPTIONS[tag]
+            if block is None or block[1] - 4 < layout.size:
+                raise KeyError(name)
+            value = self.decoded[name] = layout.unpack_from(
+                self.navdata.raw_data, block[0] + 4)
+        return value
+
+    def __contains__(self, name):
+        if name in self.decoded:
+            return True
+        tag = OPTION_TAGS.get(name)
+        block = self.navdata.offsets.get(tag)
+        return block is not None and block[1] - 4 >= OPTIONS[tag].size
+
+    def __iter__(self):
+        for tag, (offset, size) in self.navdata.offsets.items():
+            layout = OPTIONS.get(tag)
+            if layout is not None and size - 4 >= layout.size:
+                yield layout.name
+
+    def __len__(self):
+        return sum(1 for name in self)
+
+    def unpack_all(self):
+        """
+        Decodes every option not decoded yet, returns them as a dict.
+        """
+        decoded = self.decoded
+        raw_data = self.navdata.raw_data
+        for tag, (offset, size) in self.navdata.offsets.items():
+            layout = OPTIONS.get(tag)
+            if layout is not None and layout.name not in decoded and size - 4 >= layout.size:
+                decoded[layout.name] = layout.unpack_from(raw_data, offset + 4)
+        return decoded
+
+    def items(self):
+        return list(self.unpack_all().items())
+
+    def values(self):
+        return list(self.unpack_all().values())
+
+    def __repr__(self):
+        return '<LazyOptions %s, decoded: %s>' % (sorted(self), sorted(self.decoded))
+
+
+class NavigationData(object):
+    """
+    One decoded navdata packet.
+
+    >>> n = NavigationData(data)
+    >>> n.sequence
+    >>> n.options['demo'].altitude
+    >>> n.altitude # the same
+
+    Only the header and the position of the option blocks are decoded up
+    front: ``offsets`` maps the tag of every option block in the packet,
+    known or not, to its ``(offset, size)`` in ``raw_data``. ``options``
+    maps the option names of ``OPTIONS`` (``'demo'``, ``'time'``, ...) to
+    namedtuples, each decoded on first access, so reading a few values of a
+    full packet only pays for the options they are in
+    (``options.unpack_all()`` decodes them all at once).
+
+    If only the most used values are needed, ``unpack_into`` a reused
+    ``NavdataRecord`` is a lot cheaper.
+
+    ``received`` is the ``clock()`` time the packet was received at, when it
+    comes from a ``NavdataReceiver``.
+    """
+    __slots__ = ('raw_data', 'header', 'state', 'sequence', 'vision_defined',
+                 'checksum', 'offsets', 'received', '_options')
+
+    def __init__(self, raw_data):
+        self.raw_data = raw_data
+        self.header = None
+        self.state = None
+        self.sequence = None
+        self.vision_defined = None
+        self.checksum = None
+        self.offsets = {}
+        self.received = None
+        self._options = None
+        self.unpack()
+
+    def unpack(self):
+        r = self.raw_data
+        end = len(r)
+        self.header, self.state, self.sequence, self.vision_defined = \
+            header_struct.unpack_from(r, 0)
+        if self.header != NAVDATA_HEADER:
+            raise NavdataError('not a navdata packet (header: %s)' % hex(self.header))
+        offsets = self.offsets
+        offset = header_struct.size
+        while offset + 4 <= end:
+            tag, size = option_header_struct.unpack_from(r, offset)
+            if size < 4 or offset + size > end:
+                raise NavdataError('option %s at %s has an invalid size: %s' % (tag, offset, size))
+            offsets[tag] = (offset, size)
+            if tag == NAVDATA_CKS_TAG:
+                self.checksum = checksum_struct.unpack_from(r, offset + 4)[0]
+                break
+            offset += size
+
+    @property
+    def options(self):
+        if self._options is None:
+            self._options = LazyOptions(self)
+        return self._options
+
+    def option(self, name, default=None):
+        """
+        The decoded option ``name``, or ``default`` if the packet has none.
+        """
+        try:
+            return self.options[name]
+        except KeyError:
+            return default
+
+    @property
+    def demo(self):
+        return self.option('demo')
+
+    @property
+    def altitude(self):
+        """
+        The altitude of the demo option (mm), or ``None``.
+        """
+        demo = self.demo
+        return None if demo is None else demo.altitude
+
+    @property
+    def battery(self):
+        """
+        The battery level of the demo option (percent), or ``None``.
+        """
+        demo = self.demo
+        return None if demo is None else demo.vbat_flying_percentage
+
+    def verify_checksum(self):
+        """
+        True if the checksum block matches the bytes before it. Packets
+        without a checksum block never verify.
+        """
+        if self.checksum is None:
+            return False
+        offset = self.offsets[NAVDATA_CKS_TAG][0]
+        return compute_checksum(self.raw_data, offset) == self.checksum
+
+    def option_data(self, tag):
+        """
+        The DATA of the option block with the given tag as a ``memoryview``
+        into ``raw_data`` (no copy), or ``None`` if the packet has no such
+        block. Useful for options not described in ``OPTIONS``.
+        """
+        if tag not in self.offsets:
+            return None
+        offset, size = self.offsets[tag]
+        return memoryview(self.raw_data)[offset + 4:offset + size]
+
+    def unpack_into(self, record):
+        """
+        Copies the values of this packet into a ``NavdataRecord``.
+        """
+        return unpack_into(self.raw_data, record)
+
+    @property
+    def flags(self):
+        """
+        The state word as ``DroneState``.
+        """
+        return DroneState(self.state)
+
+    def unpack_state(self, state=None):
+        return DroneState(self.state if state is None else state)
+
+
+def compute_checksum(raw_data, end):
+    """
+    The navdata checksum of the first ``end`` bytes of ``raw_data``: the
+    plain sum of the bytes, as an uint32. The summing runs in C.
+    """
+    return sum(bytearray(memoryview(raw_data)[:end])) & 0xFFFFFFFF
+
+
+def pack_navdata(state, sequence, options=(), vision_defined=0):
+    """
+    Builds a navdata packet, checksum included. ``options`` is a list of
+    ``(tag, values)`` (see ``OptionLayout.pack``) or of already packed
+    option blocks.
+    """
+    blocks = [header_struct.pack(NAVDATA_HEADER, state, sequence, vision_defined)]
+    for option in options:
+        if not isinstance(option, bytes):
+            tag, values = option
+            option = OPTIONS[tag].pack(values)
+        blocks.append(option)
+    body = b''.join(blocks)
+    return body + option_header_struct.pack(NAVDATA_CKS_TAG, 8) + \
+        checksum_struct.pack(compute_checksum(body, len(body)))
+
+
+class SequenceTracker(object):
+    """
+    Keeps track of the sequence numbers of one navdata stream and decides
+    which packets are worth using. A packet is dropped if
+
+    - its checksum does not verify (``checksum_failed``),
+    - it has the sequence number of the last accepted one (``duplicated``),
+    - it is older than the last accepted one (``dropped``), ie. it was
+      reordered on the way.
+
+    Gaps in the accepted sequence numbers are counted in ``lost``. A jump
+    back of more than ``restart_window`` is taken as the drone restarting
+    its navdata (which starts the sequence anew) and is accepted.
+
+    >>> tracker = SequenceTracker()
+    >>> if tracker.check(navdata):
+    ...     use(navdata)
+    """
+    def __init__(self, restart_window=100):
+        self.restart_window = restart_window
+        self.last = None
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.received = 0
+        self.accepted = 0
+        self.dropped = 0
+        self.duplicated = 0
+        self.checksum_failed = 0
+        self.lost = 0
+        self.restarts = 0
+
+    def accept(self, sequence, valid=True):
+        """
+        Records a packet with the given sequence number (``valid`` is the
+        result of its checksum verification) and returns if it should be
+        used.
+        """
+        self.received += 1
+        if not valid:
+            self.checksum_failed += 1
+            return False
+        last = self.last
+        if last is not None:
+            if sequence == last:
+                self.duplicated += 1
+                return False
+            if sequence < last:
+                if last - sequence <= self.restart_window:
+                    self.dropped += 1
+                    return False
+                self.restarts += 1
+            else:
+                self.lost += sequence - last - 1
+        self.last = sequence
+        self.accepted += 1
+        return True
+
+    def check(self, navdata, verify=True):
+        """
+        ``accept`` for a ``NavigationData``, verifying its checksum unless
+        ``verify`` is False.
+        """
+        valid = navdata.verify_checksum() if verify else True
+        return self.accept(navdata.sequence, valid)
+
+    @property
+    def counters(self):
+        return {
+            'received': self.received,
+            'accepted': self.accepted,
+            'dropped': self.dropped,
+            'duplicated': self.duplicated,
+            'checksum_failed': self.checksum_failed,
+            'lost': self.lost,
+            'restarts': self.restarts,
+        }
+
+
+RECORD_FIELDS = (
+    # header
+    'sequence', 'state', 'vision_defined', 'checksum',
+    # time option
+    'time',
+    # demo option
+    'ctrl_state', 'battery', 'theta', 'phi', 'psi', 'altitude',
+    'vx', 'vy', 'vz', 'num_frames',
+)
+
+# the scalar head of the demo option, up to and including num_frames
+demo_head_struct = struct.Struct('<IIfffifffI')
+
+
+class NavdataRecord(object):
+    """
+    The header, time and the scalar part of the demo option of a packet in a
+    compact, reusable object (see ``RECORD_FIELDS``).
+
+    Fields of options that are not in the packet keep their previous value.
+
+    >>> record = NavdataRecord()
+    >>> unpack_into(data, record)
+    >>> record.altitude
+
+    A record has no ``__dict__``: on 64 bit CPython it takes 8 bytes per field
+    plus the object header, 152 bytes (168 on Python 2) in total, against
+    several kilobytes for a fully decoded ``NavigationData`` with its dicts
+    and namedtuples. Since a record is meant to be reused, decoding into it
+    does not create any container objects for the garbage collector to track.
+    """
+    __slots__ = RECORD_FIELDS
+
+    def __init__(self):
+        for field in RECORD_FIELDS:
+            setattr(self, field, 0)
+
+    def __repr__(self):
+        return '<NavdataRecord %s>' % ', '.join(
+            '%s=%s' % (field, getattr(self, field)) for field in RECORD_FIELDS)
+
+
+def unpack_into(raw_data, record):
+    """
+    Decodes the packet ``raw_data`` into ``record`` (a ``NavdataRecord``, or
+    any object with the attributes in ``RECORD_FIELDS``) and returns it.
+    Option blocks other than time, demo and checksum are skipped without
+    being decoded.
+    """
+    end = len(raw_data)
+    header, record.state, record.sequence, record.vision_defined = \
+        header_struct.unpack_from(raw_data, 0)
+    if header != NAVDATA_HEADER:
+        raise NavdataError('not a navdata packet (header: %s)' % hex(header))
+    offset = header_struct.size
+    while offset + 4 <= end:
+        tag, size = option_header_struct.unpack_from(raw_data, offset)
+        if size < 4 or offset + size > end:
+            raise NavdataError('option %s at %s has an invalid size: %s' % (tag, offset, size))
+        if tag == NAVDATA_DEMO_TAG and size - 4 >= demo_head_struct.size:
+            (record.ctrl_state, record.battery, record.theta, record.phi,
+             record.psi, record.altitude, record.vx, record.vy, record.vz,
+             record.num_frames) = demo_head_struct.unpack_from(raw_data, offset + 4)
+        elif tag == NAVDATA_TIME_TAG and size >= 8:
+            record.time = checksum_struct.unpack_from(raw_data, offset + 4)[0]
+        elif tag == NAVDATA_CKS_TAG:
+            record.checksum = checksum_struct.unpack_from(raw_data, offset + 4)[0]
+            break
+        offset += size
+    return record
+
+
+class NavdataRing(object):
+    """
+    A preallocated ring buffer holding the last ``capacity`` records, stored
+    as doubles in a single ``array``: ``8 * len(RECORD_FIELDS)`` (120) bytes
+    per sample, so one minute at 200Hz takes about 1.4MB, allocated once.
+
+    >>> ring = NavdataRing(12000)
+    >>> ring.append(unpack_into(data, record))
+    >>> ring.column('altitude') # oldest first
+    """
+    fields = RECORD_FIELDS
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.width = len(self.fields)
+        self.data = array('d', [0.0]) * (capacity * self.width)
+        # total number of records ever appended
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, record):
+        data = self.data
+        index = (self.count % self.capacity) * self.width
+        for field in self.fields:
+            data[index] = getattr(record, field)
+            index += 1
+        self.count += 1
+
+    def _index(self, i):
+        # the position of the i-th oldest record still in the buffer
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError('NavdataRing index out of range')
+        return ((self.count - n + i) % self.capacity) * self.width
+
+    def get(self, i, record=None):
+        """
+        Copies the i-th oldest record (negative indexes count from the newest)
+        into ``record`` (a new ``NavdataRecord`` by default).
+        """
+        if record is None:
+            record = NavdataRecord()
+        index = self._index(i)
+        for field in self.fields:
+            setattr(record, field, self.data[index])
+            index += 1
+        return record
+
+    def column(self, field):
+        """
+        All values of one field, oldest first, as an ``array``.
+        """
+        n = len(self)
+        offset = self.fields.index(field)
+        start = (self.count - n) % self.capacity if n else 0
+        # the buffer is strided: take every width-th value, unrolled at the wrap
+        first = self.data[start * self.width + offset::self.width]
+        if len(first) >= n:
+            return first[:n]
+        return first + self.data[offset:(n - len(first)) * self.width:self.width]
+
+
+# (name, mask) of every bit of the state word, lowest first
+STATE_FLAGS = (
+    ('flying', constants.ARDRONE_FLY_MASK),
+    ('video', constants.ARDRONE_VIDEO_MASK),
+    ('vision', constants.ARDRONE_VISION_MASK),
+    ('angular_speed_control', constants.ARDRONE_CONTROL_MASK),
+    ('altitude_control', constants.ARDRONE_ALTITUDE_MASK),
+    ('user_feedback_start', constants.ARDRONE_USER_FEEDBACK_START),
+    ('command_ack', constants.ARDRONE_COMMAND_MASK),
+    ('trim_command_ack', constants.ARDRONE_TRIM_COMMAND_MASK),
+    ('trim_running', constants.ARDRONE_TRIM_RUNNING_MASK),
+    ('trim_succeeded', constants.ARDRONE_TRIM_RESULT_MASK),
+    ('navdata_demo', constants.ARDRONE_NAVDATA_DEMO_MASK),
+    ('navdata_bootstrap', constants.ARDRONE_NAVDATA_BOOTSTRAP),
+    ('motors_down', constants.ARDRONE_MOTORS_MASK),
+    ('com_lost', constants.ARDRONE_COM_LOST_MASK),
+    ('gyrometers_down', constants.ARDRONE_GYROMETERS_DOWN),
+    ('vbat_low', constants.ARDRONE_VBAT_LOW),
+    ('vbat_high', constants.ARDRONE_VBAT_HIGH),
+    ('timer_elapsed', constants.ARDRONE_TIMER_ELAPSED),
+    ('not_enough_power', constants.ARDRONE_NOT_ENOUGH_POWER),
+    ('angles_out_of_range', constants.ARDRONE_ANGLES_OUT_OF_RANGE),
+    ('too_much_wind', constants.ARDRONE_WIND_MASK),
+    ('ultrasound_deaf', constants.ARDRONE_ULTRASOUND_MASK),
+    ('cutout', constants.ARDRONE_CUTOUT_MASK),
+    ('pic_version_ok', constants.ARDRONE_PIC_VERSION_MASK),
+    ('atcodec_thread_on', constants.ARDRONE_ATCODEC_THREAD_ON),
+    ('navdata_thread_on', constants.ARDRONE_NAVDATA_THREAD_ON),
+    ('video_thread_on', constants.ARDRONE_VIDEO_THREAD_ON),
+    ('acquisition_thread_on', constants.ARDRONE_ACQ_THREAD_ON),
+    ('ctrl_watchdog', constants.ARDRONE_CTRL_WATCHDOG_MASK),
+    ('adc_watchdog', constants.ARDRONE_ADC_WATCHDOG_MASK),
+    ('com_watchdog', constants.ARDRONE_COM_WATCHDOG_MASK),
+    ('emergency', constants.ARDRONE_EMERGENCY_MASK),
+)
+
+
+def _state_flag(mask):
+    def get(self):
+        return self.value & mask != 0
+    return property(get)
+
+
+class DroneState(object):
+    """
+    The 32 bit state word of a navdata packet with a property per bit.
+    Every property is a precomputed mask (``ardroneapi.constants``) tested
+    with a single ``&``.
+
+    31                                                             0
+     x x x x x x x x x x x x x x x x x x x x x x x x x x x x x x x x -> state
+     | | | | | | | | | | | | | | | | | | | | | | | | | | | | | | | |
+     | | | | | | | | | | | | | | | | | | | | | | | | | | | | | | | flying: (0) ardrone is landed, (1) ardrone is flying
+     | | | | | | | | | | | | | | | | | | | | | | | | | | | | | | video: (0) video disable, (1) video enable
+     | | | | | | | | | | | | | | | | | | | | | | | | | | | | | vision: (0) vision disable, (1) vision enable
+     | | | | | | | | | | | | | | | | | | | | | | | | | | | | angular_speed_control: (0) euler angles control, (1) angular speed control
+     | | | | | | | | | | | | | | | | | | | | | | | | | | | altitude_control: (0) altitude control inactive (1) altitude control active
+     | | | | | | | | | | | | | | | | | | | | | | | | | | user_feedback_start: Start button state
+     | | | | | | | | | | | | | | | | | | | | | | | | | command_ack: Control command ACK : (0) None, (1) one received
+     | | | | | | | | | | | | | | | | | | | | | | | | trim_command_ack: Trim command ACK : (0) None, (1) one received
+     | | | | | | | | | | | | | | | | | | | | | | | trim_running: (0) none, (1) running
+     | | | | | | | | | | | | | | | | | | | | | | trim_succeeded: Trim result : (0) failed, (1) succeeded
+     | | | | | | | | | | | | | | | | | | | | | navdata_demo: (0) All navdata, (1) only navdata demo
+     | | | | | | | | | | | | | | | | | | | | navdata_bootstrap: (0) options sent in all or demo mode, (1) no navdata options sent
+     | | | | | | | | | | | | | | | | | | | motors_down: Motors status : (0) Ok, (1) Motors Com is down
+     | | | | | | | | | | | | | | | | | | com_lost: (0) Ok, (1) communication lost
+     | | | | | | | | | | | | | | | | | gyrometers_down: (1) hardware problem with gyrometers
+     | | | | | | | | | | | | | | | | vbat_low: VBat low : (1) too low, (0) Ok
+     | | | | | | | | | | | | | | | vbat_high: VBat high (US mad) : (1) too high, (0) Ok
+     | | | | | | | | | | | | | | timer_elapsed: (1) elapsed, (0) not elapsed
+     | | | | | | | | | | | | | not_enough_power: Power : (0) Ok, (1) not enough to fly
+     | | | | | | | | | | | | angles_out_of_range: Angles : (0) Ok, (1) out of range
+     | | | | | | | | | | | too_much_wind: Wind : (0) Ok, (1) too much to fly
+     | | | | | | | | | | ultrasound_deaf: Ultrasonic sensor : (0) Ok, (1) deaf
+     | | | | | | | | | cutout: Cutout system detection : (0) Not detected, (1) detected
+     | | | | | | | | pic_version_ok: PIC Version number OK : (0) a bad version number, (1) version number is OK
+     | | | | | | | atcodec_thread_on: ATCodec thread ON : (0) thread OFF (1) thread ON
+     | | | | | | navdata_thread_on: Navdata thread ON : (0) thread OFF (1) thread ON
+     | | | | | video_thread_on: Video thread ON : (0) thread OFF (1) thread ON
+     | | | | acquisition_thread_on: Acquisition thread ON : (0) thread OFF (1) thread ON
+     | | | ctrl_watchdog: (1) delay in control execution (> 5ms), (0) control is well scheduled
+     | | adc_watchdog: (1) delay in uart2 dsr (> 5ms), (0) uart2 is good
+     | com_watchdog: (1) com problem, (0) Com is ok (no active connection with a client)
+     emergency: Emergency landing : (0) no emergency, (1) emergency
+
+    To react to transitions compare with the state of the previous packet:
+
+    >>> changed = state.changed(previous) # a mask of the bits that differ
+    >>> if changed & ARDRONE_EMERGENCY_MASK and state.emergency:
+    ...     print('emergency!')
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value=0):
+        self.value = value
+
+    def changed(self, previous):
+        """
+        The mask of the bits that differ from ``previous`` (a ``DroneState``
+        or an int).
+        """
+        return self.value ^ getattr(previous, 'value', previous)
+
+    def set_since(self, previous):
+        """
+        The mask of the bits that are set now but were not in ``previous``.
+        """
+        return self.value & ~getattr(previous, 'value', previous)
+
+    def cleared_since(self, previous):
+        """
+        The mask of the bits that were set in ``previous`` but are not now.
+        """
+        return ~self.value & getattr(previous, 'value', previous)
+
+    def names(self, mask=0xFFFFFFFF):
+        """
+        The names of the set flags within ``mask``, for debugging and logs.
+        """
+        return [name for name, bit in STATE_FLAGS
+                if bit & mask and self.value & bit]
+
+    def __eq__(self, other):
+        return self.value == getattr(other, 'value', other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.value)
+
+    def __repr__(self):
+        return '<DroneState %s: %s>' % (hex(self.value), ', '.join(self.names()))
+
+
+for name, mask in STATE_FLAGS:
+    setattr(DroneState, name, _state_flag(mask))
+del name, mask
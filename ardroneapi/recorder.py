@@ -0,0 +1,273 @@
+"""
+Recording navdata to disk and replaying it.
+
+>>> recorder = NavdataRecorder('flights/2011-05-01')
+>>> drone.connect_nav()
+>>> drone.nav_receiver.add_raw_callback(recorder.record)
+>>> ...
+>>> recorder.close()
+
+>>> log = NavdataLog('flights/2011-05-01')
+>>> len(log)
+>>> replay(log, my_handler) # as fast as possible
+>>> replay(log, my_handler, speed=1.0) # in real time
+
+A log is a directory of segments. Each segment is a pair of files:
+
+``navdata-00000.log``: a 16 byte file header (``LOG_MAGIC``, version,
+reserved) followed by one entry per datagram:
+
+TIMESTAMP   LENGTH     DATA
+double      uint32_t   LENGTH bytes
+
+``navdata-00000.idx``: one fixed size entry per datagram, so entry ``i`` of a
+segment is found without reading the ones before it:
+
+TIMESTAMP   OFFSET
+double      uint64_t
+
+Everything is little endian. Segments are rotated once they reach
+``segment_size`` bytes, so a segment can always be mapped in memory whole.
+"""
+import bisect
+import glob
+import mmap
+import os
+import struct
+import threading
+import time
+
+from ardroneapi.navdata import NavigationData, NavdataError
+
+LOG_MAGIC = b'ARNAVLOG'
+LOG_VERSION = 1
+
+file_header_struct = struct.Struct('<8sII')
+entry_struct = struct.Struct('<dI')
+index_struct = struct.Struct('<dQ')
+
+
+class NavdataRecorder(object):
+    """
+    Appends datagrams to a segmented log in ``directory``. ``record`` has the
+    signature of a ``NavdataReceiver`` raw callback, it can be called from
+    another thread than ``close`` and does nothing once the recorder is closed.
+    """
+    def __init__(self, directory, prefix='navdata', segment_size=64 * 1024 * 1024):
+        self.directory = directory
+        self.prefix = prefix
+        self.segment_size = segment_size
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # continue after the segments already in the directory
+        self.segment = len(segment_paths(directory, prefix))
+        self.log_file = None
+        self.index_file = None
+        self.offset = 0
+        self.recorded = 0
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def open_segment(self):
+        path = os.path.join(self.directory, '%s-%05d' % (self.prefix, self.segment))
+        self.log_file = open(path + '.log', 'wb')
+        self.index_file = open(path + '.idx', 'wb')
+        self.log_file.write(file_header_struct.pack(LOG_MAGIC, LOG_VERSION, 0))
+        self.offset = file_header_struct.size
+        self.segment += 1
+
+    def record(self, data, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        size = entry_struct.size + len(data)
+        with self._lock:
+            if self.closed:
+                return
+            if self.log_file is not None and self.offset + size > self.segment_size:
+                self.close_segment()
+            if self.log_file is None:
+                self.open_segment()
+            self.log_file.write(entry_struct.pack(timestamp, len(data)))
+            self.log_file.write(data)
+            self.index_file.write(index_struct.pack(timestamp, self.offset))
+            self.offset += size
+            self.recorded += 1
+
+    __call__ = record
+
+    def flush(self):
+        with self._lock:
+            if self.log_file is not None:
+                self.log_file.flush()
+                self.index_file.flush()
+
+    def close_segment(self):
+        if self.log_file is not None:
+            self.log_file.close()
+            self.index_file.close()
+            self.log_file = self.index_file = None
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            self.close_segment()
+
+
+def segment_paths(directory, prefix='navdata'):
+    """
+    The paths of the segments in ``directory``, without the extension, in
+    recording order.
+    """
+    return sorted(path[:-4] for path in
+                  glob.glob(os.path.join(directory, '%s-*.log' % prefix)))
+
+
+class Segment(object):
+    """
+    One memory mapped segment of a log. Entries at the end that were not
+    written whole (``truncated`` counts them) are left out, a segment whose
+    file header was not written whole is empty.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path + '.log', 'rb') as f:
+            if os.fstat(f.fileno()).st_size < file_header_struct.size:
+                # an empty file can not be mapped
+                self.data = b''
+            else:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data:
+            magic, version, reserved = file_header_struct.unpack_from(self.data, 0)
+            if magic != LOG_MAGIC:
+                raise NavdataError('%s is not a navdata log' % path)
+            if version != LOG_VERSION:
+                raise NavdataError('%s is a navdata log of version %s, not %s'
+                                   % (path, version, LOG_VERSION))
+        with open(path + '.idx', 'rb') as f:
+            index = f.read()
+        count = len(index) // index_struct.size
+        self.timestamps = []
+        self.offsets = []
+        for i in range(count):
+            timestamp, offset = index_struct.unpack_from(index, i * index_struct.size)
+            self.timestamps.append(timestamp)
+            self.offsets.append(offset)
+        # the entries the recorder did not finish writing (eg. it crashed)
+        self.truncated = 0
+        size = len(self.data)
+        while self.offsets:
+            offset = self.offsets[-1]
+            if offset + entry_struct.size <= size:
+                length = entry_struct.unpack_from(self.data, offset)[1]
+                if offset + entry_struct.size + length <= size:
+                    break
+            self.timestamps.pop()
+            self.offsets.pop()
+            self.truncated += 1
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def entry(self, i):
+        """
+        ``(timestamp, data)`` of the i-th datagram.
+        """
+        offset = self.offsets[i]
+        timestamp, length = entry_struct.unpack_from(self.data, offset)
+        start = offset + entry_struct.size
+        return timestamp, self.data[start:start + length]
+
+    def __iter__(self):
+        data = self.data
+        unpack_from = entry_struct.unpack_from
+        header_size = entry_struct.size
+        for offset in self.offsets:
+            timestamp, length = unpack_from(data, offset)
+            start = offset + header_size
+            yield timestamp, data[start:start + length]
+
+    def close(self):
+        if self.data:
+            self.data.close()
+
+
+class NavdataLog(object):
+    """
+    Read access to a log written by ``NavdataRecorder``. Iterating yields
+    ``(timestamp, data)`` tuples in recording order.
+    """
+    def __init__(self, directory, prefix='navdata'):
+        self.segments = [Segment(path) for path in segment_paths(directory, prefix)]
+        # the number of entries before each segment
+        self.starts = []
+        count = 0
+        for segment in self.segments:
+            self.starts.append(count)
+            count += len(segment)
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for segment in self.segments:
+            for entry in segment:
+                yield entry
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError('NavdataLog index out of range')
+        n = bisect.bisect_right(self.starts, i) - 1
+        return self.segments[n].entry(i - self.starts[n])
+
+    def find(self, timestamp):
+        """
+        The index of the first entry recorded at or after ``timestamp``.
+        """
+        for segment, start in zip(self.segments, self.starts):
+            if segment.timestamps and segment.timestamps[-1] >= timestamp:
+                return start + bisect.bisect_left(segment.timestamps, timestamp)
+        return self.count
+
+    def entries(self, start=0):
+        """
+        Iterates over the entries from index ``start``.
+        """
+        for i in range(start, self.count):
+            yield self[i]
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+
+def replay(log, callback, speed=None, start=0, decode=True):
+    """
+    Feeds the entries of ``log`` from index ``start`` to ``callback``, as
+    ``NavigationData`` (or as raw data with ``decode=False``). Datagrams that
+    do not decode are skipped.
+
+    ``speed`` is None to replay as fast as possible, or the speed relative to
+    the recording (1.0 for real time). Returns the number of entries fed.
+    """
+    entries = iter(log) if start == 0 else log.entries(start)
+    first = None
+    count = 0
+    for timestamp, data in entries:
+        if speed:
+            if first is None:
+                first = timestamp
+                started = time.time()
+            delay = (timestamp - first) / speed - (time.time() - started)
+            if delay > 0:
+                time.sleep(delay)
+        if decode:
+            try:
+                data = NavigationData(data)
+            except (NavdataError, struct.error):
+                continue
+        callback(data)
+        count += 1
+    return count
@@ -0,0 +1,174 @@
+"""
+Sends the current control setpoint to the drone at a fixed rate.
+
+The drone expects a command at least every ~30ms, otherwise its
+communication watchdog trips and it stops following the commands. Instead of
+relying on the application to call ``Drone.move`` often enough, a
+``CommandScheduler`` thread sends the latest setpoint on every tick.
+"""
+import math
+import threading
+import time
+
+# time.monotonic is not available on Python 2
+clock = getattr(time, 'monotonic', time.time)
+
+
+class CommandScheduler(threading.Thread):
+    """
+    Sends ``COMWDG``, ``REF`` and ``PCMD`` to the drone ``rate`` times per
+    second in a single datagram.
+
+    >>> s = CommandScheduler(drone, rate=33)
+    >>> s.start()
+    >>> s.set_ref(512) # takeoff
+    >>> s.move(0.1, 0, 0, 0)
+    >>> s.move(0.2, 0, 0, 0) # replaces the previous setpoint if not sent yet
+    >>> s.hover()
+    >>> s.stop()
+
+    Setting a setpoint only replaces it, so any number of updates between two
+    ticks are coalesced and only the newest one is sent. One-shot commands
+    (eg. ``FTRIM``) can be ``queue``d to go out with the next tick.
+
+    With a ``setpoint_filter`` (a ``SetpointFilter``) ``move`` only feeds the
+    filter, which is sampled on every tick, and ``hover`` resets it.
+
+    ``stats()`` reports how late the ticks were compared to the schedule.
+    """
+    def __init__(self, drone, rate=33.0, setpoint_filter=None):
+        super(CommandScheduler, self).__init__()
+        self.daemon = True
+        self.drone = drone
+        self.period = 1.0 / rate
+        self.running = False
+        self._wakeup = threading.Event()
+        # setpoints are replaced as a whole, so the thread never sees a
+        # half updated one
+        self.ref = None
+        self.pcmd = (0, 0, 0, 0, 0)
+        self.setpoint_filter = setpoint_filter
+        self._queue = []
+        self._queue_lock = threading.Lock()
+        self.reset_stats()
+
+    def set_ref(self, value):
+        """
+        The value of the ``REF`` command (takeoff/land/emergency bits), or
+        ``None`` to not send ``REF``.
+        """
+        self.ref = value
+
+    def move(self, roll, pitch, gaz, yaw):
+        """
+        See ``Drone.move``.
+        """
+        if self.setpoint_filter is not None:
+            self.setpoint_filter.update(roll, pitch, gaz, yaw)
+            return
+        if not (roll or pitch or gaz or yaw):
+            self.hover()
+            return
+        self.pcmd = (1, float(roll), float(pitch), float(gaz), float(yaw))
+
+    def hover(self):
+        if self.setpoint_filter is not None:
+            self.setpoint_filter.reset()
+        self.pcmd = (0, 0, 0, 0, 0)
+
+    def filtered_pcmd(self):
+        f = self.setpoint_filter
+        roll, pitch, gaz, yaw = f.sample()
+        if not any(f.target) and f.settled(0.01):
+            return (0, 0, 0, 0, 0)
+        return (1, roll, pitch, gaz, yaw)
+
+    def queue(self, method, params=None):
+        """
+        Sends a command once, with the next tick.
+        """
+        with self._queue_lock:
+            self._queue.append((method, params))
+
+    def commands(self):
+        """
+        The commands of the next tick.
+        """
+        with self._queue_lock:
+            commands, self._queue = self._queue, []
+        commands.append(('COMWDG',))
+        ref = self.ref
+        if ref is not None:
+            commands.append(('REF', (ref,)))
+        if self.setpoint_filter is not None:
+            commands.append(('PCMD', self.filtered_pcmd()))
+        else:
+            commands.append(('PCMD', self.pcmd))
+        return commands
+
+    def tick(self):
+        self.drone.send_many(self.commands())
+
+    def start(self):
+        self.running = True
+        super(CommandScheduler, self).start()
+
+    def run(self):
+        period = self.period
+        next_tick = clock()
+        while self.running:
+            now = clock()
+            if now < next_tick:
+                self._wakeup.wait(next_tick - now)
+                if not self.running:
+                    break
+                now = clock()
+            self.record_jitter(now - next_tick)
+            self.tick()
+            next_tick += period
+            if clock() > next_tick:
+                # the tick took longer than a period: skip the missed ticks
+                # instead of sending a burst to catch up
+                missed = int((clock() - next_tick) / period) + 1
+                self.overruns += missed
+                next_tick += missed * period
+
+    def stop(self, timeout=None):
+        self.running = False
+        self._wakeup.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+    #===========================================================================
+    # statistics
+    #===========================================================================
+
+    def reset_stats(self):
+        self.ticks = 0
+        self.overruns = 0
+        self._jitter_sum = 0.0
+        self._jitter_sum2 = 0.0
+        self._jitter_max = 0.0
+
+    def record_jitter(self, jitter):
+        self.ticks += 1
+        self._jitter_sum += jitter
+        self._jitter_sum2 += jitter * jitter
+        if jitter > self._jitter_max:
+            self._jitter_max = jitter
+
+    def stats(self):
+        """
+        Number of ticks sent, ticks skipped because of an overrun, and the mean,
+        standard deviation and maximum of the delay of the ticks (seconds).
+        """
+        n = self.ticks
+        mean = self._jitter_sum / n if n else 0.0
+        variance = self._jitter_sum2 / n - mean * mean if n else 0.0
+        return {
+            'ticks': n,
+            'overruns': self.overruns,
+            'jitter_mean': mean,
+            'jitter_stddev': math.sqrt(max(variance, 0.0)),
+            'jitter_max': self._jitter_max,
+        }
@@ -0,0 +1,107 @@
+"""
+Smoothing the control inputs before they are sent.
+
+Inputs from a joystick or a planner can come far more often than the drone
+takes commands, and they are noisy. A ``SetpointFilter`` takes them at any
+rate and the ``CommandScheduler`` samples it once per tick, so only one
+``PCMD`` per tick is sent whatever the input rate:
+
+>>> drone.start_scheduler(setpoint_filter=SetpointFilter(deadband=0.05))
+>>> for roll, pitch, gaz, yaw in joystick: # eg. at 1kHz
+...     drone.move(roll, pitch, gaz, yaw)
+
+Each of roll, pitch, gaz and yaw goes through:
+
+1. a deadband: inputs closer to 0 than ``deadband`` are 0, the others are
+   rescaled so the output still starts from 0 and reaches 1;
+2. a first order low-pass filter with the time constant ``time_constant``
+   (seconds), which is exact whatever the input and sampling rates;
+3. a slew rate limit of ``max_rate`` per second (eg. 4.0 goes from 0 to full
+   tilt in 0.25s).
+"""
+import math
+import threading
+
+from ardroneapi.scheduler import clock
+
+
+def apply_deadband(value, deadband):
+    value = max(-1.0, min(1.0, float(value)))
+    if abs(value) <= deadband:
+        return 0.0
+    if value > 0:
+        return (value - deadband) / (1.0 - deadband)
+    return (value + deadband) / (1.0 - deadband)
+
+
+class SetpointFilter(object):
+    """
+    Filters ``(roll, pitch, gaz, yaw)`` setpoints, see the module
+    documentation. ``update`` may be called from any thread and at any rate,
+    ``sample`` gives the value to send now.
+    """
+    def __init__(self, deadband=0.02, time_constant=0.1, max_rate=4.0):
+        self.deadband = deadband
+        self.time_constant = time_constant
+        self.max_rate = max_rate
+        self.inputs = 0
+        self.samples = 0
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self, now=None):
+        """
+        Jumps to 0 (eg. to hover right away).
+        """
+        with self._lock:
+            self.target = (0.0, 0.0, 0.0, 0.0)
+            self.filtered = (0.0, 0.0, 0.0, 0.0)
+            self.output = (0.0, 0.0, 0.0, 0.0)
+            self.filtered_at = self.sampled_at = clock() if now is None else now
+
+    def advance(self, now):
+        # the input is held between two updates, so the low-pass has an
+        # exact solution for any interval
+        dt = now - self.filtered_at
+        if dt <= 0:
+            return
+        if self.time_constant > 0:
+            alpha = 1.0 - math.exp(-dt / self.time_constant)
+        else:
+            alpha = 1.0
+        self.filtered = tuple(y + (x - y) * alpha
+                              for x, y in zip(self.target, self.filtered))
+        self.filtered_at = now
+
+    def update(self, roll, pitch, gaz, yaw, now=None):
+        """
+        A new input, in the range of ``Drone.move``.
+        """
+        deadband = self.deadband
+        target = (apply_deadband(roll, deadband), apply_deadband(pitch, deadband),
+                  apply_deadband(gaz, deadband), apply_deadband(yaw, deadband))
+        with self._lock:
+            self.advance(clock() if now is None else now)
+            self.target = target
+            self.inputs += 1
+
+    def sample(self, now=None):
+        """
+        The filtered ``(roll, pitch, gaz, yaw)`` to send now.
+        """
+        if now is None:
+            now = clock()
+        with self._lock:
+            self.advance(now)
+            step = self.max_rate * max(now - self.sampled_at, 0.0)
+            self.output = tuple(y + max(-step, min(step, f - y))
+                                for f, y in zip(self.filtered, self.output))
+            self.sampled_at = now
+            self.samples += 1
+            return self.output
+
+    def settled(self, tolerance=1e-3):
+        """
+        Whether the output has reached the input.
+        """
+        return all(abs(x - y) <= tolerance for x, y in zip(self.target, self.output))
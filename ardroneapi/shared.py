@@ -0,0 +1,239 @@
+"""
+Sharing the navdata of one drone with other processes through shared
+memory.
+
+The process flying the drone writes every packet, as a ``NavdataRecord``,
+to a ring buffer in a named shared memory block:
+
+>>> ring = SharedNavdataRing('ardrone-navdata', capacity=2000)
+>>> drone.connect_nav(ring.publish) # or hub.subscribe(ring.publish, policy=INLINE)
+
+and any other process on the host (eg. a planner) maps the same block and
+reads the telemetry with plain memory reads, no socket nor system call:
+
+>>> ring = SharedNavdataRing('ardrone-navdata')
+>>> ring.latest().altitude
+>>> index = ring.count
+>>> for index, record in ring.since(index): # the records written since
+...     planner.update(record)
+
+There is a single writer and any number of readers, and nobody ever waits
+for anybody: a record is written in place and protected by a sequence
+number (a seqlock). The writer makes it odd while it writes the slot and
+even again once done. A reader copies the slot and checks that the number
+was the same even value before and after, or tries again. The number also
+tells which record a slot holds, so a reader that was lapped by the writer
+knows it (``read`` returns None).
+
+The layout (little endian) is a 24 bytes header: ``b'ANRB'``, the layout
+version, the number of fields, the capacity and the number of records ever
+written (``count``, at offset 16), followed by ``capacity`` slots of
+a sequence number and the ``RECORD_FIELDS`` as doubles (128 bytes).
+
+This relies on the stores of the writer being seen in order by the readers,
+which x86 guarantees. Python has no memory barrier to offer on other CPUs.
+"""
+import mmap
+import os
+import struct
+
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    # before Python 3.8
+    shared_memory = None
+
+from ardroneapi.navdata import RECORD_FIELDS, NavdataRecord, unpack_into
+from ardroneapi.scheduler import clock
+
+RING_MAGIC = b'ANRB'
+RING_VERSION = 1
+
+ring_header_struct = struct.Struct('<4sHHI4xQ')
+count_struct = struct.Struct('<Q')
+COUNT_OFFSET = 16
+# the sequence number and the record
+slot_struct = struct.Struct('<Q%dd' % len(RECORD_FIELDS))
+values_struct = struct.Struct('<%dd' % len(RECORD_FIELDS))
+
+
+class MappedFile(object):
+    """
+    The part of ``SharedMemory`` we use, for Pythons that do not have it: a
+    file of ``/dev/shm`` (where ``SharedMemory`` puts them on Linux) mapped
+    in memory.
+    """
+    def __init__(self, name, create=False, size=0):
+        self.name = name
+        self.path = os.path.join('/dev/shm', name)
+        flags = os.O_RDWR | (os.O_CREAT | os.O_EXCL if create else 0)
+        fd = os.open(self.path, flags, 0o600)
+        try:
+            if create:
+                os.ftruncate(fd, size)
+            else:
+                size = os.fstat(fd).st_size
+            self.buf = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.size = size
+
+    def close(self):
+        self.buf.close()
+
+    def unlink(self):
+        os.unlink(self.path)
+
+
+def open_shared_memory(name, create=False, size=0):
+    if shared_memory is None:
+        return MappedFile(name, create, size)
+    if create:
+        return shared_memory.SharedMemory(name, create=True, size=size)
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # before Python 3.13 the resource tracker of a reader would destroy
+        # the block when the reader exits
+        memory = shared_memory.SharedMemory(name)
+        resource_tracker.unregister(memory._name, 'shared_memory')
+        return memory
+
+
+class SharedNavdataRing(object):
+    """
+    A ring buffer of the last ``capacity`` records in the shared memory block
+    ``name``. Given a ``capacity`` it creates the block and is the writer,
+    without it attaches to an existing block as a reader. See the module
+    documentation.
+    """
+    fields = RECORD_FIELDS
+    # seconds a slot may stay half written before ``read`` gives up on it
+    write_timeout = 0.1
+
+    def __init__(self, name, capacity=None):
+        self.name = name
+        self.writer = capacity is not None
+        if self.writer:
+            size = ring_header_struct.size + capacity * slot_struct.size
+            self.memory = open_shared_memory(name, create=True, size=size)
+            self.buf = self.memory.buf
+            ring_header_struct.pack_into(self.buf, 0, RING_MAGIC, RING_VERSION,
+                                         len(self.fields), capacity, 0)
+        else:
+            self.memory = open_shared_memory(name)
+            self.buf = self.memory.buf
+            magic, version, width, capacity, count = \
+                ring_header_struct.unpack_from(self.buf, 0)
+            if magic != RING_MAGIC or version != RING_VERSION or width != len(self.fields):
+                self.memory.close()
+                raise ValueError("%r is not a navdata ring of this version" % name)
+        self.capacity = capacity
+        # only used by the writer
+        self._count = 0
+        self._record = NavdataRecord()
+
+    @property
+    def count(self):
+        """
+        The number of records ever written.
+        """
+        return count_struct.unpack_from(self.buf, COUNT_OFFSET)[0]
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def _offset(self, index):
+        return ring_header_struct.size + (index % self.capacity) * slot_struct.size
+
+    def append(self, record):
+        """
+        Writes ``record`` (a ``NavdataRecord``), for the writer only.
+        """
+        buf = self.buf
+        index = self._count
+        offset = self._offset(index)
+        count_struct.pack_into(buf, offset, 2 * index + 1)
+        values_struct.pack_into(buf, offset + 8,
+                                *[getattr(record, field) for field in self.fields])
+        count_struct.pack_into(buf, offset, 2 * index + 2)
+        self._count = index + 1
+        count_struct.pack_into(buf, COUNT_OFFSET, self._count)
+
+    def publish(self, navdata):
+        """
+        Writes a ``NavigationData``, as a navdata callback.
+        """
+        self.append(unpack_into(navdata.raw_data, self._record))
+
+    def read(self, index, record=None):
+        """
+        Copies the record number ``index`` (counted from the first record
+        ever written) into ``record`` (a new ``NavdataRecord`` by default).
+        Returns None if it has not been written yet or was overwritten.
+        Raises an exception if the slot stays half written for
+        ``write_timeout`` seconds (the writer died while writing it).
+        """
+        buf = self.buf
+        offset = self._offset(index)
+        done = 2 * index + 2
+        deadline = None
+        while True:
+            values = slot_struct.unpack_from(buf, offset)
+            if values[0] != done:
+                if values[0] == done - 1:
+                    # being written right now
+                    now = clock()
+                    if deadline is None:
+                        deadline = now + self.write_timeout
+                    elif now > deadline:
+                        raise Exception("Record %d of %r is still half written after %gs"
+                                        % (index, self.name, self.write_timeout))
+                    continue
+                return None
+            if count_struct.unpack_from(buf, offset)[0] == done:
+                break
+        if record is None:
+            record = NavdataRecord()
+        for field, value in zip(self.fields, values[1:]):
+            setattr(record, field, value)
+        return record
+
+    def latest(self, record=None):
+        """
+        The newest record, or None if there is none yet.
+        """
+        while True:
+            count = self.count
+            if not count:
+                return None
+            result = self.read(count - 1, record)
+            if result is not None:
+                return result
+
+    def since(self, index):
+        """
+        Yields ``(index, record)`` for the records written from ``index`` on
+        that are still in the buffer, oldest first. Pass the last ``index``
+        plus one to the next call to get only the new ones.
+        """
+        count = self.count
+        index = max(index, count - self.capacity)
+        while index < count:
+            record = self.read(index)
+            if record is None:
+                # lapped by the writer
+                index = max(index + 1, self.count - self.capacity)
+                continue
+            yield index, record
+            index += 1
+
+    def close(self):
+        """
+        Unmaps the block, and destroys it if this is the writer.
+        """
+        # memoryviews of the block must go before it can be closed
+        self.buf = None
+        self.memory.close()
+        if self.writer:
+            self.memory.unlink()
@@ -0,0 +1,390 @@
+"""
+A stand-in for the drone, to develop and load-test without hardware.
+
+``DroneSimulator`` listens on the AT command, navdata and config ports,
+follows the AT commands with a very simple flight model and streams
+well-formed navdata to every client that poked the navdata port.
+
+>>> sim = DroneSimulator('127.0.0.1', rate=200)
+>>> sim.start()
+>>> d = Drone(drone_ip='127.0.0.1', local_ip='127.0.0.2')
+>>> ...
+>>> sim.stop()
+
+It can also run as its own process:
+
+    python -m ardroneapi.simulator --host 127.0.0.1 --rate 200
+
+The model is made to exercise the client, not to be realistic: takeoff
+climbs to one meter, gaz moves up and down, roll/pitch tilt the drone and
+give it a proportional speed, yaw spins it, the battery drains while flying.
+"""
+import collections
+import select
+import socket
+import threading
+
+from ardroneapi import constants
+from ardroneapi import int2float
+from ardroneapi.navdata import (OPTIONS, NAVDATA_DEMO_TAG, NAVDATA_TIME_TAG,
+    NAVDATA_EULER_ANGLES_TAG, NAVDATA_ALTITUDE_TAG, pack_navdata)
+from ardroneapi.scheduler import clock
+
+DEFAULT_CONFIG = (
+    ('general:num_version_config', '1'),
+    ('general:num_version_mb', '33'),
+    ('general:num_version_soft', '1.7.4'),
+    ('general:navdata_demo', 'TRUE'),
+    ('control:altitude_max', '3000'),
+    ('control:euler_angle_max', '0.2094395'),
+    ('control:control_vz_max', '1000.000000'),
+    ('control:control_yaw', '3.490659'),
+    ('video:codec_fps', '30'),
+    ('leds:leds_anim', '0,0,0'),
+)
+
+# the bits the real drone always reports when it works properly
+ALWAYS_ON = (constants.ARDRONE_PIC_VERSION_MASK |
+             constants.ARDRONE_ATCODEC_THREAD_ON |
+             constants.ARDRONE_NAVDATA_THREAD_ON |
+             constants.ARDRONE_VIDEO_THREAD_ON |
+             constants.ARDRONE_ACQ_THREAD_ON)
+
+
+class FlightModel(object):
+    """
+    The simulated state of the drone. Angles are in milli-degrees, distances
+    in millimeters, like in the demo navdata option.
+    """
+    takeoff_altitude = 1000
+    climb_speed = 500.0 # mm/s, takeoff and landing
+    vz_max = 1000.0 # mm/s at gaz = 1
+    euler_angle_max = 12000.0 # milli-degrees at roll/pitch = 1
+    speed_max = 2000.0 # mm/s at roll/pitch = 1
+    yaw_speed_max = 100000.0 # milli-degrees/s at yaw = 1
+    battery_drain = 1 / 30.0 # percent/s while flying
+
+    def __init__(self):
+        self.flying = False
+        self.takeoff = False
+        self.emergency = False
+        self.altitude = 0.0
+        self.theta = self.phi = self.psi = 0.0
+        self.vx = self.vy = self.vz = 0.0
+        self.battery = 100.0
+        self.setpoint = (0.0, 0.0, 0.0, 0.0)
+        self.climbing = False
+
+    def step(self, dt):
+        roll, pitch, gaz, yaw = self.setpoint
+        if self.emergency:
+            self.flying = self.takeoff = self.climbing = False
+            self.altitude = 0.0
+        elif self.takeoff:
+            if not self.flying:
+                self.flying = self.climbing = True
+            if self.climbing:
+                self.vz = self.climb_speed
+                if self.altitude >= self.takeoff_altitude:
+                    self.climbing = False
+            else:
+                self.vz = gaz * self.vz_max
+        elif self.flying:
+            self.vz = -self.climb_speed
+            if self.altitude <= 0:
+                self.flying = False
+        if not self.flying:
+            self.theta = self.phi = self.vx = self.vy = self.vz = 0.0
+            return
+        self.altitude = max(self.altitude + self.vz * dt, 0.0)
+        self.theta = pitch * self.euler_angle_max
+        self.phi = roll * self.euler_angle_max
+        self.psi = (self.psi + yaw * self.yaw_speed_max * dt + 180000.0) % 360000.0 - 180000.0
+        self.vx = -pitch * self.speed_max
+        self.vy = roll * self.speed_max
+        self.battery = max(self.battery - self.battery_drain * dt, 0.0)
+
+
+class DroneSimulator(threading.Thread):
+    """
+    Serves the drone's ports on ``host`` from a single thread and sends
+    navdata ``rate`` times per second. The ports default to those of
+    ``Drone``; pass 0 to let the system choose (see ``at_port``, ... after
+    ``bind``).
+
+    ``commands`` keeps the last ``log_size`` AT commands received as
+    ``(method, sequence, args)`` tuples.
+    """
+    watchdog_timeout = 0.25 # seconds without a command
+    buffer_size = 4096
+
+    def __init__(self, host='127.0.0.1', at_port=5556, nav_port=5554,
+                 cfg_port=5559, rate=15.0, log_size=1000):
+        super(DroneSimulator, self).__init__()
+        self.daemon = True
+        self.host = host
+        self.at_port = at_port
+        self.nav_port = nav_port
+        self.cfg_port = cfg_port
+        self.period = 1.0 / rate
+        self.model = FlightModel()
+        self.config = collections.OrderedDict(DEFAULT_CONFIG)
+        self.commands = collections.deque(maxlen=log_size)
+        self.nav_clients = set()
+        self.cfg_clients = []
+        self.running = False
+        self.at_socket = self.nav_socket = self.cfg_socket = None
+        self._static = None
+        self.reset()
+
+    def reset(self):
+        self.last_sequence = 0
+        self.last_ref = 0
+        self.last_command = None
+        self.navdata_sequence = 0
+        self.command_ack = False
+        self.trim_ack = False
+        self.com_watchdog = False
+        self.received = 0
+        self.ignored = 0
+        self.sent = 0
+
+    def bind(self):
+        self.at_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.at_socket.bind((self.host, self.at_port))
+        self.at_port = self.at_socket.getsockname()[1]
+        self.nav_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # a client on the same host binds the same port on all interfaces
+        self.nav_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.nav_socket.bind((self.host, self.nav_port))
+        self.nav_port = self.nav_socket.getsockname()[1]
+        self.cfg_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.cfg_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.cfg_socket.bind((self.host, self.cfg_port))
+        self.cfg_socket.listen(5)
+        self.cfg_port = self.cfg_socket.getsockname()[1]
+
+    def start(self):
+        if self.at_socket is None:
+            self.bind()
+        self.running = True
+        super(DroneSimulator, self).start()
+
+    def stop(self, timeout=None):
+        self.running = False
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+        for s in [self.at_socket, self.nav_socket, self.cfg_socket] + self.cfg_clients:
+            if s is not None:
+                s.close()
+        self.at_socket = self.nav_socket = self.cfg_socket = None
+        self.cfg_clients = []
+
+    def run(self):
+        next_tick = clock()
+        while self.running:
+            # accept config connections first: a client connects before it
+            # sends the CTRL command asking for the config
+            sockets = [self.cfg_socket, self.at_socket, self.nav_socket] + self.cfg_clients
+            timeout = max(next_tick - clock(), 0)
+            readable = select.select(sockets, [], [], timeout)[0]
+            for s in readable:
+                if s is self.at_socket:
+                    self.at_received(s.recv(self.buffer_size))
+                elif s is self.nav_socket:
+                    data, address = s.recvfrom(self.buffer_size)
+                    self.nav_clients.add(address)
+                elif s is self.cfg_socket:
+                    self.cfg_clients.append(s.accept()[0])
+                elif not s.recv(self.buffer_size):
+                    self.cfg_clients.remove(s)
+                    s.close()
+            now = clock()
+            if now >= next_tick:
+                self.model.step(self.period)
+                self.check_watchdog(now)
+                self.send_navdata()
+                next_tick += self.period
+                if next_tick < now:
+                    next_tick = now + self.period
+
+    #===========================================================================
+    # AT commands
+    #===========================================================================
+
+    def at_received(self, data):
+        if not isinstance(data, str):
+            data = data.decode('ascii', 'replace')
+        for command in data.split('\r'):
+            if not command.startswith('AT*') or '=' not in command:
+                continue
+            method, args = command[3:].split('=', 1)
+            if method == 'CONFIG':
+                args = args.split(',', 2)
+            else:
+                args = args.split(',')
+            try:
+                sequence = int(args[0])
+            except ValueError:
+                continue
+            self.received += 1
+            self.last_command = clock()
+            # like the drone, ignore old commands unless the client restarts
+            # its sequence at 1
+            if sequence <= self.last_sequence and sequence != 1:
+                self.ignored += 1
+                continue
+            self.last_sequence = sequence
+            self.commands.append((method, sequence, args[1:]))
+            handler = getattr(self, 'at_' + method.lower(), None)
+            if handler is not None:
+                try:
+                    handler(*args[1:])
+                except (TypeError, ValueError):
+                    # wrong number or type of arguments
+                    self.ignored += 1
+
+    def at_ref(self, value):
+        value = int(value)
+        model = self.model
+        emergency = value & 256
+        if emergency and not self.last_ref & 256:
+            # toggles the emergency mode
+            model.emergency = not model.emergency
+        self.last_ref = value
+        model.takeoff = bool(value & 512) and not model.emergency
+
+    def at_pcmd(self, flag, roll, pitch, gaz, yaw, *extra):
+        if int(flag):
+            self.model.setpoint = tuple(int2float(int(v)) for v in (roll, pitch, gaz, yaw))
+        else:
+            self.model.setpoint = (0.0, 0.0, 0.0, 0.0)
+
+    def at_comwdg(self):
+        self.com_watchdog = False
+
+    def at_ftrim(self):
+        self.trim_ack = True
+
+    def at_config(self, key, value):
+        self.config[key.strip('"')] = value.strip('"')
+        self.command_ack = True
+
+    def at_ctrl(self, mode, *args):
+        mode = int(mode)
+        if mode == constants.ACK_CONTROL_MODE:
+            self.command_ack = False
+        elif mode == constants.CFG_GET_CONTROL_MODE:
+            self.send_config()
+
+    def check_watchdog(self, now):
+        if self.last_command is None or now - self.last_command > self.watchdog_timeout:
+            self.com_watchdog = True
+
+    #===========================================================================
+    # config
+    #===========================================================================
+
+    def config_dump(self):
+        return ''.join(['%s = %s\n' % item for item in self.config.items()]).encode('ascii')
+
+    def send_config(self):
+        dump = self.config_dump()
+        for client in self.cfg_clients:
+            client.sendall(dump)
+
+    #===========================================================================
+    # navdata
+    #===========================================================================
+
+    @property
+    def state(self):
+        model = self.model
+        state = ALWAYS_ON
+        if model.flying:
+            state |= constants.ARDRONE_FLY_MASK
+        if model.emergency:
+            state |= constants.ARDRONE_EMERGENCY_MASK
+        if model.battery < 20:
+            state |= constants.ARDRONE_VBAT_LOW
+        if self.demo:
+            state |= constants.ARDRONE_NAVDATA_DEMO_MASK
+        if self.command_ack:
+            state |= constants.ARDRONE_COMMAND_MASK
+        if self.trim_ack:
+            state |= constants.ARDRONE_TRIM_COMMAND_MASK | constants.ARDRONE_TRIM_RESULT_MASK
+        if self.com_watchdog:
+            state |= constants.ARDRONE_COM_WATCHDOG_MASK
+        return state
+
+    @property
+    def demo(self):
+        return self.config.get('general:navdata_demo', 'TRUE').upper() == 'TRUE'
+
+    def navdata(self):
+        """
+        The next navdata packet: the demo option only in demo mode, all
+        options otherwise.
+        """
+        model = self.model
+        self.navdata_sequence += 1
+        ctrl_state = 0x20000 if model.flying else 0x10000
+        demo = OPTIONS[NAVDATA_DEMO_TAG].defaults()._replace(
+            ctrl_state=ctrl_state, vbat_flying_percentage=int(model.battery),
+            theta=model.theta, phi=model.phi, psi=model.psi,
+            altitude=int(model.altitude), vx=model.vx, vy=model.vy, vz=model.vz)
+        options = [(NAVDATA_DEMO_TAG, demo)]
+        if not self.demo:
+            now = clock()
+            seconds = int(now) & 0x7FF
+            options.append((NAVDATA_TIME_TAG, ((seconds << 21) | int((now % 1) * 1000000),)))
+            options.append((NAVDATA_EULER_ANGLES_TAG, (model.theta, model.phi)))
+            options.append((NAVDATA_ALTITUDE_TAG, (int(model.altitude), model.vz,
+                                                   model.takeoff_altitude, int(model.altitude))))
+            options.extend(self._static_options())
+        state = self.state
+        # reported once: the next FTRIM is acknowledged by a new packet
+        self.trim_ack = False
+        return pack_navdata(state, self.navdata_sequence, options, 1)
+
+    def _static_options(self):
+        # the options the model has nothing to say about, packed once
+        if self._static is None:
+            dynamic = (NAVDATA_DEMO_TAG, NAVDATA_TIME_TAG,
+                       NAVDATA_EULER_ANGLES_TAG, NAVDATA_ALTITUDE_TAG)
+            self._static = [layout.pack(layout.defaults())
+                            for tag, layout in sorted(OPTIONS.items())
+                            if tag not in dynamic]
+        return self._static
+
+    def send_navdata(self):
+        if not self.nav_clients:
+            return
+        data = self.navdata()
+        for address in self.nav_clients:
+            self.nav_socket.sendto(data, address)
+            self.sent += 1
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Simulates an AR.Drone.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--at-port', type=int, default=5556)
+    parser.add_argument('--nav-port', type=int, default=5554)
+    parser.add_argument('--cfg-port', type=int, default=5559)
+    parser.add_argument('--rate', type=float, default=15.0,
+                        help='navdata packets per second')
+    args = parser.parse_args()
+    sim = DroneSimulator(args.host, args.at_port, args.nav_port, args.cfg_port, args.rate)
+    sim.bind()
+    sim.running = True
+    try:
+        sim.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""
+Receiving the video stream of the drone.
+
+The drone streams video on TCP port 5555. Every frame is preceded by a
+"PaVE" header (``pave_struct``) giving, among others, the codec, the size of
+the picture and the size of the payload that follows:
+
+>>> receiver = drone.connect_video()
+>>> frame = receiver.frames.get()
+>>> frame.header.frame_number, frame.header.encoded_stream_width
+>>> decode(frame.data) # a memoryview of the payload
+>>> frame.release() # gives the buffer back to the receiver
+>>> drone.disconnect_video()
+
+Frames are read straight into the buffers of a ``BufferPool`` allocated
+once, so receiving allocates nothing per frame. A ``FrameQueue`` hands them
+to the consumers: when it is full the oldest frame is dropped, and when all
+the buffers are held by the consumers the new frames are dropped, so a slow
+consumer never stalls the receiver (nor the navdata, which has its own
+thread and socket). Consumers must ``release`` every frame they ``get``.
+"""
+import collections
+import socket
+import struct
+import threading
+import time
+
+PAVE_SIGNATURE = b'PaVE'
+
+# video_codec
+CODEC_MPEG4_VISUAL = 1
+CODEC_MPEG4_AVC = 2
+
+# frame_type
+FRAME_TYPE_IDR = 1
+FRAME_TYPE_I = 2
+FRAME_TYPE_P = 3
+
+pave_struct = struct.Struct('<4sBBHIHHHHIIBBBBIIHBBBB2sI12s')
+
+PaVEHeader = collections.namedtuple('PaVEHeader', (
+    'signature', 'version', 'video_codec', 'header_size', 'payload_size',
+    'encoded_stream_width', 'encoded_stream_height', 'display_width',
+    'display_height', 'frame_number', 'timestamp', 'total_chunks',
+    'chunk_index', 'frame_type', 'control', 'stream_byte_position_lw',
+    'stream_byte_position_uw', 'stream_id', 'total_slices', 'slice_index',
+    'header1_size', 'header2_size', 'reserved2', 'advertised_size',
+    'reserved3'))
+
+
+def pack_frame(payload, frame_number=0, timestamp=0, width=640, height=360,
+               frame_type=FRAME_TYPE_P, codec=CODEC_MPEG4_AVC):
+    """
+    Builds a frame as the drone sends it, header and payload (eg. for a
+    simulator or tests).
+    """
+    header = pave_struct.pack(
+        PAVE_SIGNATURE, 2, codec, pave_struct.size, len(payload), width,
+        height, width, height, frame_number, timestamp, 1, 0, frame_type, 0,
+        0, 0, 0, 1, 0, 0, 0, b'\0\0', len(payload), b'\0' * 12)
+    return header + payload
+
+
+class FrameBuffer(object):
+    """
+    A preallocated buffer holding one frame. ``data`` is a memoryview of the
+    payload, valid until the frame is ``release``d. ``timestamp`` is when it
+    was received. Releasing it twice raises a ``ValueError``.
+    """
+    def __init__(self, pool, size):
+        self.pool = pool
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.header = None
+        self.length = 0
+        self.timestamp = None
+        # taken from the pool and not given back yet
+        self.in_use = False
+
+    @property
+    def data(self):
+        return self.view[:self.length]
+
+    def release(self):
+        self.pool.release(self)
+
+    def __repr__(self):
+        if self.header is None:
+            return '<FrameBuffer free>'
+        return '<FrameBuffer #%d %d bytes>' % (self.header.frame_number, self.length)
+
+
+class BufferPool(object):
+    """
+    ``count`` buffers of ``size`` bytes, allocated once.
+    """
+    def __init__(self, count, size):
+        self.size = size
+        self.free = collections.deque(FrameBuffer(self, size) for i in range(count))
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        A free buffer, or None if all are in use.
+        """
+        try:
+            buffer = self.free.popleft()
+        except IndexError:
+            return None
+        buffer.in_use = True
+        return buffer
+
+    def release(self, buffer):
+        with self._lock:
+            if not buffer.in_use:
+                # in the free list already: a second copy would be handed
+                # out to two frames at once
+                raise ValueError("%r was released twice" % buffer)
+            buffer.in_use = False
+            buffer.header = None
+            buffer.length = 0
+            buffer.timestamp = None
+            self.free.append(buffer)
+
+
+class FrameQueue(object):
+    """
+    A bounded queue that drops (and releases) the oldest frame when a new one
+    is put while it is full.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.frames = collections.deque()
+        self.overflows = 0
+        self._not_empty = threading.Condition(threading.Lock())
+
+    def __len__(self):
+        return len(self.frames)
+
+    def put(self, frame):
+        with self._not_empty:
+            if len(self.frames) >= self.maxsize:
+                self.frames.popleft().release()
+                self.overflows += 1
+            self.frames.append(frame)
+            self._not_empty.notify()
+
+    def get(self, timeout=None):
+        """
+        The oldest frame, waiting up to ``timeout`` seconds for one (None if
+        there is none by then).
+        """
+        with self._not_empty:
+            if not self.frames:
+                self._not_empty.wait(timeout)
+                if not self.frames:
+                    return None
+            return self.frames.popleft()
+
+    def clear(self):
+        with self._not_empty:
+            while self.frames:
+                self.frames.popleft().release()
+
+
+class VideoReceiver(threading.Thread):
+    """
+    Reads the frames from the video socket in a background thread and puts
+    them in ``frames``, a ``FrameQueue``. See the module documentation.
+
+    ``received`` counts the frames read, ``dropped`` those that were skipped
+    because no buffer was free or they were larger than ``frame_size``, and
+    ``frames.overflows`` those the consumers did not get in time.
+    """
+    def __init__(self, sock, pool_size=8, queue_size=4, frame_size=256 * 1024,
+                 timeout=0.5):
+        super(VideoReceiver, self).__init__()
+        self.daemon = True
+        self.sock = sock
+        # the timeout only limits how long ``stop`` has to wait
+        self.sock.settimeout(timeout)
+        self.pool = BufferPool(pool_size, frame_size)
+        self.frames = FrameQueue(min(queue_size, pool_size))
+        self.running = False
+        self.received = 0
+        self.dropped = 0
+        self.errors = 0
+        self._header = bytearray(pave_struct.size)
+        self._header_view = memoryview(self._header)
+        self._scratch = memoryview(bytearray(16 * 1024))
+
+    def start(self):
+        self.running = True
+        super(VideoReceiver, self).start()
+
+    def read_into(self, view):
+        """
+        Fills ``view`` from the socket. Returns False if the connection was
+        closed or the receiver stopped.
+        """
+        recv_into = self.sock.recv_into
+        while view:
+            try:
+                n = recv_into(view)
+            except socket.timeout:
+                if not self.running:
+                    return False
+                continue
+            if not n:
+                return False
+            view = view[n:]
+        return True
+
+    def skip(self, length):
+        while length:
+            n = min(length, len(self._scratch))
+            if not self.read_into(self._scratch[:n]):
+                return False
+            length -= n
+        return True
+
+    def read_frame(self):
+        """
+        Reads the next frame, returns False when the stream ended.
+        """
+        header = self._header_view
+        if not self.read_into(header[:pave_struct.size]):
+            return False
+        fields = pave_struct.unpack_from(self._header)
+        if fields[0] != PAVE_SIGNATURE:
+            # lost track of the frame boundaries
+            self.errors += 1
+            return False
+        header_size, payload_size = fields[3], fields[4]
+        if header_size > pave_struct.size:
+            # newer firmwares have longer headers
+            if not self.skip(header_size - pave_struct.size):
+                return False
+        frame = self.pool.acquire()
+        if frame is None or payload_size > self.pool.size:
+            if frame is not None:
+                frame.release()
+            self.dropped += 1
+            return self.skip(payload_size)
+        if not self.read_into(frame.view[:payload_size]):
+            frame.release()
+            return False
+        frame.header = PaVEHeader._make(fields)
+        frame.length = payload_size
+        frame.timestamp = time.time()
+        self.received += 1
+        self.frames.put(frame)
+        return True
+
+    def run(self):
+        try:
+            while self.running and self.read_frame():
+                pass
+        except socket.error:
+            # the socket has been closed underneath us
+            pass
+        self.running = False
+
+    def stop(self, timeout=None):
+        self.running = False
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
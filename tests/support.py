@@ -0,0 +1,23 @@
+"""
+Helpers shared by the tests.
+"""
+import socket
+
+from ardroneapi import Drone
+
+
+class LoopbackDrone(Drone):
+    """
+    A ``Drone`` whose command socket is connected to a local socket,
+    ``wire``, to read the commands it sends.
+    """
+    def __init__(self):
+        super(LoopbackDrone, self).__init__()
+        self.wire = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.wire.bind(('127.0.0.1', 0))
+        self.cmd_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.cmd_socket.connect(self.wire.getsockname())
+
+    def close(self):
+        self.wire.close()
+        self.cmd_socket.close()
@@ -0,0 +1,184 @@
+import socket
+import time
+import unittest
+
+from ardroneapi import constants
+from ardroneapi.acks import AckTracker, TrackedCommand
+
+from support import LoopbackDrone
+
+COMMAND_ACK = constants.ARDRONE_COMMAND_MASK
+
+
+class Navdata(object):
+
+    def __init__(self, state=0):
+        self.state = state
+
+
+class AckTrackerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.drone = LoopbackDrone()
+        self.drone.wire.setblocking(False)
+        self.acks = self.drone.acks = AckTracker(self.drone, timeout=0.01, retries=2,
+                                                 queue_timeout=0.05)
+        # no configuration to invalidate
+        self.drone.config.invalidate = lambda: None
+
+    def tearDown(self):
+        self.drone.close()
+
+    def sent(self):
+        """
+        The methods of the commands sent since the last call.
+        """
+        methods = []
+        while True:
+            try:
+                data = self.drone.wire.recv(1024)
+            except socket.error:
+                return methods
+            for command in data.split(b'\r'):
+                if command:
+                    methods.append(command.split(b'=')[0][3:].decode('ascii'))
+
+    def test_configs_without_navdata_are_sent_at_once(self):
+        commands = [self.drone.config.set('general:navdata_demo', i % 2 == 0)
+                    for i in range(3)]
+        self.assertEqual(self.sent(), ['CONFIG'] * 3)
+        self.assertEqual(len(self.acks.waiting), 0)
+        self.assertEqual([c.attempts for c in commands], [1, 1, 1])
+
+    def test_one_config_in_flight_with_navdata(self):
+        acks = self.acks
+        acks.navdata_received(Navdata())
+        first = acks.send('CONFIG', ('"a"', '"1"'))
+        second = acks.send('CONFIG', ('"b"', '"2"'))
+        self.assertEqual(self.sent(), ['CONFIG'])
+        self.assertEqual(list(acks.waiting), [second])
+        # the ACK bit acknowledges the first one and is reset
+        acks.navdata_received(Navdata(COMMAND_ACK))
+        self.assertTrue(first.wait(0))
+        self.assertEqual(self.sent(), ['CTRL'])
+        # once the bit is cleared the second one goes
+        acks.navdata_received(Navdata())
+        self.assertEqual(self.sent(), ['CONFIG'])
+        acks.navdata_received(Navdata(COMMAND_ACK))
+        self.assertTrue(second.wait(0))
+        self.assertEqual(acks.stats()['CONFIG']['acked'], 2)
+
+    def test_waiting_config_times_out_when_the_bit_is_stuck(self):
+        acks = self.acks
+        acks.navdata_received(Navdata(COMMAND_ACK))
+        self.sent()
+        command = acks.send('CONFIG', ('"a"', '"1"'))
+        self.assertEqual(self.sent(), [])
+        time.sleep(0.06)
+        acks.navdata_received(Navdata(COMMAND_ACK))
+        self.assertEqual(sorted(self.sent()), ['CONFIG', 'CTRL'])
+        self.assertTrue(command.failed)
+        self.assertFalse(command.wait(0))
+        self.assertEqual(len(acks.waiting), 0)
+
+    def test_waiting_configs_are_sent_when_navdata_stops(self):
+        acks = self.acks
+        acks.stale_after = 0.02
+        acks.navdata_received(Navdata())
+        acks.send('CONFIG', ('"a"', '"1"'))
+        acks.send('CONFIG', ('"b"', '"2"'))
+        self.assertEqual(self.sent(), ['CONFIG'])
+        time.sleep(0.03)
+        acks.send('CONFIG', ('"c"', '"3"'))
+        self.assertEqual(self.sent(), ['CONFIG', 'CONFIG'])
+        self.assertEqual(len(acks.waiting), 0)
+
+    def test_retransmit_then_give_up(self):
+        acks = self.acks
+        acks.navdata_received(Navdata())
+        command = acks.send('FTRIM', ack=constants.ARDRONE_TRIM_COMMAND_MASK)
+        for i in range(20):
+            time.sleep(0.01)
+            acks.navdata_received(Navdata())
+        self.assertTrue(command.failed)
+        self.assertEqual(command.attempts, 3)
+        self.assertEqual(self.sent(), ['FTRIM'] * 3)
+        stats = acks.stats()['FTRIM']
+        self.assertEqual((stats['failed'], stats['retransmissions']), (1, 2))
+
+    def test_ack_needs_a_packet_after_sending(self):
+        acks = self.acks
+        acks.navdata_received(Navdata(constants.ARDRONE_FLY_MASK))
+        command = acks.send('REF', ('512',), constants.ARDRONE_FLY_MASK)
+        self.assertFalse(command.wait(0))
+        acks.navdata_received(Navdata(constants.ARDRONE_FLY_MASK))
+        self.assertTrue(command.wait(0))
+
+    def test_commands_expire_without_navdata(self):
+        acks = self.acks
+        acks.stale_after = 0.02
+        first = acks.send('FTRIM', ack=constants.ARDRONE_TRIM_COMMAND_MASK)
+        time.sleep(0.03)
+        second = acks.send('FTRIM', ack=constants.ARDRONE_TRIM_COMMAND_MASK)
+        self.assertTrue(first.failed)
+        self.assertEqual(acks.in_flight, [second])
+        time.sleep(0.03)
+        # given up rather than retransmitted when navdata comes back
+        acks.navdata_received(Navdata())
+        self.assertTrue(second.failed)
+        self.assertEqual(self.sent(), ['FTRIM', 'FTRIM'])
+        self.assertEqual(acks.stats()['FTRIM']['failed'], 2)
+
+    def test_cancel(self):
+        acks = self.acks
+        acks.navdata_received(Navdata())
+        takeoff = acks.send('REF', ('512',), constants.ARDRONE_FLY_MASK)
+        trim = acks.send('FTRIM', ack=constants.ARDRONE_TRIM_COMMAND_MASK)
+        self.assertEqual(acks.cancel('REF'), [takeoff])
+        self.assertTrue(takeoff.failed)
+        self.assertTrue(takeoff.done.is_set())
+        self.assertEqual(acks.in_flight, [trim])
+
+    def test_watched_commands_are_not_sent(self):
+        acks = self.acks
+        acks.navdata_received(Navdata())
+        command = acks.send('REF', ('512',), constants.ARDRONE_FLY_MASK, watch=True)
+        for i in range(3):
+            time.sleep(0.01)
+            acks.navdata_received(Navdata())
+        acks.navdata_received(Navdata(constants.ARDRONE_FLY_MASK))
+        self.assertTrue(command.wait(0))
+        self.assertEqual(self.sent(), [])
+        self.assertEqual(acks.stats()['REF']['retransmissions'], 0)
+
+
+class DroneRefTest(unittest.TestCase):
+
+    def setUp(self):
+        self.drone = LoopbackDrone()
+        self.drone.wire.setblocking(False)
+        self.drone.acks.navdata_received(Navdata())
+
+    def tearDown(self):
+        self.drone.stop_scheduler()
+        self.drone.close()
+
+    def test_emergency_cancels_the_takeoff(self):
+        takeoff = self.drone.takeoff()
+        self.drone.emergency()
+        self.assertTrue(takeoff.failed)
+        self.assertEqual(self.drone.acks.in_flight, [])
+
+    def test_takeoff_and_land_with_the_scheduler(self):
+        self.drone.start_scheduler(rate=100)
+        takeoff = self.drone.takeoff()
+        land = self.drone.land()
+        self.assertIsInstance(takeoff, TrackedCommand)
+        self.assertTrue(takeoff.failed)
+        self.assertEqual(self.drone.acks.in_flight, [land])
+        self.drone.acks.navdata_received(Navdata())
+        self.assertTrue(land.wait(0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import logging
+import unittest
+
+try:
+    import asyncio
+    from ardroneapi.aio import AsyncDrone, NavdataProtocol
+except (ImportError, SyntaxError):
+    # Python 2
+    asyncio = None
+
+from ardroneapi.navdata import pack_navdata
+from ardroneapi.simulator import DroneSimulator
+
+
+@unittest.skipIf(asyncio is None, "needs asyncio")
+class AsyncDroneTest(unittest.TestCase):
+
+    def setUp(self):
+        # not at 127.0.0.1: the poke leaves from there, and the navdata
+        # would go back to the simulator's own socket
+        self.simulator = DroneSimulator('127.0.0.3', rate=100)
+        self.simulator.start()
+        self.loop = asyncio.new_event_loop()
+        self.drone = AsyncDrone(drone_ip='127.0.0.3', local_ip='127.0.0.2')
+        self.wait(self.drone.connect())
+        self.wait(self.drone.connect_nav())
+
+    def tearDown(self):
+        self.drone.close()
+        self.loop.close()
+        self.simulator.stop()
+
+    def wait(self, coroutine, timeout=2.0):
+        return self.loop.run_until_complete(asyncio.wait_for(coroutine, timeout))
+
+    def test_navdata_after_the_poke(self):
+        navdata = self.wait(self.drone.navdata().__anext__())
+        self.assertTrue(navdata.demo is not None)
+        self.assertEqual(len(self.simulator.nav_clients), 1)
+
+    def test_close_stops_a_waiting_consumer(self):
+        consumers = [self.drone.navdata() for i in range(2)]
+        self.wait(consumers[0].__anext__())
+        # drop what is queued, then wait for a packet that will not come
+        self.simulator.running = False
+        self.simulator.join(1.0)
+        self.wait(asyncio.sleep(0.05))
+        queue = self.drone.nav_protocol.queue
+        while not queue.empty():
+            queue.get_nowait()
+        waiting = [self.loop.create_task(consumer.__anext__()) for consumer in consumers]
+        self.wait(asyncio.sleep(0.05))
+        self.assertFalse(any(task.done() for task in waiting))
+        self.drone.close()
+        for task in waiting:
+            self.assertRaises(StopAsyncIteration, self.wait, task)
+
+
+@unittest.skipIf(asyncio is None, "needs asyncio")
+class NavdataProtocolTest(unittest.TestCase):
+
+    def test_failing_callback(self):
+        protocol = NavdataProtocol()
+        got = []
+        def fail(navdata):
+            raise Exception('Not connected yet!')
+        protocol.callbacks += [fail, got.append]
+        logging.disable(logging.CRITICAL)
+        try:
+            protocol.datagram_received(pack_navdata(0, 1), None)
+        finally:
+            logging.disable(logging.NOTSET)
+        self.assertEqual([n.sequence for n in got], [1])
+        self.assertEqual(protocol.queue.get_nowait().sequence, 1)
+        self.assertEqual(protocol.callback_errors, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from ardroneapi.bulk import np
+from ardroneapi.navdata import (OPTIONS, NAVDATA_DEMO_TAG, NAVDATA_TIME_TAG,
+    NavigationData, pack_navdata)
+
+
+def packets():
+    demo = OPTIONS[NAVDATA_DEMO_TAG].defaults()
+    return [
+        pack_navdata(1, 10, [(NAVDATA_DEMO_TAG, demo._replace(altitude=1000, psi=45000.0))]),
+        # another length: demo and time
+        pack_navdata(2, 11, [(NAVDATA_DEMO_TAG, demo._replace(altitude=1100)),
+                             (NAVDATA_TIME_TAG, (5,))]),
+        # no demo option
+        pack_navdata(3, 12),
+        pack_navdata(4, 13, [(NAVDATA_DEMO_TAG, demo._replace(altitude=1300, vx=-20.5))]),
+    ]
+
+
+@unittest.skipIf(np is None, "needs NumPy")
+class DecodePacketsTest(unittest.TestCase):
+
+    def test_matches_navigation_data(self):
+        from ardroneapi.bulk import decode_packets
+        data = packets()
+        records = decode_packets(data, timestamps=[1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(list(records['sequence']), [10, 11, 12, 13])
+        self.assertEqual(list(records['timestamp']), [1.0, 2.0, 3.0, 4.0])
+        self.assertTrue(records['valid'].all())
+        self.assertEqual(list(records['has_demo']), [True, True, False, True])
+        for row, packet in zip(records, data):
+            n = NavigationData(packet)
+            self.assertEqual(row['state'], n.state)
+            self.assertEqual(row['checksum'], n.checksum)
+            if n.demo is not None:
+                for name in ('altitude', 'psi', 'vx'):
+                    self.assertEqual(row[name], getattr(n.demo, name))
+        self.assertEqual(records['altitude'][2], 0)
+
+    def test_checksum_rejection(self):
+        from ardroneapi.bulk import decode_packets
+        data = packets()
+        corrupted = bytearray(data[3])
+        corrupted[16 + 4 + 20] ^= 1
+        data[3] = bytes(corrupted)
+        data.append(b'\0' * len(data[0]))
+        data.append(b'short')
+        records = decode_packets(data)
+        self.assertEqual(list(records['valid']), [True, True, True, False, False, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
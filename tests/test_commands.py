@@ -0,0 +1,66 @@
+import unittest
+
+from ardroneapi import CommandEncoder, Drone, float2int
+
+from support import LoopbackDrone
+
+
+class CommandEncoderTest(unittest.TestCase):
+
+    def test_encode(self):
+        encoder = CommandEncoder('PCMD')
+        self.assertEqual(encoder.encode(5, (1, -0.8, 0, 0, 0)),
+                         b'AT*PCMD=5,1,-1085485875,0,0,0\r')
+        self.assertEqual(CommandEncoder('COMWDG').encode(7), b'AT*COMWDG=7\r')
+
+    def test_cached_params(self):
+        encoder = CommandEncoder('PCMD')
+        params = (1, 0.5, 0.0, 0.0, 0.0)
+        self.assertEqual(encoder.encode(1, params), encoder.encode(1, params))
+        self.assertEqual(encoder.encode(2, params),
+                         b'AT*PCMD=2,1,%d,0,0,0\r' % float2int(0.5))
+
+    def test_changed_list_params(self):
+        encoder = CommandEncoder('REF')
+        params = ['512']
+        encoder.encode(1, params)
+        params[0] = '0'
+        self.assertEqual(encoder.encode(2, params), b'AT*REF=2,0\r')
+
+
+class DroneCommandsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.drone = LoopbackDrone()
+        self.drone.wire.settimeout(1.0)
+
+    def tearDown(self):
+        self.drone.close()
+
+    def test_sequence_numbers(self):
+        d = self.drone
+        self.assertEqual(d.build_raw_command('REF', ('512',)), b'AT*REF=1,512\r')
+        self.assertEqual(d.build_raw_command('COMWDG'), b'AT*COMWDG=2\r')
+
+    def test_packets_are_at_most_max_packet_size(self):
+        commands = [('CONFIG', ('"general:navdata_demo"', '"TRUE"'))] * 100
+        packets = self.drone.build_raw_commands(commands)
+        self.assertTrue(len(packets) > 1)
+        for packet in packets:
+            self.assertTrue(len(packet) <= Drone.max_packet_size)
+        self.assertEqual(sum(packet.count(b'\r') for packet in packets), 100)
+
+    def test_send(self):
+        d = self.drone
+        d.move(0.5, 0, 0, 0)
+        data = d.wire.recv(1024)
+        self.assertEqual(data, b'AT*COMWDG=1\rAT*PCMD=2,1,%d,0,0,0\r' % float2int(0.5))
+
+    def test_move_all_zero_hovers(self):
+        d = self.drone
+        d.move(0, 0, 0, 0)
+        self.assertEqual(d.wire.recv(1024), b'AT*COMWDG=1\rAT*PCMD=2,0,0,0,0,0\r')
+
+
+if __name__ == '__main__':
+    unittest.main()
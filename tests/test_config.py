@@ -0,0 +1,77 @@
+import unittest
+
+from ardroneapi import Drone
+from ardroneapi.config import ConfigParser, DroneConfig, format_value, parse_value
+from ardroneapi.simulator import DroneSimulator
+
+
+class ValuesTest(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(parse_value('TRUE'), True)
+        self.assertEqual(parse_value('FALSE'), False)
+        self.assertEqual(parse_value('3000'), 3000)
+        self.assertEqual(parse_value('0.25'), 0.25)
+        self.assertEqual(parse_value('1.7.4'), '1.7.4')
+
+    def test_round_trip(self):
+        for value in (True, False, 3000, 0.2094395, 'ardrone2'):
+            self.assertEqual(parse_value(format_value(value)), value)
+
+    def test_quotes_are_refused(self):
+        self.assertRaises(ValueError, format_value, 'a"b')
+
+    def test_parser_keeps_partial_lines(self):
+        parser = ConfigParser()
+        parser.feed(b'control:altitude_max = 30')
+        self.assertEqual(parser.values, {})
+        parser.feed(b'00\ngeneral:navdata_demo = TRUE')
+        self.assertEqual(parser.values, {'control:altitude_max': 3000})
+        self.assertEqual(parser.close(), {'control:altitude_max': 3000,
+                                          'general:navdata_demo': True})
+
+
+class DroneConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        self.simulator = DroneSimulator('127.0.0.3', rate=100)
+        self.simulator.start()
+        self.drone = Drone(drone_ip='127.0.0.3', local_ip='127.0.0.2')
+        self.drone.connect_cmd()
+        self.config = DroneConfig(self.drone, timeout=0.1)
+        self.reads = 0
+        refresh = self.config.refresh
+        def counted():
+            self.reads += 1
+            refresh()
+        self.config.refresh = counted
+
+    def tearDown(self):
+        self.drone.disconnect_cmd()
+        self.simulator.stop()
+
+    def test_read_once(self):
+        config = self.config
+        self.assertEqual(config['control:altitude_max'], 3000)
+        self.assertTrue('general:navdata_demo' in config)
+        self.assertEqual(config.get('video:nonexistent', 'default'), 'default')
+        self.assertRaises(KeyError, lambda: config['video:nonexistent'])
+        self.assertEqual(self.reads, 1)
+
+    def test_invalidate(self):
+        config = self.config
+        config.get('control:altitude_max')
+        self.simulator.config['control:altitude_max'] = '5000'
+        self.assertEqual(config['control:altitude_max'], 3000)
+        config.invalidate()
+        self.assertEqual(config['control:altitude_max'], 5000)
+        self.assertEqual(self.reads, 2)
+
+    def test_as_dict_is_a_copy(self):
+        values = self.config.as_dict()
+        values['control:altitude_max'] = 0
+        self.assertEqual(self.config['control:altitude_max'], 3000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import math
+import unittest
+
+from ardroneapi.controller import PID, HoldController
+from ardroneapi.navdata import (OPTIONS, NAVDATA_DEMO_TAG, NavigationData,
+    pack_navdata)
+from ardroneapi.scheduler import CommandScheduler
+
+from support import LoopbackDrone
+
+HOVER = (0, 0, 0, 0, 0)
+
+
+def navdata(sequence, received, altitude=1000, psi=0.0, vx=0.0, vy=0.0):
+    demo = OPTIONS[NAVDATA_DEMO_TAG].defaults()._replace(
+        altitude=altitude, psi=psi, vx=vx, vy=vy)
+    n = NavigationData(pack_navdata(0, sequence, [(NAVDATA_DEMO_TAG, demo)]))
+    n.received = received
+    return n
+
+
+class PIDTest(unittest.TestCase):
+
+    def test_proportional(self):
+        pid = PID(0.5)
+        self.assertEqual(pid.update(1.0, 0.1), 0.5)
+        self.assertEqual(pid.update(-1.0, 0.1), -0.5)
+
+    def test_limit(self):
+        pid = PID(10.0, limit=0.3)
+        self.assertEqual(pid.update(1.0, 0.1), 0.3)
+        self.assertEqual(pid.update(-1.0, 0.1), -0.3)
+
+    def test_integral_is_bounded(self):
+        pid = PID(0.0, ki=1.0, limit=0.5)
+        for i in range(100):
+            output = pid.update(1.0, 0.1)
+        self.assertEqual(output, 0.5)
+        self.assertEqual(pid.integral, 0.5)
+        # unwinds right away
+        self.assertTrue(pid.update(-1.0, 0.1) < 0.5)
+
+    def test_measured_derivative_damps(self):
+        pid = PID(1.0, kd=1.0)
+        # closing in on the target at 0.5 per second
+        self.assertAlmostEqual(pid.update(1.0, 0.1, derivative=-0.5), 0.5)
+
+    def test_differentiated_derivative(self):
+        pid = PID(0.0, kd=1.0, derivative_time_constant=0.0)
+        pid.update(1.0, 0.1)
+        self.assertAlmostEqual(pid.update(0.9, 0.1), -1.0)
+
+
+class HoldControllerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.drone = LoopbackDrone()
+        self.drone.wire.setblocking(False)
+        self.drone.scheduler = CommandScheduler(self.drone)
+        self.controller = HoldController(self.drone)
+        self.sequence = 0
+        self.now = 100.0
+
+    def tearDown(self):
+        self.drone.close()
+
+    def feed(self, **values):
+        self.sequence += 1
+        self.now += 0.01
+        self.controller.update(navdata(self.sequence, self.now, **values))
+        return self.controller.pcmd
+
+    def test_altitude(self):
+        self.controller.hold(altitude=1.5, axes=('altitude',))
+        flag, roll, pitch, gaz, yaw = self.feed(altitude=1000)
+        self.assertEqual(flag, 1)
+        self.assertTrue(gaz > 0)
+        self.assertEqual((roll, pitch, yaw), (0, 0, 0))
+        self.assertTrue(self.feed(altitude=2000)[3] < 0)
+
+    def test_int_limit_is_sent_as_a_float(self):
+        controller = HoldController(self.drone, altitude_pid=PID(10.0, limit=1))
+        controller.hold(altitude=3.0, axes=('altitude',))
+        controller.update(navdata(1, self.now, altitude=1000))
+        self.assertEqual(controller.pcmd, (1, 0.0, 0.0, 1.0, 0.0))
+        self.assertTrue(isinstance(controller.pcmd[3], float))
+        # 1.0 as a float, not 1
+        self.assertTrue(self.drone.wire.recv(1024).endswith(b',0,0,1065353216,0\r'))
+
+    def test_heading(self):
+        self.controller.hold(heading=0.5, axes=('heading',))
+        self.assertTrue(self.feed(psi=0.0)[4] > 0)
+        self.assertTrue(self.feed(psi=math.degrees(1.0) * 1000)[4] < 0)
+
+    def test_heading_takes_the_short_way(self):
+        self.controller.hold(heading=math.radians(170), axes=('heading',))
+        # from -170 degrees it is 20 degrees to the left
+        self.assertTrue(self.feed(psi=-170000.0)[4] < 0)
+
+    def test_position(self):
+        c = self.controller
+        # ahead of the drone: lean forwards (negative pitch)
+        c.hold(position=(1.0, 0.0), axes=('position',))
+        flag, roll, pitch, gaz, yaw = self.feed()
+        self.assertTrue(pitch < 0)
+        self.assertAlmostEqual(roll, 0)
+        # to its right: positive roll
+        c.hold(position=(0.0, 1.0), axes=('position',))
+        flag, roll, pitch, gaz, yaw = self.feed()
+        self.assertTrue(roll > 0)
+        self.assertAlmostEqual(pitch, 0)
+        # facing +y (90 degrees right), +x is on its left
+        c.hold(position=(1.0, 0.0), axes=('position',))
+        flag, roll, pitch, gaz, yaw = self.feed(psi=90000.0)
+        self.assertTrue(roll < 0)
+        self.assertAlmostEqual(pitch, 0)
+
+    def test_current_targets(self):
+        self.controller.hold()
+        self.assertEqual(self.feed(altitude=1200, psi=30000.0), (1, 0.0, 0.0, 0.0, 0.0))
+        targets = self.controller.targets
+        self.assertAlmostEqual(targets['altitude'], 1.2)
+        self.assertAlmostEqual(targets['heading'], math.radians(30))
+        self.assertFalse(targets['new'])
+
+    def test_sends_right_away_and_replaces_the_scheduler_setpoint(self):
+        self.controller.hold(altitude=2.0)
+        pcmd = self.feed()
+        self.assertEqual(self.drone.scheduler.pcmd, pcmd)
+        self.assertTrue(self.drone.wire.recv(1024).startswith(b'AT*PCMD='))
+        self.assertEqual(self.controller.stats()['updates'], 1)
+
+    def test_release(self):
+        c = self.controller
+        c.hold(altitude=2.0)
+        self.feed()
+        c.release()
+        self.assertFalse(c.holding)
+        self.assertEqual(self.drone.scheduler.pcmd, HOVER)
+        self.assertEqual(self.feed(), None)
+        self.assertEqual(self.drone.scheduler.pcmd, HOVER)
+
+    def test_setpoint_filter_is_refused(self):
+        self.drone.scheduler.setpoint_filter = object()
+        self.assertRaises(ValueError, self.controller.hold)
+
+    def test_unknown_axis(self):
+        self.assertRaises(ValueError, self.controller.hold, axes=('altitude', 'pitch'))
+
+
+if __name__ == '__main__':
+    unittest.main()
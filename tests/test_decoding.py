@@ -0,0 +1,80 @@
+import io
+import unittest
+import zlib
+
+from ardroneapi.decoding import DecoderPool, read_frames
+from ardroneapi.video import pack_frame
+
+
+def fail(data, header):
+    raise ValueError('bad frame')
+
+
+def frames(count):
+    stream = b''.join(pack_frame(b'frame %d' % i * (i + 1), frame_number=i)
+                      for i in range(count))
+    return list(read_frames(io.BytesIO(stream)))
+
+
+class DecoderPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pools = []
+
+    def tearDown(self):
+        for pool in self.pools:
+            pool.stop(5.0)
+
+    def pool(self, *args, **kwargs):
+        pool = DecoderPool(*args, **kwargs)
+        self.pools.append(pool)
+        return pool
+
+    def test_decodes_frames(self):
+        pool = self.pool(workers=2, slots=8)
+        pool.start()
+        for header, payload in frames(5):
+            self.assertTrue(pool.submit_data(payload, header))
+        decoded = sorted((pool.results.get(timeout=5.0) for i in range(5)),
+                         key=lambda d: d.header.frame_number)
+        for d, (header, payload) in zip(decoded, frames(5)):
+            self.assertEqual(d.error, None)
+            self.assertEqual(d.header, header)
+            self.assertEqual(d.result['size'], len(payload))
+            self.assertEqual(d.result['crc32'], zlib.crc32(payload) & 0xFFFFFFFF)
+            self.assertTrue(d.latency >= d.decode_time >= 0)
+        self.assertEqual((pool.submitted, pool.dropped, pool.errors), (5, 0, 0))
+        self.assertEqual(len(pool.free), 8)
+
+    def test_decoder_errors(self):
+        pool = self.pool(fail, workers=1)
+        pool.start()
+        header, payload = frames(1)[0]
+        pool.submit_data(payload, header)
+        decoded = pool.results.get(timeout=5.0)
+        self.assertEqual((decoded.result, decoded.error), (None, 'ValueError: bad frame'))
+        self.assertEqual(pool.errors, 1)
+
+    def test_drops_when_every_slot_is_busy(self):
+        # not started: nothing frees the slots
+        pool = self.pool(workers=1, slots=2, slot_size=64)
+        submitted = [pool.submit_data(payload, header) for header, payload in frames(3)]
+        self.assertEqual(submitted, [True, True, False])
+        self.assertFalse(pool.submit_data(b'\0' * 65, frames(1)[0][0]))
+        self.assertEqual((pool.submitted, pool.dropped), (2, 2))
+
+    def test_stop(self):
+        pool = self.pool(workers=2)
+        pool.start()
+        processes = list(pool.processes)
+        collector = pool.collector
+        pool.stop(5.0)
+        for p in processes:
+            self.assertFalse(p.is_alive())
+            self.assertEqual(p.exitcode, 0)
+        self.assertFalse(collector.is_alive())
+        self.assertEqual((pool.processes, pool.collector), ([], None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import math
+import random
+import unittest
+
+from ardroneapi.estimator import np
+from ardroneapi.navdata import (OPTIONS, NAVDATA_DEMO_TAG, NavigationData,
+    pack_navdata)
+
+
+def packet(sequence, **values):
+    demo = OPTIONS[NAVDATA_DEMO_TAG].defaults()._replace(**values)
+    return pack_navdata(0, sequence, [(NAVDATA_DEMO_TAG, demo)])
+
+
+@unittest.skipIf(np is None, "needs NumPy")
+class StateEstimatorTest(unittest.TestCase):
+
+    def setUp(self):
+        from ardroneapi.estimator import StateEstimator
+        self.estimator = StateEstimator()
+
+    def feed(self, packets, dt=0.02, start=0):
+        for i, data in enumerate(packets, start):
+            self.estimator.update(NavigationData(data), timestamp=i * dt)
+
+    def test_converges_on_noisy_constant_velocity(self):
+        noise = random.Random(1).gauss
+        states = []
+        # climbing at 0.5m/s, flying forward at 1m/s
+        for i in range(500):
+            self.feed([packet(i, altitude=int(1000 + 10 * i + noise(0, 30)),
+                              vx=1000 + noise(0, 50))], start=i)
+            states.append(self.estimator.state)
+        # the mean error over the second half, after converging
+        def error(value):
+            return sum(value(state) for state in states[250:]) / 250
+        self.assertAlmostEqual(error(lambda s: s.vz - 0.5), 0.0, delta=0.05)
+        self.assertAlmostEqual(error(lambda s: s.z - 1.0 - 0.5 * s.timestamp), 0.0, delta=0.01)
+        self.assertAlmostEqual(error(lambda s: s.vx - 1.0), 0.0, delta=0.02)
+        self.assertAlmostEqual(error(lambda s: s.x - s.timestamp), 0.0, delta=0.2)
+        self.assertEqual(self.estimator.updates, 500)
+
+    def test_yaw_wraps(self):
+        # turning at 100deg/s across 180 degrees
+        psi = [(170000 + 2000 * i + 180000) % 360000 - 180000 for i in range(20)]
+        self.feed([packet(i, psi=float(p)) for i, p in enumerate(psi)])
+        state = self.estimator.state
+        self.assertTrue(-math.pi <= state.yaw < -math.pi / 2, state.yaw)
+        self.assertAlmostEqual(state.yaw, math.radians(psi[-1] / 1000.0), delta=0.02)
+        self.assertAlmostEqual(state.yaw_rate, math.radians(100), delta=0.3)
+
+    def test_predict_extrapolates(self):
+        self.assertEqual(self.estimator.predict(1.0), None)
+        self.feed([packet(i, altitude=1000 + 10 * i, psi=float(170000 + 2000 * i))
+                   for i in range(5)])
+        state = self.estimator.state
+        predicted = self.estimator.predict(state.timestamp + 0.5)
+        self.assertEqual(predicted.timestamp, state.timestamp + 0.5)
+        self.assertAlmostEqual(predicted.z, state.z + 0.5 * state.vz)
+        self.assertEqual(predicted.vz, state.vz)
+        yaw = (state.yaw + 0.5 * state.yaw_rate + math.pi) % (2 * math.pi) - math.pi
+        self.assertAlmostEqual(predicted.yaw, yaw)
+        self.assertTrue(-math.pi <= predicted.yaw <= math.pi)
+
+    def test_unmeasured_axes_stay_at_zero(self):
+        # vz is not used without vz_noise, x and y only move with vx and vy
+        self.feed([packet(i, altitude=1000, vz=500.0, theta=2000.0)
+                   for i in range(50)])
+        state = self.estimator.state
+        self.assertEqual((state.x, state.y, state.vx, state.vy), (0.0, 0.0, 0.0, 0.0))
+        self.assertAlmostEqual(state.vz, 0.0)
+        self.assertAlmostEqual(state.pitch, math.radians(2))
+
+    def test_estimate_matches_updates(self):
+        from ardroneapi.bulk import decode_packets
+        from ardroneapi.estimator import StateEstimator, estimate
+        noise = random.Random(2).gauss
+        data = [packet(i, altitude=int(1000 + noise(0, 30)), vx=noise(0, 50),
+                       vy=noise(0, 50), psi=float(noise(0, 90000)))
+                for i in range(50)]
+        timestamps = [i * 0.03 for i in range(50)]
+        states = estimate(decode_packets(data, timestamps))
+        estimator = StateEstimator()
+        for row, packet_data, timestamp in zip(states, data, timestamps):
+            estimator.update(NavigationData(packet_data), timestamp=timestamp)
+            expected = estimator.state
+            for name in expected._fields:
+                self.assertAlmostEqual(row[name], getattr(expected, name), places=9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import logging
+import threading
+import unittest
+
+from ardroneapi.fleet import Fleet
+from ardroneapi.navdata import pack_navdata
+
+
+class RecordingSocket(object):
+
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, address):
+        self.sent.append((data, address))
+
+
+class FleetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fleet = Fleet(['127.0.0.1', '127.0.0.3'])
+        self.fleet.cmd_socket = RecordingSocket()
+
+    def addresses(self):
+        return [address[0] for data, address in self.fleet.cmd_socket.sent]
+
+    def test_broadcast_sends_to_every_drone(self):
+        self.fleet.broadcast('flat_trims')
+        self.assertEqual(self.addresses(), ['127.0.0.1', '127.0.0.3'])
+
+    def test_call_all_sends_after_building(self):
+        sent = []
+        def function(drone):
+            sent.append(len(self.fleet.cmd_socket.sent))
+            drone.send('COMWDG')
+        self.fleet.call_all(function)
+        self.assertEqual(sent, [0, 0])
+        self.assertEqual(len(self.fleet.cmd_socket.sent), 2)
+
+    def test_other_threads_are_not_batched(self):
+        fleet = self.fleet
+        other = fleet.drones[1]
+        def function(drone):
+            if drone is fleet.drones[0]:
+                thread = threading.Thread(target=other.send, args=('COMWDG',))
+                thread.start()
+                thread.join()
+                # already sent, not held back in this batch
+                self.assertEqual(self.addresses(), ['127.0.0.3'])
+            drone.send('COMWDG')
+        fleet.call_all(function)
+        self.assertEqual(self.addresses(), ['127.0.0.3', '127.0.0.1', '127.0.0.3'])
+
+    def test_nested_call_all_is_one_batch(self):
+        fleet = self.fleet
+        def function(drone):
+            if drone is fleet.drones[0]:
+                fleet.broadcast('flat_trims')
+                self.assertEqual(fleet.cmd_socket.sent, [])
+        fleet.call_all(function)
+        self.assertEqual(len(fleet.cmd_socket.sent), 2)
+
+    def test_drones_are_disconnected_with_the_fleet(self):
+        drone = self.fleet.drones[0]
+        self.assertRaises(Exception, drone.disconnect)
+        self.assertRaises(Exception, drone.disconnect_cmd)
+
+    def test_failing_callback(self):
+        drone = self.fleet.drones[0]
+        got = []
+        def fail(navdata):
+            raise Exception('Not connected yet!')
+        drone.callbacks.insert(0, fail)
+        drone.add_callback(got.append)
+        logging.disable(logging.CRITICAL)
+        try:
+            drone.navdata_received(pack_navdata(0, 1))
+        finally:
+            logging.disable(logging.NOTSET)
+        self.assertEqual([n.sequence for n in got], [1])
+        self.assertEqual(drone.navdata.sequence, 1)
+        self.assertEqual(self.fleet.callback_errors, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
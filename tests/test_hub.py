@@ -0,0 +1,190 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from ardroneapi import hub as hub_module
+from ardroneapi.hub import (BLOCK, DROP_NEWEST, DROP_OLDEST, INLINE, LATEST,
+    HubClient, TelemetryHub, pack_record, unpack_record)
+from ardroneapi.navdata import (OPTIONS, NAVDATA_DEMO_TAG, NavdataRecord,
+    NavigationData, pack_navdata)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.001)
+
+
+class Consumer(object):
+    """
+    A callback that blocks on its first packet until ``go`` is set.
+    """
+    def __init__(self):
+        self.got = []
+        self.threads = set()
+        self.go = threading.Event()
+
+    def __call__(self, item):
+        self.threads.add(threading.current_thread())
+        self.got.append(item)
+        if len(self.got) == 1:
+            self.go.wait(2.0)
+
+
+class PolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.hub = TelemetryHub()
+        self.consumers = []
+
+    def tearDown(self):
+        for consumer in self.consumers:
+            consumer.go.set()
+        self.hub.close()
+
+    def fill(self, policy, count=4, **kwargs):
+        consumer = Consumer()
+        self.consumers.append(consumer)
+        subscriber = self.hub.subscribe(consumer, policy, queue_size=2, **kwargs)
+        self.hub.publish(0)
+        # the subscriber is stuck on the first packet
+        wait_for(lambda: consumer.got)
+        for i in range(1, count):
+            self.hub.publish(i)
+        return consumer, subscriber
+
+    def finish(self, consumer, subscriber, count):
+        consumer.go.set()
+        wait_for(lambda: subscriber.delivered == count)
+        return consumer.got
+
+    def test_drop_oldest(self):
+        consumer, subscriber = self.fill(DROP_OLDEST)
+        self.assertEqual(self.finish(consumer, subscriber, 3), [0, 2, 3])
+        self.assertEqual(subscriber.dropped, 1)
+
+    def test_drop_newest(self):
+        consumer, subscriber = self.fill(DROP_NEWEST)
+        self.assertEqual(self.finish(consumer, subscriber, 3), [0, 1, 2])
+        self.assertEqual(subscriber.dropped, 1)
+
+    def test_latest(self):
+        consumer, subscriber = self.fill(LATEST)
+        self.assertEqual(self.finish(consumer, subscriber, 2), [0, 3])
+        self.assertEqual(subscriber.dropped, 2)
+
+    def test_block_gives_up(self):
+        started = time.time()
+        consumer, subscriber = self.fill(BLOCK, block_timeout=0.05)
+        self.assertTrue(time.time() - started >= 0.05)
+        self.assertEqual(self.finish(consumer, subscriber, 3), [0, 1, 2])
+        self.assertEqual(subscriber.dropped, 1)
+
+    def test_block_waits_for_room(self):
+        consumer, subscriber = self.fill(BLOCK, count=3, block_timeout=2.0)
+        threading.Timer(0.02, consumer.go.set).start()
+        self.hub.publish(3)
+        self.assertEqual(self.finish(consumer, subscriber, 4), [0, 1, 2, 3])
+        self.assertEqual(subscriber.dropped, 0)
+
+    def test_inline(self):
+        got = []
+        subscriber = self.hub.subscribe(got.append, INLINE)
+        self.hub.publish(1)
+        self.assertEqual(got, [1])
+        self.assertEqual(subscriber.delivered, 1)
+        self.assertFalse(subscriber.is_alive())
+
+    def test_slow_subscriber_does_not_hold_up_the_others(self):
+        fast = []
+        subscriber = self.hub.subscribe(fast.append, DROP_OLDEST, queue_size=10)
+        self.fill(DROP_NEWEST, count=10)
+        wait_for(lambda: subscriber.delivered == 10)
+        self.assertEqual(fast, list(range(10)))
+
+    def test_unsubscribe(self):
+        got = []
+        subscriber = self.hub.subscribe(got.append)
+        self.hub.unsubscribe(subscriber)
+        self.hub.publish(1)
+        self.assertFalse(subscriber.is_alive())
+        self.assertEqual(got, [])
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, self.hub.subscribe, len, 'sometimes')
+
+
+def navdata(sequence, altitude):
+    demo = OPTIONS[NAVDATA_DEMO_TAG].defaults()._replace(altitude=altitude)
+    return NavigationData(pack_navdata(0, sequence, [(NAVDATA_DEMO_TAG, demo)]))
+
+
+class PackedTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        record = NavdataRecord()
+        record.altitude = 1200
+        record.psi = -45.5
+        copy = unpack_record(pack_record(record))
+        self.assertEqual((copy.altitude, copy.psi), (1200, -45.5))
+
+    def test_packed_once(self):
+        hub = TelemetryHub()
+        got = []
+        hub.subscribe(got.append, INLINE, packed=True)
+        hub.subscribe(got.append, INLINE, packed=True)
+        hub.publish(navdata(3, 1500))
+        hub.close()
+        self.assertTrue(got[0] is got[1])
+        self.assertEqual(unpack_record(got[0]).altitude, 1500)
+
+    def test_unpacked_once_per_packet(self):
+        hub = TelemetryHub()
+        unpacked = []
+        def unpack_into(data, record):
+            unpacked.append(data)
+            return original(data, record)
+        original, hub_module.unpack_into = hub_module.unpack_into, unpack_into
+        try:
+            got = []
+            plain = []
+            for i in range(3):
+                hub.subscribe(got.append, INLINE, packed=True)
+                hub.subscribe(plain.append, INLINE)
+            hub.publish(navdata(3, 1500))
+            hub.publish(navdata(4, 1600))
+        finally:
+            hub_module.unpack_into = original
+            hub.close()
+        self.assertEqual(len(unpacked), 2)
+        self.assertEqual(len(got), 6)
+        self.assertTrue(got[0] is got[1] is got[2])
+        self.assertEqual(unpack_record(got[3]).altitude, 1600)
+        self.assertEqual([n.sequence for n in plain], [3, 3, 3, 4, 4, 4])
+        self.assertEqual((hub.subscribers, hub.packed_subscribers), ([], []))
+
+    def test_client(self):
+        directory = tempfile.mkdtemp()
+        hub = TelemetryHub()
+        try:
+            server = hub.serve(os.path.join(directory, 'hub.sock'))
+            client = HubClient(server.path, timeout=2.0)
+            wait_for(lambda: server.clients)
+            hub.publish(navdata(5, 800))
+            record = client.receive()
+            self.assertEqual((record.sequence, record.altitude), (5, 800))
+            client.close()
+            wait_for(lambda: not server.clients)
+            self.assertEqual(hub.packed_subscribers, [])
+        finally:
+            hub.close()
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
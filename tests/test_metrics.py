@@ -0,0 +1,92 @@
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from ardroneapi import metrics
+from ardroneapi.metrics import Histogram, Metrics
+
+from support import LoopbackDrone
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_percentiles(self):
+        h = Histogram()
+        self.assertEqual(h.percentile(0.5), None)
+        for i in range(98):
+            h.add(1e-5)
+        h.add(2e-3)
+        h.add(500.0) # above the last bucket
+        # the upper bound of the bucket, within 10**0.1 of the value
+        self.assertTrue(1e-5 <= h.percentile(0.5) < 1.26e-5)
+        self.assertTrue(1e-5 <= h.percentile(0.98) < 1.26e-5)
+        self.assertTrue(2e-3 <= h.percentile(0.99) < 2.52e-3)
+        self.assertEqual(h.percentile(1.0), 500.0)
+        self.assertEqual(h.percentile(0.0), h.percentile(0.5))
+
+    def test_percentile_is_at_most_the_max(self):
+        h = Histogram()
+        h.add(1.1e-5)
+        self.assertEqual(h.percentile(0.5), 1.1e-5)
+
+    def test_summary(self):
+        h = Histogram()
+        self.assertEqual(h.summary()['mean'], None)
+        for value in (1e-3, 2e-3, 3e-3):
+            h.add(value)
+        summary = h.summary()
+        self.assertEqual((summary['count'], summary['min'], summary['max']), (3, 1e-3, 3e-3))
+        self.assertAlmostEqual(summary['mean'], 2e-3)
+        self.assertTrue(2e-3 <= summary['p50'] < 2.52e-3)
+        self.assertEqual(summary['p99'], 3e-3)
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 10.0
+        self.clock = metrics.clock
+        metrics.clock = lambda: self.now
+
+    def tearDown(self):
+        metrics.clock = self.clock
+
+    def test_snapshot(self):
+        m = Metrics()
+        m.count('navdata.packets')
+        m.count('navdata.bytes', 500)
+        m.observe('navdata.decode_time', 4e-6)
+        self.now += 2.0
+        snapshot = m.snapshot()
+        self.assertEqual(snapshot['elapsed'], 2.0)
+        self.assertEqual(snapshot['counters']['navdata.bytes'], {'value': 500, 'rate': 250.0})
+        self.assertEqual(snapshot['histograms']['navdata.decode_time']['count'], 1)
+        out = StringIO()
+        m.report(out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('navdata.bytes'), lines[0])
+        self.assertTrue('max      4.0us' in lines[2], lines[2])
+        m.reset()
+        self.assertEqual(m.snapshot()['counters'], {})
+
+    def test_send_is_measured(self):
+        drone = LoopbackDrone()
+        try:
+            drone.metrics = Metrics()
+            drone.send('COMWDG')
+            drone.send('PCMD', (0, 0, 0, 0, 0))
+            size = len(drone.wire.recv(1024)) + len(drone.wire.recv(1024))
+            counters = drone.metrics.snapshot()['counters']
+            self.assertEqual(counters['commands.packets']['value'], 2)
+            self.assertEqual(counters['commands.bytes']['value'], size)
+            self.assertEqual(drone.metrics.histograms['commands.send_time'].count, 2)
+        finally:
+            drone.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import struct
+import unittest
+
+from ardroneapi import constants
+from ardroneapi.navdata import (OPTIONS, NAVDATA_DEMO_TAG, NAVDATA_TIME_TAG,
+    NAVDATA_EULER_ANGLES_TAG, STATE_FLAGS, DroneState, NavdataError, NavdataRecord,
+    NavdataRing, NavigationData, SequenceTracker, option_header_struct, pack_navdata,
+    unpack_into)
+
+STATE = constants.ARDRONE_FLY_MASK | constants.ARDRONE_COMMAND_MASK
+
+
+def demo(**values):
+    return OPTIONS[NAVDATA_DEMO_TAG].defaults()._replace(**values)
+
+
+def packet(sequence=7, **values):
+    return pack_navdata(STATE, sequence, [
+        (NAVDATA_DEMO_TAG, demo(**values)),
+        (NAVDATA_TIME_TAG, (12345,)),
+        # a block of a tag nobody knows
+        option_header_struct.pack(0x7777, 8) + b'abcd',
+    ], vision_defined=1)
+
+
+class NavigationDataTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        values = dict(altitude=1234, psi=-90000.0, vx=250.0,
+                      vbat_flying_percentage=87,
+                      drone_camera_trans=(1.0, 2.0, 3.0))
+        n = NavigationData(packet(**values))
+        self.assertEqual((n.state, n.sequence, n.vision_defined), (STATE, 7, 1))
+        self.assertEqual(n.options['demo'], demo(**values))
+        self.assertEqual(n.options['time'].time, 12345)
+        self.assertEqual(n.altitude, 1234)
+        self.assertEqual(n.battery, 87)
+        self.assertTrue(n.flags.flying)
+        self.assertTrue(n.verify_checksum())
+
+    def test_options_are_decoded_lazily(self):
+        n = NavigationData(packet())
+        self.assertEqual(n.options.decoded, {})
+        self.assertEqual(sorted(n.options), ['demo', 'time'])
+        n.options['time']
+        self.assertEqual(list(n.options.decoded), ['time'])
+        self.assertFalse('euler_angles' in n.options)
+        self.assertRaises(KeyError, lambda: n.options['euler_angles'])
+        self.assertEqual(n.option('euler_angles', 'none'), 'none')
+        self.assertEqual(sorted(n.options.unpack_all()), ['demo', 'time'])
+
+    def test_unknown_option(self):
+        n = NavigationData(packet())
+        self.assertEqual(n.option_data(0x7777).tobytes(), b'abcd')
+        self.assertEqual(n.option_data(NAVDATA_EULER_ANGLES_TAG), None)
+
+    def test_short_option_is_missing(self):
+        short = option_header_struct.pack(NAVDATA_DEMO_TAG, 12) + b'\0' * 8
+        n = NavigationData(pack_navdata(0, 1, [short]))
+        self.assertFalse('demo' in n.options)
+        self.assertEqual(n.demo, None)
+        self.assertEqual(n.altitude, None)
+
+    def test_checksum_rejection(self):
+        data = bytearray(packet())
+        self.assertTrue(NavigationData(bytes(data)).verify_checksum())
+        # one bit of the altitude
+        data[16 + 4 + 20] ^= 1
+        n = NavigationData(bytes(data))
+        self.assertFalse(n.verify_checksum())
+        tracker = SequenceTracker()
+        self.assertFalse(tracker.check(n))
+        self.assertEqual(tracker.checksum_failed, 1)
+        self.assertTrue(tracker.check(n, verify=False))
+
+    def test_no_checksum_never_verifies(self):
+        data = packet()
+        self.assertFalse(NavigationData(data[:-8]).verify_checksum())
+
+    def test_invalid_packets(self):
+        data = packet()
+        self.assertRaises(NavdataError, NavigationData, b'\0' * len(data))
+        # the size of the last block points past the end
+        self.assertRaises(NavdataError, NavigationData, data[:-4])
+        self.assertRaises(NavdataError, unpack_into, data[:-4], NavdataRecord())
+        self.assertRaises(struct.error, NavigationData, data[:8])
+
+    def test_unpack_into(self):
+        record = NavigationData(packet(altitude=900, theta=-1500.0)).unpack_into(NavdataRecord())
+        self.assertEqual((record.sequence, record.state), (7, STATE))
+        self.assertEqual((record.altitude, record.theta), (900, -1500.0))
+        self.assertEqual(record.time, 12345)
+        # options missing from the next packet keep their values
+        unpack_into(pack_navdata(0, 8), record)
+        self.assertEqual((record.sequence, record.altitude), (8, 900))
+
+
+class SequenceTrackerTest(unittest.TestCase):
+
+    def test_counters(self):
+        tracker = SequenceTracker(restart_window=10)
+        accepted = [tracker.accept(sequence) for sequence in (1, 2, 5, 5, 4, 100, 3)]
+        self.assertEqual(accepted, [True, True, True, False, False, True, True])
+        self.assertEqual(tracker.counters, {
+            'received': 7, 'accepted': 5, 'dropped': 1, 'duplicated': 1,
+            'checksum_failed': 0, 'lost': 96, 'restarts': 1})
+
+
+class NavdataRingTest(unittest.TestCase):
+
+    def test_wrap(self):
+        ring = NavdataRing(3)
+        record = NavdataRecord()
+        for i in range(5):
+            record.altitude = i
+            ring.append(record)
+        self.assertEqual(len(ring), 3)
+        self.assertEqual(list(ring.column('altitude')), [2.0, 3.0, 4.0])
+        self.assertEqual(ring.get(0).altitude, 2.0)
+        self.assertEqual(ring.get(-1).altitude, 4.0)
+        self.assertRaises(IndexError, ring.get, 3)
+
+
+class DroneStateTest(unittest.TestCase):
+
+    def test_flags(self):
+        state = NavigationData(packet()).flags
+        self.assertTrue(state.flying)
+        self.assertTrue(state.command_ack)
+        self.assertFalse(state.emergency)
+        self.assertEqual(state.names(), ['flying', 'command_ack'])
+        self.assertEqual(state.names(constants.ARDRONE_FLY_MASK), ['flying'])
+        for name, mask in STATE_FLAGS:
+            self.assertTrue(getattr(DroneState(mask), name), name)
+            self.assertFalse(getattr(DroneState(~mask & 0xFFFFFFFF), name), name)
+
+    def test_transitions(self):
+        previous = DroneState(constants.ARDRONE_FLY_MASK | constants.ARDRONE_VIDEO_MASK)
+        state = DroneState(constants.ARDRONE_FLY_MASK | constants.ARDRONE_EMERGENCY_MASK)
+        changed = constants.ARDRONE_VIDEO_MASK | constants.ARDRONE_EMERGENCY_MASK
+        self.assertEqual(state.changed(previous), changed)
+        # or against a plain state word
+        self.assertEqual(state.changed(previous.value), changed)
+        self.assertEqual(state.set_since(previous), constants.ARDRONE_EMERGENCY_MASK)
+        self.assertEqual(state.cleared_since(previous), constants.ARDRONE_VIDEO_MASK)
+        self.assertEqual(state.changed(state), 0)
+        self.assertEqual(state, state.value)
+        self.assertNotEqual(state, previous)
+        self.assertEqual(len(set([state, DroneState(state.value)])), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import logging
+import socket
+import time
+import unittest
+
+from ardroneapi import NavdataReceiver
+from ardroneapi.metrics import Metrics
+from ardroneapi.navdata import pack_navdata
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.001)
+
+
+class NavdataReceiverTest(unittest.TestCase):
+
+    def setUp(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        self.receiver = NavdataReceiver(sock, timeout=0.05)
+        self.drone = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.drone.bind(('127.0.0.1', 0))
+        self.address = sock.getsockname()
+        self.got = []
+        self.receiver.add_callback(self.got.append)
+        self.receiver.start()
+        # the failing callbacks log their exceptions
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        self.receiver.stop()
+        self.receiver.sock.close()
+        self.drone.close()
+
+    def send(self, data):
+        self.drone.sendto(data, self.address)
+
+    def test_decodes_and_publishes(self):
+        self.send(pack_navdata(0, 1))
+        self.send(pack_navdata(0, 2))
+        wait_for(lambda: len(self.got) == 2)
+        self.assertEqual([n.sequence for n in self.got], [1, 2])
+        self.assertTrue(self.receiver.latest is self.got[-1])
+        self.assertTrue(self.got[0].received is not None)
+        self.assertEqual(self.receiver.sender, self.drone.getsockname())
+
+    def test_drops_bad_packets(self):
+        corrupted = bytearray(pack_navdata(0, 2))
+        corrupted[4] ^= 1
+        self.send(b'\0' * 24)
+        self.send(bytes(corrupted))
+        self.send(pack_navdata(0, 3))
+        wait_for(lambda: self.got)
+        self.assertEqual([n.sequence for n in self.got], [3])
+        self.assertEqual(self.receiver.errors, 1)
+        self.assertEqual(self.receiver.tracker.checksum_failed, 1)
+
+    def test_raw_callbacks_get_every_datagram(self):
+        raw = []
+        self.receiver.add_raw_callback(lambda data, timestamp: raw.append(data))
+        self.send(b'not navdata')
+        self.send(pack_navdata(0, 1))
+        wait_for(lambda: self.got)
+        self.assertEqual(raw, [b'not navdata', pack_navdata(0, 1)])
+
+    def test_failing_callbacks_do_not_stop_it(self):
+        def fail(*args):
+            raise Exception('Not connected yet!')
+        self.receiver.callbacks.insert(0, fail)
+        self.receiver.add_raw_callback(fail)
+        self.send(pack_navdata(0, 1))
+        self.send(pack_navdata(0, 2))
+        wait_for(lambda: len(self.got) == 2)
+        self.assertTrue(self.receiver.running)
+        self.assertTrue(self.receiver.is_alive())
+        self.assertEqual(self.receiver.latest.sequence, 2)
+        self.assertEqual(self.receiver.callback_errors, 4)
+
+    def test_metrics(self):
+        self.receiver.metrics = Metrics()
+        self.send(b'\0' * 24)
+        self.send(pack_navdata(0, 2))
+        self.send(pack_navdata(0, 1))
+        self.send(pack_navdata(0, 3))
+        wait_for(lambda: len(self.got) == 2)
+        snapshot = self.receiver.metrics.snapshot()
+        counters = dict((name, counter['value'])
+                        for name, counter in snapshot['counters'].items())
+        self.assertEqual(counters, {
+            'navdata.packets': 4,
+            'navdata.bytes': 24 + 3 * len(pack_navdata(0, 1)),
+            'navdata.errors': 1,
+            'navdata.dropped': 1,
+        })
+        self.assertEqual(snapshot['histograms']['navdata.decode_time']['count'], 3)
+
+    def test_stop(self):
+        self.receiver.stop()
+        self.assertFalse(self.receiver.is_alive())
+        self.assertFalse(self.receiver.running)
+
+
+if __name__ == '__main__':
+    unittest.main()
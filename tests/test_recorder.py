@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ardroneapi.navdata import NavdataError, pack_navdata
+from ardroneapi.recorder import (NavdataLog, NavdataRecorder, file_header_struct,
+    replay)
+
+
+class RecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.logs = []
+
+    def tearDown(self):
+        for log in self.logs:
+            log.close()
+        shutil.rmtree(self.directory)
+
+    def record(self, count, **kwargs):
+        recorder = NavdataRecorder(self.directory, **kwargs)
+        for i in range(count):
+            recorder.record(pack_navdata(0, i + 1), timestamp=100.0 + i)
+        recorder.close()
+
+    def open(self):
+        log = NavdataLog(self.directory)
+        self.logs.append(log)
+        return log
+
+    def test_round_trip(self):
+        self.record(10, segment_size=200)
+        log = self.open()
+        self.assertTrue(len(log.segments) > 1)
+        self.assertEqual(len(log), 10)
+        self.assertEqual([timestamp for timestamp, data in log],
+                         [100.0 + i for i in range(10)])
+        self.assertEqual(log[7][1], pack_navdata(0, 8))
+        self.assertEqual(log[-1][0], 109.0)
+        self.assertEqual(log.find(104.5), 5)
+        self.assertEqual(log.find(200.0), 10)
+        sequences = []
+        self.assertEqual(replay(log, lambda n: sequences.append(n.sequence), start=8), 2)
+        self.assertEqual(sequences, [9, 10])
+
+    def test_recording_continues_in_a_new_segment(self):
+        self.record(2)
+        self.record(3)
+        log = self.open()
+        self.assertEqual([len(segment) for segment in log.segments], [2, 3])
+
+    def test_nothing_is_recorded_after_close(self):
+        recorder = NavdataRecorder(self.directory)
+        recorder.record(pack_navdata(0, 1), timestamp=100.0)
+        recorder.close()
+        recorder.record(pack_navdata(0, 2), timestamp=101.0)
+        recorder.close()
+        self.assertEqual(recorder.recorded, 1)
+        log = self.open()
+        self.assertEqual(len(log.segments), 1)
+        self.assertEqual(len(log), 1)
+
+    def test_truncated_last_record(self):
+        self.record(3)
+        path = os.path.join(self.directory, 'navdata-00000.log')
+        for cut in (4, 20):
+            with open(path, 'r+b') as f:
+                f.truncate(os.path.getsize(path) - cut)
+            log = self.open()
+            self.assertEqual(len(log), 2)
+            self.assertEqual(log.segments[0].truncated, 1)
+            self.assertEqual(len(list(log)), 2)
+            self.assertRaises(IndexError, lambda: log[2])
+
+    def test_short_segment_is_empty(self):
+        self.record(2)
+        self.record(2)
+        path = os.path.join(self.directory, 'navdata-00001.log')
+        for size in (0, 10):
+            with open(path, 'r+b') as f:
+                f.truncate(size)
+            log = self.open()
+            self.assertEqual([len(segment) for segment in log.segments], [2, 0])
+            self.assertEqual(log.segments[1].truncated, 2)
+            self.assertEqual(len(list(log)), 2)
+
+    def test_not_a_log(self):
+        self.record(1)
+        path = os.path.join(self.directory, 'navdata-00000.log')
+        with open(path, 'r+b') as f:
+            f.write(file_header_struct.pack(b'ARNAVLOG', 7, 0))
+        try:
+            self.open()
+        except NavdataError as e:
+            self.assertTrue('version 7' in str(e), str(e))
+        else:
+            self.fail('opened a log of another version')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+
+from ardroneapi import scheduler
+from ardroneapi.scheduler import CommandScheduler
+
+from support import LoopbackDrone
+
+
+class FakeTime(object):
+    """
+    Replaces the clock of the scheduler, and its waits.
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def wait(self, timeout):
+        self.now += timeout
+
+    def set(self):
+        pass
+
+
+class ScriptedScheduler(CommandScheduler):
+    """
+    Ticks that take ``durations`` seconds each, then stops.
+    """
+    def __init__(self, time, durations):
+        super(ScriptedScheduler, self).__init__(None, rate=100)
+        self.time = time
+        self.durations = list(durations)
+        self.ticked_at = []
+        self._wakeup = time
+
+    def tick(self):
+        self.ticked_at.append(round(self.time.now, 6))
+        self.time.now += self.durations.pop(0)
+        if not self.durations:
+            self.running = False
+
+
+class OverrunTest(unittest.TestCase):
+
+    def setUp(self):
+        self.time = FakeTime()
+        self.clock = scheduler.clock
+        scheduler.clock = self.time
+
+    def tearDown(self):
+        scheduler.clock = self.clock
+
+    def run_ticks(self, durations):
+        s = ScriptedScheduler(self.time, durations)
+        s.running = True
+        s.run()
+        return s
+
+    def test_on_time(self):
+        s = self.run_ticks([0.001] * 4)
+        self.assertEqual(s.ticked_at, [0.0, 0.01, 0.02, 0.03])
+        stats = s.stats()
+        self.assertEqual((stats['ticks'], stats['overruns']), (4, 0))
+        self.assertAlmostEqual(stats['jitter_max'], 0.0)
+
+    def test_missed_ticks_are_skipped(self):
+        # the second tick takes 3.55 periods: 3 ticks are missed
+        s = self.run_ticks([0.001, 0.0355, 0.001, 0.001])
+        self.assertEqual(s.ticked_at, [0.0, 0.01, 0.05, 0.06])
+        stats = s.stats()
+        self.assertEqual((stats['ticks'], stats['overruns']), (4, 3))
+
+    def test_long_tick_within_its_period(self):
+        s = self.run_ticks([0.001, 0.0095, 0.001])
+        self.assertEqual(s.ticked_at, [0.0, 0.01, 0.02])
+        self.assertEqual(s.stats()['overruns'], 0)
+
+    def test_jitter(self):
+        s = CommandScheduler(None)
+        for jitter in (0.001, 0.003):
+            s.record_jitter(jitter)
+        stats = s.stats()
+        self.assertAlmostEqual(stats['jitter_mean'], 0.002)
+        self.assertAlmostEqual(stats['jitter_stddev'], 0.001)
+        self.assertEqual(stats['jitter_max'], 0.003)
+        s.reset_stats()
+        self.assertEqual(s.stats()['ticks'], 0)
+
+
+class CommandsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.drone = LoopbackDrone()
+        self.drone.wire.setblocking(False)
+        self.scheduler = CommandScheduler(self.drone)
+
+    def tearDown(self):
+        self.drone.close()
+
+    def sent(self):
+        self.scheduler.tick()
+        data = self.drone.wire.recv(4096).decode('ascii')
+        return [command.split('=')[0][3:] for command in data.split('\r') if command]
+
+    def test_setpoints_are_coalesced(self):
+        s = self.scheduler
+        s.move(0.1, 0, 0, 0)
+        s.move(0.2, 0, 0, 0)
+        self.assertEqual(s.commands(), [('COMWDG',), ('PCMD', (1, 0.2, 0.0, 0.0, 0.0))])
+        s.move(0, 0, 0, 0)
+        self.assertEqual(s.pcmd, (0, 0, 0, 0, 0))
+
+    def test_one_datagram_per_tick(self):
+        s = self.scheduler
+        s.set_ref(512)
+        s.queue('FTRIM')
+        self.assertEqual(self.sent(), ['FTRIM', 'COMWDG', 'REF', 'PCMD'])
+        # queued commands go out once
+        self.assertEqual(self.sent(), ['COMWDG', 'REF', 'PCMD'])
+        s.set_ref(None)
+        self.assertEqual(self.sent(), ['COMWDG', 'PCMD'])
+
+
+if __name__ == '__main__':
+    unittest.main()
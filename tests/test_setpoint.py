@@ -0,0 +1,84 @@
+import math
+import unittest
+
+from ardroneapi import setpoint
+from ardroneapi.setpoint import SetpointFilter, apply_deadband
+
+
+class FakeTime(object):
+    """
+    Replaces the clock of the filter.
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class SetpointFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.time = FakeTime()
+        self.clock = setpoint.clock
+        setpoint.clock = self.time
+
+    def tearDown(self):
+        setpoint.clock = self.clock
+
+    def samples(self, f, duration, period=0.01):
+        """
+        The roll sampled every ``period`` for ``duration`` seconds.
+        """
+        rolls = []
+        for i in range(int(round(duration / period))):
+            self.time.now += period
+            rolls.append(f.sample()[0])
+        return rolls
+
+    def test_deadband(self):
+        self.assertEqual(apply_deadband(0.04, 0.05), 0.0)
+        self.assertEqual(apply_deadband(-0.05, 0.05), 0.0)
+        self.assertAlmostEqual(apply_deadband(0.525, 0.05), 0.5)
+        self.assertAlmostEqual(apply_deadband(-0.525, 0.05), -0.5)
+        self.assertEqual(apply_deadband(2.0, 0.05), 1.0)
+        f = SetpointFilter(deadband=0.05, time_constant=0.0, max_rate=100.0)
+        f.update(0.04, -0.03, 0.0, 0.0)
+        self.assertEqual(self.samples(f, 0.1), [0.0] * 10)
+        self.assertTrue(f.settled())
+
+    def test_low_pass(self):
+        f = SetpointFilter(deadband=0.0, time_constant=0.1, max_rate=1000.0)
+        f.update(1.0, 0.0, 0.0, 0.0)
+        rolls = self.samples(f, 0.3)
+        # 1 - exp(-t / tau), whatever the sampling rate
+        for i, roll in enumerate(rolls):
+            self.assertAlmostEqual(roll, 1.0 - math.exp(-(i + 1) * 0.01 / 0.1))
+        coarse = SetpointFilter(deadband=0.0, time_constant=0.1, max_rate=1000.0)
+        coarse.update(1.0, 0.0, 0.0, 0.0)
+        self.assertAlmostEqual(self.samples(coarse, 0.3, period=0.1)[-1], rolls[-1])
+
+    def test_input_held_between_updates(self):
+        f = SetpointFilter(deadband=0.0, time_constant=0.1, max_rate=1000.0)
+        f.update(1.0, 0.0, 0.0, 0.0)
+        self.time.now = 0.1
+        f.update(0.0, 0.0, 0.0, 0.0)
+        self.time.now = 0.2
+        expected = (1.0 - math.exp(-1.0)) * math.exp(-1.0)
+        self.assertAlmostEqual(f.sample()[0], expected)
+        self.assertEqual(f.inputs, 2)
+
+    def test_slew_limit(self):
+        f = SetpointFilter(deadband=0.0, time_constant=0.0, max_rate=4.0)
+        f.update(1.0, 0.0, -1.0, 0.0)
+        rolls = self.samples(f, 0.3, period=0.05)
+        self.assertEqual([round(roll, 6) for roll in rolls],
+                         [0.2, 0.4, 0.6, 0.8, 1.0, 1.0])
+        self.assertAlmostEqual(f.output[2], -1.0)
+        self.assertTrue(f.settled())
+        f.reset()
+        self.assertEqual(f.sample(), (0.0, 0.0, 0.0, 0.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import threading
+import unittest
+
+from ardroneapi.navdata import RECORD_FIELDS, NavdataRecord
+from ardroneapi.shared import SharedNavdataRing, count_struct
+
+
+def record(value):
+    r = NavdataRecord()
+    for field in RECORD_FIELDS:
+        setattr(r, field, value)
+    return r
+
+
+class SharedNavdataRingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.name = 'ardroneapi-test-%d' % os.getpid()
+        self.writer = SharedNavdataRing(self.name, capacity=4)
+        self.reader = SharedNavdataRing(self.name)
+
+    def tearDown(self):
+        self.reader.close()
+        self.writer.close()
+
+    def test_empty(self):
+        self.assertEqual(self.reader.capacity, 4)
+        self.assertEqual(self.reader.count, 0)
+        self.assertEqual(len(self.reader), 0)
+        self.assertEqual(self.reader.latest(), None)
+        self.assertEqual(self.reader.read(0), None)
+
+    def test_read_write(self):
+        for i in range(3):
+            self.writer.append(record(i))
+        self.assertEqual(self.reader.count, 3)
+        self.assertEqual(self.reader.read(1).altitude, 1)
+        self.assertEqual(self.reader.latest().sequence, 2)
+        into = NavdataRecord()
+        self.assertTrue(self.reader.read(0, into) is into)
+        self.assertEqual(into.psi, 0)
+
+    def test_lapped(self):
+        for i in range(6):
+            self.writer.append(record(i))
+        self.assertEqual(len(self.reader), 4)
+        self.assertEqual(self.reader.read(1), None)
+        self.assertEqual(self.reader.read(2).battery, 2)
+        self.assertEqual([(index, r.sequence) for index, r in self.reader.since(0)],
+                         [(2, 2), (3, 3), (4, 4), (5, 5)])
+        self.assertEqual([index for index, r in self.reader.since(5)], [5])
+        self.assertEqual(list(self.reader.since(6)), [])
+
+    def test_not_a_ring(self):
+        self.writer.buf[0:4] = b'XXXX'
+        self.assertRaises(ValueError, SharedNavdataRing, self.name)
+
+    def test_half_written(self):
+        self.writer.append(record(0))
+        # the writer died in the middle of the second record
+        count_struct.pack_into(self.writer.buf, self.writer._offset(1), 3)
+        self.reader.write_timeout = 0.01
+        self.assertRaises(Exception, self.reader.read, 1)
+        self.assertEqual(self.reader.read(0).sequence, 0)
+
+    def test_concurrent_reads_are_whole(self):
+        count = 20000
+        def write():
+            for i in range(count):
+                self.writer.append(record(i))
+        thread = threading.Thread(target=write)
+        thread.start()
+        torn = 0
+        while thread.is_alive():
+            r = self.reader.latest()
+            if r is not None and len(set(getattr(r, f) for f in RECORD_FIELDS)) != 1:
+                torn += 1
+        thread.join()
+        self.assertEqual(torn, 0)
+        self.assertEqual(self.reader.latest().sequence, count - 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
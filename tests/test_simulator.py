@@ -0,0 +1,119 @@
+import time
+import unittest
+
+from ardroneapi import Drone, constants
+from ardroneapi.navdata import NavigationData
+from ardroneapi.simulator import DroneSimulator
+
+TRIM_ACK = constants.ARDRONE_TRIM_COMMAND_MASK
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.001)
+
+
+class DroneSimulatorTest(unittest.TestCase):
+    """
+    The commands fed straight to the simulator, without sockets.
+    """
+    def setUp(self):
+        self.sim = DroneSimulator()
+
+    def send(self, *commands):
+        self.sim.at_received(b''.join(b'AT*' + c + b'\r' for c in commands))
+
+    def test_trim_ack_is_reported_once(self):
+        self.send(b'FTRIM=1')
+        self.assertTrue(NavigationData(self.sim.navdata()).state & TRIM_ACK)
+        self.assertFalse(NavigationData(self.sim.navdata()).state & TRIM_ACK)
+        self.send(b'FTRIM=2')
+        self.assertTrue(NavigationData(self.sim.navdata()).state & TRIM_ACK)
+
+    def test_command_ack_until_reset(self):
+        self.send(b'CONFIG=1,"general:navdata_demo","FALSE"')
+        self.assertEqual(self.sim.config['general:navdata_demo'], 'FALSE')
+        self.assertFalse(self.sim.demo)
+        for i in range(2):
+            self.assertTrue(self.sim.state & constants.ARDRONE_COMMAND_MASK)
+        self.send(b'CTRL=2,%d,0' % constants.ACK_CONTROL_MODE)
+        self.assertFalse(self.sim.state & constants.ARDRONE_COMMAND_MASK)
+
+    def test_old_sequence_numbers_are_ignored(self):
+        self.send(b'FTRIM=5', b'FTRIM=4', b'FTRIM=5', b'COMWDG=1', b'PCMD=x')
+        self.assertEqual([c[1] for c in self.sim.commands], [5, 1])
+        self.assertEqual((self.sim.received, self.sim.ignored), (4, 2))
+
+    def test_takeoff_and_emergency(self):
+        model = self.sim.model
+        self.send(b'REF=1,512')
+        for i in range(300):
+            model.step(0.01)
+        self.assertTrue(model.flying)
+        self.assertAlmostEqual(model.altitude, model.takeoff_altitude, delta=10)
+        self.assertTrue(self.sim.state & constants.ARDRONE_FLY_MASK)
+        # the emergency bit toggles the emergency mode on a rising edge
+        self.send(b'REF=2,256', b'REF=3,256')
+        model.step(0.01)
+        self.assertTrue(model.emergency)
+        self.assertFalse(model.flying)
+        self.assertTrue(self.sim.state & constants.ARDRONE_EMERGENCY_MASK)
+        self.send(b'REF=4,0', b'REF=5,256')
+        self.assertFalse(model.emergency)
+
+    def test_move(self):
+        self.send(b'REF=1,512', b'PCMD=2,1,1045220557,0,0,0')
+        for i in range(300):
+            self.sim.model.step(0.01)
+        demo = NavigationData(self.sim.navdata()).demo
+        self.assertAlmostEqual(demo.phi, 0.2 * self.sim.model.euler_angle_max, places=1)
+        self.assertAlmostEqual(demo.vy, 0.2 * self.sim.model.speed_max, places=1)
+        self.send(b'PCMD=3,0,0,0,0,0')
+        self.assertEqual(self.sim.model.setpoint, (0.0, 0.0, 0.0, 0.0))
+
+    def test_watchdog(self):
+        self.sim.check_watchdog(0.0)
+        self.assertTrue(self.sim.state & constants.ARDRONE_COM_WATCHDOG_MASK)
+        self.send(b'COMWDG=1')
+        self.assertFalse(self.sim.state & constants.ARDRONE_COM_WATCHDOG_MASK)
+
+    def test_full_navdata(self):
+        self.sim.config['general:navdata_demo'] = 'FALSE'
+        navdata = NavigationData(self.sim.navdata())
+        self.assertTrue(navdata.verify_checksum())
+        self.assertTrue(len(navdata.options) > 4)
+
+
+class DroneSimulatorNetworkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.simulator = DroneSimulator('127.0.0.3', rate=100)
+        self.simulator.start()
+        self.drone = Drone(drone_ip='127.0.0.3', local_ip='127.0.0.2')
+        self.drone.connect()
+        self.drone.connect_nav()
+
+    def tearDown(self):
+        self.drone.disconnect_nav()
+        self.drone.disconnect()
+        self.simulator.stop()
+
+    def test_flat_trims_twice(self):
+        wait_for(lambda: self.drone.nav_receiver.latest is not None)
+        for i in range(2):
+            command = self.drone.flat_trims()
+            self.assertTrue(command.wait(2.0))
+            wait_for(lambda: not self.drone.nav_receiver.latest.state & TRIM_ACK)
+        self.assertEqual(self.drone.acks.stats()['FTRIM']['acked'], 2)
+
+    def test_navdata_follows_the_commands(self):
+        self.assertTrue(self.drone.takeoff().wait(2.0))
+        wait_for(lambda: self.drone.nav_receiver.latest.flags.flying)
+        self.assertTrue(self.drone.land().wait(5.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import socket
+import unittest
+
+from ardroneapi.video import BufferPool, FrameQueue, VideoReceiver, pack_frame
+
+
+class BufferPoolTest(unittest.TestCase):
+
+    def test_acquire_release(self):
+        pool = BufferPool(2, 16)
+        a, b = pool.acquire(), pool.acquire()
+        self.assertEqual(pool.acquire(), None)
+        a.release()
+        self.assertTrue(pool.acquire() is a)
+
+    def test_double_release(self):
+        pool = BufferPool(2, 16)
+        frame = pool.acquire()
+        frame.release()
+        self.assertRaises(ValueError, frame.release)
+        self.assertEqual(len(pool.free), 2)
+        self.assertFalse(pool.acquire() is pool.acquire())
+
+    def test_release_resets_the_frame(self):
+        pool = BufferPool(1, 16)
+        frame = pool.acquire()
+        frame.length = 4
+        frame.release()
+        self.assertEqual(frame.length, 0)
+        self.assertEqual(frame.header, None)
+
+
+class FrameQueueTest(unittest.TestCase):
+
+    def test_drops_and_releases_the_oldest(self):
+        pool = BufferPool(3, 16)
+        queue = FrameQueue(2)
+        frames = [pool.acquire() for i in range(3)]
+        for frame in frames:
+            queue.put(frame)
+        self.assertEqual(queue.overflows, 1)
+        self.assertEqual(list(pool.free), [frames[0]])
+        self.assertTrue(queue.get() is frames[1])
+        queue.clear()
+        self.assertEqual(len(pool.free), 2)
+        self.assertEqual(queue.get(timeout=0.01), None)
+
+
+class VideoReceiverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.drone_side, sock = socket.socketpair()
+        self.receiver = VideoReceiver(sock, pool_size=2, queue_size=2, frame_size=64)
+        self.receiver.start()
+
+    def tearDown(self):
+        self.receiver.stop()
+        self.receiver.sock.close()
+        self.drone_side.close()
+
+    def test_frames(self):
+        self.drone_side.sendall(pack_frame(b'first', frame_number=1) +
+                                pack_frame(b'x' * 100, frame_number=2) +
+                                pack_frame(b'third', frame_number=3))
+        frames = self.receiver.frames
+        first = frames.get(timeout=1.0)
+        self.assertEqual(first.header.frame_number, 1)
+        self.assertEqual(first.data.tobytes(), b'first')
+        third = frames.get(timeout=1.0)
+        self.assertEqual(third.header.frame_number, 3)
+        # too large for the buffers
+        self.assertEqual(self.receiver.dropped, 1)
+        first.release()
+        third.release()
+        self.assertEqual(len(self.receiver.pool.free), 2)
+
+    def test_held_buffers_drop_new_frames(self):
+        frames = self.receiver.frames
+        self.drone_side.sendall(pack_frame(b'a', frame_number=1) + pack_frame(b'b', frame_number=2))
+        held = [frames.get(timeout=1.0), frames.get(timeout=1.0)]
+        self.drone_side.sendall(pack_frame(b'c', frame_number=3) + pack_frame(b'd', frame_number=4))
+        self.assertEqual(frames.get(timeout=0.1), None)
+        for frame in held:
+            frame.release()
+        self.drone_side.sendall(pack_frame(b'e', frame_number=5))
+        self.assertEqual(frames.get(timeout=1.0).header.frame_number, 5)
+        self.assertEqual(self.receiver.dropped, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()